@@ -0,0 +1,312 @@
+import argparse
+import csv
+import glob
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from utils.extraction_utils import DocumentExtractor
+from utils.export_utils import IndexExporter
+from utils.case_index_utils import CaseIndex, CASE_INDEX_PATH
+from utils.metrics_utils import METRICS, STAGE_EXPORT, STAGE_REGEX_SCAN, STAGE_TOTAL, PipelineMetrics
+
+# Setting up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ------------------- Configuration ------------------- #
+class BatchConfig:
+    SUPPORTED_EXTENSIONS = (".pdf", ".txt")
+    INDEX_HEADERS = ["Source File", "Bate Number", "Repair Order Number", "Page Number"]
+    MANIFEST_SUFFIX = ".manifest.json"
+
+
+# ------------------- File Discovery ------------------- #
+def discover_files(inputs: List[str]) -> List[Tuple[str, str]]:
+    """
+    Expands directories (recursively) and glob patterns into a sorted list of (path, source) for every
+    PDF and text file. source is the file's path relative to the input it was found under (the directory,
+    or the fixed part of a glob pattern), so prod/a/production.pdf and prod/b/production.pdf stay two
+    documents in the combined index and the case index.
+    """
+    found: Dict[str, str] = {}
+    for item in inputs:
+        if os.path.isdir(item):
+            root = item
+            candidates = glob.glob(os.path.join(item, "**", "*"), recursive=True)
+        else:
+            root = input_root(item)
+            candidates = glob.glob(item, recursive=True)
+        for path in candidates:
+            if os.path.isfile(path) and path.lower().endswith(BatchConfig.SUPPORTED_EXTENSIONS):
+                found.setdefault(os.path.abspath(path), os.path.relpath(path, root).replace(os.sep, "/"))
+    return sorted(found.items())
+
+
+def input_root(pattern: str) -> str:
+    """
+    Directory part of a glob pattern before its first wildcard (the file's own folder for a plain path).
+    """
+    parts = pattern.split(os.sep)
+    fixed = []
+    for part in parts[:-1]:
+        if glob.has_magic(part):
+            break
+        fixed.append(part)
+    return os.sep.join(fixed) or os.curdir
+
+
+def file_sha256(path: str) -> str:
+    """
+    Returns the SHA-256 hex digest of a file's content, read in 1 MB blocks.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# ------------------- Worker ------------------- #
+def index_file(path: str, source: str, part_path: str) -> Dict[str, Any]:
+    """
+    Runs DocumentExtractor over one PDF or text file and streams its rows into part_path, a CSV with
+    INDEX_HEADERS (Bate Number, Repair Order Number, Page Number). Executed inside a worker process.
+
+    PDFs go through DocumentExtractor.stream_pdf_index, so only one page of text and one row are held
+    in memory at a time, whatever the size of the production.
+
+    source is the file's name in the combined index (see discover_files); a text file's Bates number is
+    still read from its own file name.
+
+    Returns:
+        dict: rows written, pages_with_issues, total_pages, the stage metrics recorded for this file and,
+              if the file could not be indexed, an error message.
+    """
+    # Each worker is already one process of the pool, so extraction inside it stays serial
+    extractor = DocumentExtractor(workers=1)
+    # Worker processes are reused across files, so only what is recorded from here on belongs to this file
+    metrics_before = METRICS.snapshot()
+    try:
+        with open(part_path, "w", newline="", encoding="utf-8") as part_file:
+            if path.lower().endswith(".pdf"):
+                with open(path, "rb") as file:
+                    document_bytes = file.read()
+                streamed = extractor.stream_pdf_index(document_bytes, part_file, "CSV")
+                rows_written = streamed["Rows"]
+                pages_with_issues = streamed["Pages with issues"]
+                total_pages = streamed["Total pages"]
+            else:
+                # Text files are treated as a single page whose Bates number comes from the file name
+                with METRICS.timer(STAGE_REGEX_SCAN, pages=1, bytes=os.path.getsize(path)):
+                    repair_orders = extractor.processing_txt_path(path)
+                bate_numbers = extractor.extract_aaron_code(os.path.basename(path), is_filename=True)
+                if not repair_orders:
+                    raise ValueError("No repair orders found in the text file.")
+                if not bate_numbers:
+                    raise ValueError("No Bates numbers found in the document name.")
+                rows = extractor.iter_index_rows([(1, {bate_numbers[0]: repair_orders})])
+                rows_written = IndexExporter.write_csv(rows, part_file)
+                pages_with_issues = []
+                total_pages = 1
+
+        return {
+            "rows": rows_written,
+            "pages_with_issues": pages_with_issues,
+            "total_pages": total_pages,
+            "metrics": METRICS.since(metrics_before),
+            "error": None,
+        }
+    except Exception as e:
+        logger.error(f"Failed to index {source}: {str(e)}", exc_info=True)
+        return {
+            "rows": 0, "pages_with_issues": [], "total_pages": 0, "metrics": METRICS.since(metrics_before), "error": str(e),
+        }
+
+
+def iter_part_rows(part_path: str) -> Iterator[Tuple[str, str, int]]:
+    """
+    Reads (bate_number, repair_order_number, page_number) back from a part file written by index_file.
+    """
+    with open(part_path, "r", newline="", encoding="utf-8") as part_file:
+        reader = csv.reader(part_file)
+        next(reader, None)
+        for bate_number, repair_order_number, page_number in reader:
+            yield bate_number, repair_order_number, int(page_number)
+
+
+# ------------------- Batch Runner ------------------- #
+class BatchIndexer:
+    def __init__(self, output_path: str, workers: Optional[int] = None, case_index: Optional[CaseIndex] = None):
+        self.output_path = output_path
+        self.manifest_path = output_path + BatchConfig.MANIFEST_SUFFIX
+        self.workers = workers or os.cpu_count() or 1
+        self.manifest = self.load_manifest()
+        self.case_index = case_index
+        # Stage metrics of every file indexed by run, merged from the workers
+        self.metrics = PipelineMetrics()
+
+    def load_manifest(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Loads the content hashes already present in the combined index.
+        """
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path, "r") as file:
+            return json.load(file)
+
+    def save_manifest(self):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(self.manifest, file, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def pending_files(self, files: List[Tuple[str, str]]) -> List[Tuple[str, str, str]]:
+        """
+        Hashes every (path, source) file and drops those whose content is already indexed (including duplicates
+        within this run).
+
+        Returns:
+            List[Tuple[str, str, str]]: (path, source, content_hash) of the files to index.
+        """
+        pending = []
+        seen = set(self.manifest)
+        for path, source in files:
+            content_hash = file_sha256(path)
+            if content_hash in seen:
+                logger.info(f"Skipping {source}: content already indexed")
+                continue
+            seen.add(content_hash)
+            pending.append((path, source, content_hash))
+        return pending
+
+    def run(self, files: List[Tuple[str, str]]) -> Dict[str, int]:
+        """
+        Indexes every pending file on a process pool and appends its rows to the combined index.
+        Rows are written in file order as soon as each file finishes. Workers stream each file's rows
+        into a temporary part file, which is then copied row by row, so no file's rows are held in memory.
+        """
+        started = time.perf_counter()
+        pending = self.pending_files(files)
+        summary = {"files_found": len(files), "files_indexed": 0, "files_skipped": len(files) - len(pending),
+                   "files_failed": 0, "rows_written": 0}
+        if not pending:
+            logger.info("Nothing to index.")
+            return summary
+
+        write_header = not os.path.exists(self.output_path) or os.path.getsize(self.output_path) == 0
+        logger.info(f"Indexing {len(pending)} files with {self.workers} workers into {self.output_path}")
+        pages_indexed = 0
+
+        with open(self.output_path, "a", newline="", encoding="utf-8") as output_file, \
+                tempfile.TemporaryDirectory(prefix="batch_index_") as parts_dir, \
+                ProcessPoolExecutor(max_workers=self.workers) as executor:
+            writer = csv.writer(output_file)
+            if write_header:
+                writer.writerow(BatchConfig.INDEX_HEADERS)
+
+            part_paths = [os.path.join(parts_dir, f"{idx}.csv") for idx in range(len(pending))]
+            results = executor.map(
+                index_file, [path for path, _, _ in pending], [source for _, source, _ in pending], part_paths
+            )
+            for (path, source, content_hash), part_path, result in zip(pending, part_paths, results):
+                self.metrics.merge(result["metrics"])
+                if result["error"]:
+                    summary["files_failed"] += 1
+                    continue
+
+                with self.metrics.timer(STAGE_EXPORT, pages=result["total_pages"], rows=result["rows"]):
+                    for bate_number, repair_order_number, page_number in iter_part_rows(part_path):
+                        writer.writerow([source, bate_number, repair_order_number, page_number])
+                    output_file.flush()
+
+                if self.case_index is not None:
+                    self.case_index.merge(
+                        source,
+                        content_hash,
+                        (
+                            {"bate_number": bate_number, "repair_order_number": repair_order_number, "page_number": page_number}
+                            for bate_number, repair_order_number, page_number in iter_part_rows(part_path)
+                        ),
+                        result["total_pages"],
+                    )
+                os.remove(part_path)
+
+                # Record the hash only once the rows are on disk
+                self.manifest[content_hash] = {
+                    "file": source,
+                    "total_pages": result["total_pages"],
+                    "rows": result["rows"],
+                    "pages_with_issues": result["pages_with_issues"],
+                }
+                self.save_manifest()
+                summary["files_indexed"] += 1
+                summary["rows_written"] += result["rows"]
+                pages_indexed += result["total_pages"]
+                logger.info(f"Indexed {source}: {result['rows']} rows, "
+                            f"{len(result['pages_with_issues'])} pages with issues")
+
+        self.metrics.record(
+            STAGE_TOTAL, time.perf_counter() - started,
+            pages=pages_indexed,
+            bytes=sum(os.path.getsize(path) for path, _, _ in pending),
+        )
+        return summary
+
+
+# ------------------- CLI ------------------- #
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Index Bates-stamped PDFs and AARON*.txt files into one combined Bates / Repair Order CSV."
+    )
+    parser.add_argument("inputs", nargs="+", help="Directories (searched recursively) or glob patterns")
+    parser.add_argument("-o", "--output", default="combined_index.csv", help="Combined index CSV (appended to)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument(
+        "--case-index", nargs="?", const=CASE_INDEX_PATH, default=None, metavar="PATH",
+        help="Also merge every indexed file into the case-wide SQLite index (default path: CASE_INDEX_PATH)",
+    )
+    parser.add_argument(
+        "--metrics-json", metavar="PATH", default=None,
+        help="Write the run summary and per-stage metrics as JSON to PATH ('-' for stdout)",
+    )
+    return parser.parse_args(argv)
+
+
+def write_metrics_json(path: str, summary: Dict[str, int], metrics: PipelineMetrics):
+    """
+    Writes {"summary": ..., "stages": [...]} with one entry per stage (PipelineMetrics.summary).
+    """
+    report = {"summary": summary, "stages": PipelineMetrics.summary(metrics.snapshot())}
+    if path == "-":
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+        return
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    files = discover_files(args.inputs)
+    if not files:
+        logger.error("No PDF or text files found.")
+        return 1
+
+    case_index = CaseIndex(args.case_index) if args.case_index else None
+    indexer = BatchIndexer(args.output, args.workers, case_index)
+    summary = indexer.run(files)
+    logger.info(f"Batch complete: {json.dumps(summary)}")
+    if args.metrics_json:
+        write_metrics_json(args.metrics_json, summary, indexer.metrics)
+    return 1 if summary["files_failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
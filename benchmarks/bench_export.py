@@ -0,0 +1,94 @@
+"""
+Benchmark: in-memory openpyxl Workbook export vs the streaming write-only XLSX export.
+
+Run from the repository root:
+    python -m benchmarks.bench_export --rows 200000
+"""
+import argparse
+import io
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+from openpyxl import Workbook
+
+from benchmarks.corpus import synthetic_rows
+from utils.export_utils import INDEX_HEADERS, IndexExporter
+
+
+def legacy_xlsx(rows: List[Dict[str, Any]], pages_with_issues: List[int]) -> bytes:
+    """
+    The previous export path: a regular Workbook keeping one cell object per value until save().
+    """
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Index"
+    ws.append(INDEX_HEADERS)
+    for row in rows:
+        ws.append(IndexExporter.row_values(row))
+    if pages_with_issues:
+        ws_issues = wb.create_sheet(title="Pages with Issues")
+        ws_issues.append(["Page Number"])
+        for page_num in sorted(pages_with_issues):
+            ws_issues.append([page_num])
+    bytes_buffer = io.BytesIO()
+    wb.save(bytes_buffer)
+    return bytes_buffer.getvalue()
+
+
+def streaming_xlsx(rows: List[Dict[str, Any]], pages_with_issues: List[int]) -> bytes:
+    bytes_buffer = io.BytesIO()
+    IndexExporter.write_xlsx(rows, bytes_buffer, pages_with_issues)
+    return bytes_buffer.getvalue()
+
+
+def measure(name: str, export: Callable[[Any, List[int]], bytes], num_rows: int, lazy_rows: bool) -> Dict[str, Any]:
+    """
+    Times one export, then repeats it under tracemalloc to record peak Python heap usage
+    (tracing slows openpyxl down several times, so it is kept out of the timed run).
+    The row source is created inside both runs so each engine is charged for holding it.
+    """
+    pages_with_issues = list(range(1, num_rows // 100 + 1))
+
+    start = time.perf_counter()
+    rows = synthetic_rows(num_rows) if lazy_rows else list(synthetic_rows(num_rows))
+    export_bytes = export(rows, pages_with_issues)
+    elapsed = time.perf_counter() - start
+    del rows
+
+    tracemalloc.start()
+    rows = synthetic_rows(num_rows) if lazy_rows else list(synthetic_rows(num_rows))
+    export(rows, pages_with_issues)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "engine": name,
+        "rows": num_rows,
+        "seconds": elapsed,
+        "rows_per_sec": num_rows / elapsed if elapsed else float("inf"),
+        "peak_mb": peak / (1024 * 1024),
+        "output_mb": len(export_bytes) / (1024 * 1024),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 50000, 200000], help="Row counts to benchmark")
+    args = parser.parse_args()
+
+    print(f"{'engine':<22}{'rows':>10}{'seconds':>10}{'rows/sec':>12}{'peak MB':>10}{'xlsx MB':>10}")
+    for num_rows in args.rows:
+        for name, export, lazy_rows in (
+            ("legacy Workbook", legacy_xlsx, False),
+            ("streaming write-only", streaming_xlsx, True),
+        ):
+            result = measure(name, export, num_rows, lazy_rows)
+            print(
+                f"{result['engine']:<22}{result['rows']:>10,}{result['seconds']:>10.2f}"
+                f"{result['rows_per_sec']:>12,.0f}{result['peak_mb']:>10.1f}{result['output_mb']:>10.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
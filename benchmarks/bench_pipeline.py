@@ -0,0 +1,155 @@
+"""
+Benchmark: throughput, peak RSS and export time of the extraction pipeline on a synthetic production.
+
+Each case runs in a fresh process, so its peak RSS is its own. Fixtures come from benchmarks.corpus
+and are written once to CACHE_DIR/corpus. Nothing calls the network (no OCR or LLM).
+
+Run from the repository root:
+    python -m benchmarks.bench_pipeline --pages 1000 10000 100000
+    python -m benchmarks.bench_pipeline --pages 1000 --cases processing_txt_file --json results.json
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List
+
+from benchmarks import corpus
+from utils.extraction_utils import DocumentExtractor
+
+
+def peak_rss_mb() -> float:
+    """
+    Peak resident set size of this process so far (ru_maxrss is in KB on Linux, bytes on macOS).
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def structured_input(num_pages: int, seed: int) -> Dict[str, Any]:
+    """
+    is_text_based_pdf output for the generated production, built from the page texts without the PDF.
+    """
+    texts = [text for text in corpus.synthetic_pages(num_pages, seed) if text.strip()]
+    return {"Total pages": num_pages, "Text pages": len(texts), "Text": texts}
+
+
+def bench_is_text_based_pdf(extractor: DocumentExtractor, num_pages: int, seed: int, options: Dict[str, Any]):
+    with open(corpus.pdf_path(num_pages, seed), "rb") as file:
+        pdf_bytes = file.read()
+    start = time.perf_counter()
+    extracted_res = extractor.is_text_based_pdf(pdf_bytes)
+    return time.perf_counter() - start, {"pages": extracted_res["Total pages"], "bytes": len(pdf_bytes)}
+
+
+def bench_process_structured_ocr_pdf(extractor: DocumentExtractor, num_pages: int, seed: int, options: Dict[str, Any]):
+    extracted_res = structured_input(num_pages, seed)
+    start = time.perf_counter()
+    bate_dict, pages_with_issues = extractor.process_structured_ocr_pdf(extracted_res)
+    return time.perf_counter() - start, {
+        "pages": extracted_res["Text pages"], "bytes": sum(len(text) for text in extracted_res["Text"]),
+        "pages_with_issues": len(pages_with_issues),
+    }
+
+
+def bench_processing_txt_file(extractor: DocumentExtractor, num_pages: int, seed: int, options: Dict[str, Any]):
+    with open(corpus.txt_path(num_pages, seed), "rb") as file:
+        text_bytes = file.read()
+    # The decode is charged to the case, as the upload has to be decoded before the scan
+    start = time.perf_counter()
+    repair_orders = extractor.processing_txt_file(text_bytes.decode("utf-8"))
+    return time.perf_counter() - start, {"pages": num_pages, "bytes": len(text_bytes), "fow_codes": len(repair_orders)}
+
+
+def bench_processing_txt_path(extractor: DocumentExtractor, num_pages: int, seed: int, options: Dict[str, Any]):
+    path = corpus.txt_path(num_pages, seed)
+    start = time.perf_counter()
+    repair_orders = extractor.processing_txt_path(path)
+    return time.perf_counter() - start, {"pages": num_pages, "bytes": os.path.getsize(path), "fow_codes": len(repair_orders)}
+
+
+def bench_format_data_for_excel_or_csv(extractor: DocumentExtractor, num_pages: int, seed: int, options: Dict[str, Any]):
+    bate_dict, pages_with_issues = extractor.process_structured_ocr_pdf(structured_input(num_pages, seed))
+    start = time.perf_counter()
+    rows, export_bytes = extractor.format_data_for_excel_or_csv(bate_dict, options["output_format"], pages_with_issues)
+    return time.perf_counter() - start, {"pages": len(bate_dict), "bytes": len(export_bytes), "rows": len(rows)}
+
+
+# Benchmarked DocumentExtractor methods; processing_txt_path is the streaming counterpart of processing_txt_file
+CASES: Dict[str, Callable] = {
+    "is_text_based_pdf": bench_is_text_based_pdf,
+    "process_structured_ocr_pdf": bench_process_structured_ocr_pdf,
+    "processing_txt_file": bench_processing_txt_file,
+    "processing_txt_path": bench_processing_txt_path,
+    "format_data_for_excel_or_csv": bench_format_data_for_excel_or_csv,
+}
+
+
+def run_case(case: str, num_pages: int, seed: int, options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Runs one case; executed in a fresh worker process. Fixtures are created before the
+    baseline RSS is taken, so generating them is not charged to the case.
+    """
+    # The corpus has deliberate issue pages; one warning per page would drown the results table
+    logging.disable(logging.WARNING)
+    if case == "is_text_based_pdf":
+        corpus.pdf_path(num_pages, seed)
+    elif case.startswith("processing_txt"):
+        corpus.txt_path(num_pages, seed)
+    extractor = DocumentExtractor(workers=options["workers"])
+    baseline_rss = peak_rss_mb()
+    seconds, counters = CASES[case](extractor, num_pages, seed, options)
+    return {
+        "case": f"{case} ({options['output_format']})" if options["output_format"] else case,
+        "scale": num_pages,
+        "seconds": seconds,
+        "pages_per_sec": counters["pages"] / seconds if seconds else None,
+        "mb_per_sec": counters["bytes"] / (1024 * 1024) / seconds if seconds else None,
+        "baseline_rss_mb": baseline_rss,
+        "peak_rss_mb": peak_rss_mb(),
+        **counters,
+    }
+
+
+def run_isolated(case: str, num_pages: int, seed: int, options: Dict[str, Any]) -> Dict[str, Any]:
+    # A spawned process per case starts from a clean heap, so ru_maxrss only reflects that case
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(run_case, case, num_pages, seed, options).result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1000, 10000, 100000], help="Production sizes in pages")
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES), help="Cases to run")
+    parser.add_argument("--formats", nargs="+", default=["Excel", "CSV"], help="Export formats for format_data_for_excel_or_csv")
+    parser.add_argument("--workers", type=int, default=1, help="DocumentExtractor worker processes for PDF text extraction")
+    parser.add_argument("--seed", type=int, default=7, help="Corpus random seed")
+    parser.add_argument("--json", metavar="PATH", default=None, help="Also write the results as JSON to PATH")
+    args = parser.parse_args()
+
+    results: List[Dict[str, Any]] = []
+    print(f"{'case':<38}{'pages':>9}{'seconds':>10}{'pages/sec':>12}{'MB/sec':>9}{'base MB':>9}{'peak MB':>9}")
+    for num_pages in args.pages:
+        for case in args.cases:
+            formats = args.formats if case == "format_data_for_excel_or_csv" else [None]
+            for output_format in formats:
+                options = {"workers": args.workers, "output_format": output_format}
+                result = run_isolated(case, num_pages, args.seed, options)
+                results.append(result)
+                print(
+                    f"{result['case']:<38}{result['scale']:>9,}{result['seconds']:>10.2f}{result['pages_per_sec']:>12,.0f}"
+                    f"{result['mb_per_sec']:>9.1f}{result['baseline_rss_mb']:>9.0f}{result['peak_rss_mb']:>9.0f}"
+                )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmark: separate Bates and repair-order regex scans vs the single-pass DocumentExtractor.scan_page scanner.
+
+Run from the repository root:
+    python -m benchmarks.bench_scanner --pages 10000 100000
+"""
+import argparse
+import re
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from benchmarks.corpus import synthetic_pages
+from utils.extraction_utils import DocumentExtractor
+
+
+def legacy_scan(extractor: DocumentExtractor, text: str) -> Tuple[List[str], List[str]]:
+    """
+    The previous per-page path: one scan for Bates codes, then one with an uncompiled RO pattern.
+    """
+    return extractor.extract_aaron_code(text), re.findall(r'\b\d{5,6}\b', text)
+
+
+def single_pass_scan(extractor: DocumentExtractor, text: str) -> Tuple[List[str], List[str]]:
+    bate_numbers, repair_order_numbers, _ = extractor.scan_page(text)
+    return bate_numbers, repair_order_numbers
+
+
+def measure(name: str, scan: Callable[[DocumentExtractor, str], Any], pages: List[str]) -> Dict[str, Any]:
+    extractor = DocumentExtractor(workers=1)
+    start = time.perf_counter()
+    results = [scan(extractor, text) for text in pages]
+    elapsed = time.perf_counter() - start
+    return {
+        "engine": name,
+        "pages": len(pages),
+        "seconds": elapsed,
+        "pages_per_sec": len(pages) / elapsed if elapsed else float("inf"),
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[10000, 100000], help="Page counts to benchmark")
+    args = parser.parse_args()
+
+    print(f"{'engine':<22}{'pages':>10}{'seconds':>10}{'pages/sec':>12}")
+    for num_pages in args.pages:
+        pages = synthetic_pages(num_pages)
+        results = []
+        for name, scan in (("legacy two-scan", legacy_scan), ("single-pass scanner", single_pass_scan)):
+            result = measure(name, scan, pages)
+            results.append(result.pop("results"))
+            print(
+                f"{result['engine']:<22}{result['pages']:>10,}{result['seconds']:>10.2f}"
+                f"{result['pages_per_sec']:>12,.0f}"
+            )
+        if results[0] != results[1]:
+            raise SystemExit("Scanner output differs from the legacy scans")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+Synthetic Bates-stamped productions for the benchmarks: repair-order PDFs and AARON*.txt files.
+
+Every page is a dealer repair order with an AARON Bates stamp, an RO header, a labor / parts table,
+FOW codes and distractor numbers (dates, phone numbers, VINs, customer IDs). About 2% of the pages
+are blank and 1% carry a second Bates stamp, so the extractor's issue paths are exercised too.
+The same seed always gives the same corpus.
+
+Write a corpus to disk (default folder: CACHE_DIR/corpus):
+    python -m benchmarks.corpus --pages 1000 10000
+"""
+import argparse
+import os
+import random
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List
+
+from utils.cache_utils import CACHE_DIR
+
+# Folder the benchmark fixtures are written to and reused from
+CORPUS_DIR = os.path.join(CACHE_DIR, "corpus")
+# Share of blank pages and of pages with two Bates stamps
+BLANK_PAGE_RATE = 0.02
+MULTI_BATES_RATE = 0.01
+# First Bates number of a generated production
+FIRST_BATES = 1
+
+# US Letter, in PDF points
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792
+FONT_SIZE = 9
+LINE_HEIGHT = 11
+
+OPERATIONS = [
+    ("BRAKE INSPECTION", "BR100"), ("OIL AND FILTER CHANGE", "LOF01"), ("TIRE ROTATION", "TR200"),
+    ("TRANSMISSION FLUID SERVICE", "TF310"), ("CHECK ENGINE LIGHT DIAG", "DG450"), ("ALIGNMENT 4 WHEEL", "AL400"),
+    ("COOLANT FLUSH", "CF220"), ("BATTERY TEST AND REPLACE", "BT120"), ("WIPER BLADES", "WB010"),
+    ("CABIN AIR FILTER", "CA050"), ("SPARK PLUGS REPLACE", "SP600"), ("RECALL CAMPAIGN", "RC900"),
+]
+TECHNICIANS = ["T104", "T117", "T121", "T133", "T148", "T152"]
+NOTES = [
+    "CUSTOMER STATES NOISE FROM FRONT WHEELS WHEN BRAKING",
+    "PERFORMED MULTI POINT INSPECTION AND ROAD TEST",
+    "REFER TO PRIOR VISIT FOR WARRANTY COVERAGE",
+    "PARTS ON BACK ORDER CUSTOMER NOTIFIED BY PHONE",
+    "GOODWILL APPROVED BY SERVICE MANAGER",
+    "VEHICLE WASHED AND VACUUMED COMPLIMENTARY",
+]
+# Ways a FOW code is written in OCR output; the text-file scanner ignores spacing and case
+FOW_FORMS = ["FOW{code}", "FOWS{code}", "fow {code}", "F O W S {spaced}"]
+
+
+def bates_number(page_num: int) -> str:
+    return f"AARON{FIRST_BATES + page_num - 1:010d}"
+
+
+def page_lines(rng: random.Random, page_num: int) -> List[str]:
+    """
+    Lines of one production page (empty for a blank page), Bates stamp last.
+    """
+    if rng.random() < BLANK_PAGE_RATE:
+        return []
+
+    repair_order = rng.randint(10000, 999999)
+    lines = [
+        "RIVERSIDE MOTORS SERVICE DEPARTMENT    1200 AUTO MALL DR    PHONE 555-0142",
+        f"REPAIR ORDER {repair_order}    DATE {rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}/20{rng.randint(15, 23)}"
+        f"    MILEAGE {rng.randint(1000, 180000)}",
+        f"VIN 1HGCM8{rng.randint(0, 9999999):07d}{rng.randint(100, 999)}    CUSTOMER {rng.randint(0, 9999999):07d}"
+        f"    ADVISOR {rng.choice(TECHNICIANS)}",
+        "LINE  OPCODE  DESCRIPTION                     TECH   HOURS    AMOUNT",
+    ]
+    for line_num in range(1, rng.randint(6, 18) + 1):
+        operation, opcode = rng.choice(OPERATIONS)
+        lines.append(
+            f"{line_num:>4}  {opcode}   {operation:<30}  {rng.choice(TECHNICIANS)}  {rng.uniform(0.2, 6):>5.1f}  {rng.uniform(15, 1800):>8.2f}"
+        )
+        if rng.random() < 0.25:
+            code = f"{rng.randint(0, 99999):05d}"
+            fow = rng.choice(FOW_FORMS).format(code=code, spaced=" ".join(code))
+            lines.append(f"      SEE {fow} FOR FIELD OPERATIONS WARRANTY")
+    if rng.random() < 0.3:
+        lines.append(f"      RELATED REPAIR ORDER {rng.randint(10000, 999999)}")
+    lines.extend(rng.sample(NOTES, rng.randint(1, 3)))
+    lines.append(f"TOTAL LABOR {rng.uniform(50, 2500):.2f}    TOTAL PARTS {rng.uniform(0, 3000):.2f}    TAX 8.25%")
+    if rng.random() < MULTI_BATES_RATE:
+        lines.append(bates_number(page_num + 100000))
+    lines.append(bates_number(page_num))
+    return lines
+
+
+def iter_pages(num_pages: int, seed: int = 7) -> Iterator[List[str]]:
+    """
+    Yields the lines of pages 1..num_pages.
+    """
+    rng = random.Random(seed)
+    for page_num in range(1, num_pages + 1):
+        yield page_lines(rng, page_num)
+
+
+def synthetic_pages(num_pages: int, seed: int = 7) -> List[str]:
+    """
+    Page texts as PyMuPDF returns them from a generated PDF (blank pages are empty strings).
+    """
+    return ["\n".join(lines) + "\n" if lines else "" for lines in iter_pages(num_pages, seed)]
+
+
+def synthetic_rows(num_rows: int, ros_per_page: int = 4, seed: int = 7) -> Iterator[Dict[str, Any]]:
+    """
+    Yields index rows shaped like DocumentExtractor.iter_index_rows output.
+    """
+    rng = random.Random(seed)
+    for i in range(num_rows):
+        page_num = i // ros_per_page + 1
+        yield {
+            "page_number": page_num,
+            "bate_number": bates_number(page_num),
+            "repair_order_number": str(rng.randint(10000, 999999)),
+        }
+
+
+def _pdf_string(text: str) -> bytes:
+    return b"(" + text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)").encode("latin-1") + b")"
+
+
+def _content_stream(lines: List[str]) -> bytes:
+    if not lines:
+        return b""
+    *body, stamp = lines
+    ops = [b"BT /F1 %d Tf %d TL 54 740 Td" % (FONT_SIZE, LINE_HEIGHT)]
+    for line in body:
+        ops.append(_pdf_string(line) + b" Tj T*")
+    # The Bates stamp sits in the bottom right corner, as on a real production
+    ops.append(b"ET BT /F1 10 Tf 460 30 Td " + _pdf_string(stamp) + b" Tj ET")
+    return b"\n".join(ops)
+
+
+def write_pdf(pages: Iterable[List[str]], sink: BinaryIO) -> int:
+    """
+    Writes pages as an uncompressed PDF using the built-in Helvetica font, one object at a time,
+    so 100k-page files are produced in seconds and in bounded memory.
+
+    Objects: 1 catalog, 2 page tree (written last, once the page count is known), 3 font,
+    then a content stream and a page object per page.
+
+    Returns:
+        int: Number of pages written.
+    """
+    offsets: List[int] = []
+    position = 0
+
+    def write_object(body: bytes):
+        nonlocal position
+        offsets.append(position)
+        chunk = b"%d 0 obj\n" % len(offsets) + body + b"\nendobj\n"
+        sink.write(chunk)
+        position += len(chunk)
+
+    header = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+    sink.write(header)
+    position = len(header)
+    write_object(b"<< /Type /Catalog /Pages 2 0 R >>")
+    # Placeholder, so the page tree keeps object number 2; its real offset is set below
+    offsets.append(0)
+    write_object(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+
+    page_ids = []
+    for lines in pages:
+        content = _content_stream(lines)
+        write_object(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        write_object(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>"
+            % (PAGE_WIDTH, PAGE_HEIGHT, len(offsets))
+        )
+        page_ids.append(len(offsets))
+
+    offsets[1] = position
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    chunk = b"2 0 obj\n<< /Type /Pages /Count %d /Kids [%s] >>\nendobj\n" % (len(page_ids), kids)
+    sink.write(chunk)
+    position += len(chunk)
+
+    sink.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(offsets) + 1))
+    sink.write(b"".join(b"%010d 00000 n \n" % offset for offset in offsets))
+    sink.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(offsets) + 1, position))
+    return len(page_ids)
+
+
+def write_txt(pages: Iterable[List[str]], sink: BinaryIO) -> int:
+    """
+    Writes pages as one UTF-8 text file, pages separated by form feeds like OCR text exports.
+
+    Returns:
+        int: Number of bytes written.
+    """
+    written = 0
+    for lines in pages:
+        chunk = ("\n".join(lines) + "\n\f").encode("utf-8")
+        sink.write(chunk)
+        written += len(chunk)
+    return written
+
+
+def pdf_path(num_pages: int, seed: int = 7, corpus_dir: str = CORPUS_DIR) -> str:
+    """
+    Path of the generated production PDF, written on first use.
+    """
+    path = os.path.join(corpus_dir, f"production_{num_pages}_{seed}.pdf")
+    if not os.path.exists(path):
+        _write_atomic(path, lambda sink: write_pdf(iter_pages(num_pages, seed), sink))
+    return path
+
+
+def txt_path(num_pages: int, seed: int = 7, corpus_dir: str = CORPUS_DIR) -> str:
+    """
+    Path of the generated AARON*.txt file (named after its first Bates number), written on first use.
+    """
+    path = os.path.join(corpus_dir, f"{num_pages}_{seed}", f"{bates_number(1)}.txt")
+    if not os.path.exists(path):
+        _write_atomic(path, lambda sink: write_txt(iter_pages(num_pages, seed), sink))
+    return path
+
+
+def _write_atomic(path: str, write):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as sink:
+        write(sink)
+    os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1000], help="Page counts to generate")
+    parser.add_argument("--seed", type=int, default=7, help="Random seed")
+    parser.add_argument("--out", default=CORPUS_DIR, help="Output folder")
+    args = parser.parse_args()
+
+    for num_pages in args.pages:
+        for path in (pdf_path(num_pages, args.seed, args.out), txt_path(num_pages, args.seed, args.out)):
+            print(f"{path}  {os.path.getsize(path) / (1024 * 1024):.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,17 @@
 import streamlit as st
 import logging
-import json
 import pandas as pd
 import io
+import hashlib
 from datetime import datetime
-from openpyxl import Workbook
-from utils.ocr_utils import PdfProcessor
-from utils.llm_utils import LLMService
 from utils.extraction_utils import DocumentExtractor
+from utils.export_utils import IndexExporter, EXPORT_FORMATS
+from utils.index_utils import BatesIndex, ExtractionTable, BATE_FIELD, RO_FIELD
+from utils.columnar_utils import IndexArchive, COLUMNAR_FORMATS
+from utils.case_index_utils import CaseIndex, CASE_INDEX
+from utils.metrics_utils import PipelineMetrics, STAGE_EXPORT, STAGE_REGEX_SCAN
+from utils.job_utils import JobStore, ENGINE_AI, ENGINE_TEXT_LAYER, JOB_COMPLETED, JOB_FAILED, JOB_QUEUED
+from utils.job_worker import JobWorkerPool
 
 # ------------------- Configuration ------------------- #
 class AppConfig:
@@ -20,15 +24,32 @@ class AppConfig:
     
     DOCUMENT_TYPES = {
         "PDF": "PDF File (Extracted or Already OCR)",
-        "TEXT": "Text File"
+        "TEXT": "Text File",
+        "INDEX": "Saved Index (Parquet or Arrow)"
     }
 
+    PROCESSING_ENGINES = {
+        "TEXT_LAYER": "Text layer (fast regex)",
+        "AI": "OCR + AI extraction"
+    }
+
+    # Maximum number of distinct values returned by a prefix search in the data viewer
+    MAX_PREFIX_MATCHES = 500
+
+    # Seconds between job progress refreshes while a document is processed in the background
+    JOB_POLL_SECONDS = 2
+
 # ------------------- Service Manager ------------------- #
 class ServiceManager:
     @staticmethod
-    def init_service(service_cls, name: str):
+    @st.cache_resource(show_spinner=False)
+    def init_service(_service_cls, name: str):
+        """
+        Builds each service once per server process; every rerun and session reuses the same instance
+        (and its pooled HTTP connections). The cache is keyed by name.
+        """
         try:
-            service = service_cls()
+            service = _service_cls()
             logging.info(f"{name} initialized successfully.")
             return service
         except Exception as e:
@@ -46,7 +67,8 @@ class SessionManager:
             'extraction_results': None,
             'document_type': None,
             'document_bytes': None,
-            'document_filename': None
+            'document_filename': None,
+            'job_id': None
         }
         for key, value in defaults.items():
             if key not in st.session_state:
@@ -135,10 +157,23 @@ class SectionRenderer:
             st.markdown("### ⚙️ Configuration Panel")
             st.markdown("---")
             st.markdown("**Output Format**")
-            output_format = st.radio("Select export format:", ("Excel", "CSV"), help="Choose how you want to download the extracted data")
+            output_format = st.radio("Select export format:", tuple(EXPORT_FORMATS), help="Choose how you want to download the extracted data")
+            st.markdown("---")
+            st.markdown("**PDF Processing Engine**")
+            processing_engine = st.radio(
+                "Select processing engine:",
+                list(AppConfig.PROCESSING_ENGINES.values()),
+                help="The text-layer engine reads the PDF directly; the AI engine runs Mistral OCR and sends page chunks to the LLM concurrently"
+            )
+            hybrid_ocr = st.checkbox(
+                "Hybrid OCR (send only image-only pages to OCR)",
+                value=True,
+                disabled=processing_engine != AppConfig.PROCESSING_ENGINES["AI"],
+                help="Pages that already have a text layer are read locally; only scanned pages are uploaded to Mistral OCR"
+            )
             st.markdown("---")
             
-        return output_format
+        return output_format, processing_engine, hybrid_ocr
 
     @staticmethod
     def render_upload_section():
@@ -159,9 +194,14 @@ class SectionRenderer:
                 st.session_state.document_type = document_type
                 
                 is_pdf = document_type == AppConfig.DOCUMENT_TYPES["PDF"]
-                accepted_types = ["pdf"] if is_pdf else ["txt"]
-                file_type_label = "PDF" if is_pdf else "Text"
-                recommendation = "✨ Recommended: Bates-stamped court-ready PDF documents" if is_pdf else "✨ Upload a plain text file (.txt) containing document content"
+                if document_type == AppConfig.DOCUMENT_TYPES["INDEX"]:
+                    accepted_types = ["parquet", "arrow", "feather"]
+                    file_type_label = "Index"
+                    recommendation = "✨ Reopen an index saved from this app in Parquet or Arrow format"
+                else:
+                    accepted_types = ["pdf"] if is_pdf else ["txt"]
+                    file_type_label = "PDF" if is_pdf else "Text"
+                    recommendation = "✨ Recommended: Bates-stamped court-ready PDF documents" if is_pdf else "✨ Upload a plain text file (.txt) containing document content"
                 
                 st.markdown("<br>", unsafe_allow_html=True)
                 uploaded_file = st.file_uploader(f"Upload {file_type_label} File", type=accepted_types, help=recommendation, key="file_uploader")
@@ -198,6 +238,9 @@ class SectionRenderer:
                     st.session_state.extraction_results = None
                     st.session_state.extraction_complete = False
                     st.session_state.processing_stage = 1
+                    st.session_state.job_id = None
+                    if "job" in st.query_params:
+                        del st.query_params["job"]
                     
                     logging.info(f"Cleared previous session state. Reason: {'New file' if is_new_file else 'Document type changed'}")
                 
@@ -286,12 +329,11 @@ class SectionRenderer:
             st.markdown('<div class="section-header"><span class="section-icon">📊</span>Extraction Summary</div>', unsafe_allow_html=True)
             
             results = st.session_state.extraction_results
-            responses = results.get("responses", [])
+            table = results["table"]
             total_pages = results.get("total_pages", 0)
             
-            repair_orders_found = sum(1 for row in responses if str(row.get("repair_order_number", "")).strip())
-            bates_numbers = {row.get("bate_number") for row in responses if row.get("bate_number")}
-            bates_found = len(bates_numbers)
+            repair_orders_found = table.num_ros
+            bates_found = table.unique_bates
             pages_with_issues = results.get("pages_with_issues", [])
             
             metrics = [
@@ -305,6 +347,21 @@ class SectionRenderer:
                 for col, (label, value) in zip(cols, metrics[i:i+3]):
                     with col:
                         st.metric(label, value)
+
+            # Which extraction tier resolved the pages (AI jobs send only regex failures to the LLM)
+            tier_stats = results.get("tier_stats") or {}
+            if "llm_pages" in tier_stats:
+                st.caption(
+                    f"🧮 Resolved by regex: {tier_stats.get('regex_pages', 0):,} pages · "
+                    f"by AI: {tier_stats.get('llm_pages', 0):,} pages · "
+                    f"unresolved: {tier_stats.get('unresolved_pages', 0):,} pages"
+                )
+
+            # Per-stage timings of the job, plus the exports built so far in this session
+            stages = results["metrics"].snapshot()
+            if stages:
+                with st.expander("⏱️ Pipeline metrics"):
+                    st.dataframe(pd.DataFrame(PipelineMetrics.summary(stages)), width="stretch", hide_index=True)
             
             # Display pages with issues summary
             st.markdown("<br>", unsafe_allow_html=True)
@@ -327,7 +384,7 @@ class SectionRenderer:
             st.markdown('</div>', unsafe_allow_html=True)
 
     @staticmethod
-    def render_download_section():
+    def render_download_section(output_format):
         if not st.session_state.extraction_complete or not st.session_state.extraction_results:
             return
 
@@ -336,17 +393,12 @@ class SectionRenderer:
             st.markdown('<div class="section-header"><span class="section-icon">⬇️</span> Download Results</div>', unsafe_allow_html=True)
             
             results = st.session_state.extraction_results
-            export_bytes = results.get("export_bytes", b"")
-            export_format = results.get("export_format", "Excel")
             pages_with_issues = results.get("pages_with_issues", [])
             
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            if export_format == "CSV":
-                index_filename = f"extraction_results_{timestamp}.csv"
-                index_mime = "text/csv"
-            else:
-                index_filename = f"extraction_results_{timestamp}.xlsx"
-                index_mime = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            extension, index_mime = EXPORT_FORMATS[output_format]
+            index_filename = f"extraction_results_{timestamp}{extension}"
+            export_bytes = ExportManager.get_export(results, output_format)
             
             col1, col2 = st.columns(2)
             
@@ -362,38 +414,19 @@ class SectionRenderer:
             with col2:
                 if pages_with_issues:
                     # Create pages with issues file
-                    pages_list = sorted(pages_with_issues)
-                    if export_format == "CSV":
-                        buffer = io.StringIO()
-                        buffer.write("Page Number\n")
-                        for page_num in pages_list:
-                            buffer.write(f"{page_num}\n")
-                        issues_bytes = buffer.getvalue().encode("utf-8")
-                        issues_filename = f"pages_with_issues_{timestamp}.csv"
-                        issues_mime = "text/csv"
-                    else:
-                        # Excel format
-                        wb = Workbook()
-                        ws = wb.active
-                        ws.title = "Pages with Issues"
-                        ws.append(["Page Number"])
-                        for page_num in pages_list:
-                            ws.append([page_num])
-                        bytes_buffer = io.BytesIO()
-                        wb.save(bytes_buffer)
-                        issues_bytes = bytes_buffer.getvalue()
-                        issues_filename = f"pages_with_issues_{timestamp}.xlsx"
-                        issues_mime = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                    issues_format = "CSV" if output_format == "CSV" else "Excel"
+                    issues_bytes = ExportManager.get_issues_export(results, issues_format)
+                    issues_extension, issues_mime = EXPORT_FORMATS[issues_format]
                     
                     st.download_button(
                         label="⚠️ Download Pages with Issues",
                         data=issues_bytes,
-                        file_name=issues_filename,
+                        file_name=f"pages_with_issues_{timestamp}{issues_extension}",
                         mime=issues_mime,
                         width="stretch"
                     )
                 else:
-                    json_data = json.dumps(results['responses'], indent=2)
+                    json_data = ExportManager.get_export(results, "JSON")
                     st.download_button(
                         label="📄 Download Raw JSON",
                         data=json_data,
@@ -414,25 +447,26 @@ class SectionRenderer:
             st.markdown('<div class="section-header"><span class="section-icon">🔍</span> Data Viewer & Search</div>', unsafe_allow_html=True)
             
             results = st.session_state.extraction_results
-            responses = results.get("responses", [])
+            table = results["table"]
             
-            if not responses:
+            if not table.num_entries:
                 st.warning("No data available to display.")
                 st.markdown('</div>', unsafe_allow_html=True)
                 return
             
-            # Convert responses to DataFrame
-            df = pd.DataFrame(responses)
+            # DataFrame and inverted index are built once per extraction, not on every rerun
+            df = ViewerCache.get_dataframe(results)
+            bates_index = ViewerCache.get_index(results)
             
             # Add search controls
             st.markdown("""
                 <p style="color: #5F6C7B; margin-bottom: 20px;">
-                    Use the search controls below to find and highlight specific records in your extracted data.
+                    Use the search controls below to filter your extracted data down to specific records.
                 </p>
             """, unsafe_allow_html=True)
             
-            # Create two columns for search type and search input
-            col1, col2 = st.columns([1, 2])
+            # Create columns for search type, search input and match mode
+            col1, col2, col3 = st.columns([1, 2, 0.6])
             
             with col1:
                 search_type = st.selectbox(
@@ -446,57 +480,64 @@ class SectionRenderer:
                 if search_type == "Bate Number":
                     placeholder_text = "Enter Bate Number (e.g., AARON0001302)"
                     search_icon = "🏷️"
-                    column_to_search = "bate_number"
+                    column_to_search = BATE_FIELD
                 else:
                     placeholder_text = "Enter Repair Order Number (e.g., 12345)"
                     search_icon = "🔧"
-                    column_to_search = "repair_order_number"
+                    column_to_search = RO_FIELD
                 
                 search_term = st.text_input(
                     f"{search_icon} Search {search_type}:",
                     placeholder=placeholder_text,
-                    help=f"Enter a {search_type} to highlight all matching rows",
+                    help=f"Enter a {search_type} to show only the matching rows",
                     key="search_input",
                     label_visibility="collapsed"
                 )
             
+            with col3:
+                prefix_match = st.checkbox("Prefix match", key="search_prefix", help="Match every value starting with the search term")
+            
             st.markdown("<br>", unsafe_allow_html=True)
             
-            # Display dataframe with highlighting (Exact match search)
             if search_term and search_term.strip():
-                search_value = search_term.strip().upper()
+                search_value = search_term.strip()
+                
+                # Look matches up in the inverted index instead of scanning the column
+                if prefix_match:
+                    matched_keys = bates_index.prefix_search(column_to_search, search_value, limit=AppConfig.MAX_PREFIX_MATCHES)
+                else:
+                    matched_keys = [BatesIndex.normalize(search_value)] if bates_index.rows_for(column_to_search, search_value) else []
+                positions = sorted(
+                    position for key in matched_keys for position in bates_index.rows_for(column_to_search, key)
+                )
                 
-                # Check if the column exists
-                if column_to_search in df.columns:
-                    # Create a mask for exact matching rows (case-insensitive)
-                    mask = df[column_to_search].astype(str).str.upper() == search_value
+                if positions:
+                    # Show success message
+                    st.success(f"✅ Found {len(positions)} row(s) matching '{search_term}'")
                     
-                    matching_count = mask.sum()
+                    # Bates list per repair order, ready to copy (the copy icon sits on the code block)
+                    if column_to_search == RO_FIELD:
+                        st.markdown("**All Bates numbers for this Repair Order** (comma-separated, ready to copy)")
+                        if len(matched_keys) == 1:
+                            st.code(bates_index.bates_csv_for_ro(matched_keys[0]), language=None)
+                        else:
+                            st.dataframe(
+                                pd.DataFrame({
+                                    "Repair Order Number": matched_keys,
+                                    "Bates Numbers": [bates_index.bates_csv_for_ro(key) for key in matched_keys],
+                                }),
+                                width="stretch",
+                                hide_index=True,
+                            )
                     
-                    if matching_count > 0:
-                        # Show success message
-                        st.success(f"✅ Found {matching_count} row(s) matching '{search_term}'")
-                        
-                        # Apply styling to highlight matching rows
-                        def highlight_rows(row):
-                            row_value = str(row[column_to_search]).upper()
-                            
-                            if row_value == search_value:
-                                return ['background-color: #FFF3CD; font-weight: bold'] * len(row)
-                            return [''] * len(row)
-                        
-                        styled_df = df.style.apply(highlight_rows, axis=1)
-                        st.dataframe(styled_df, width="stretch", height=450)
-                        
-                    else:
-                        st.warning(f"⚠️ No rows found matching '{search_term}'")
-                        st.dataframe(df, width="stretch", height=450)
+                    # Only the matching rows are rendered
+                    st.dataframe(df.iloc[positions], width="stretch", height=450)
                 else:
-                    st.error(f"❌ Column '{column_to_search}' not found in the data.")
+                    st.warning(f"⚠️ No rows found matching '{search_term}'")
                     st.dataframe(df, width="stretch", height=450)
             else:
-                # Display full dataframe without highlighting
-                st.info(f"💡 Enter a {search_type} above to search and highlight matching rows.")
+                # Display the full dataframe until a search term filters it
+                st.info(f"💡 Enter a {search_type} above to show only the matching rows.")
                 st.dataframe(df, width="stretch", height=450)
             
             # Display statistics
@@ -506,12 +547,12 @@ class SectionRenderer:
                 st.markdown(f"""
                     <div style="padding: 12px; background: #DDEBFF; border-radius: 8px; text-align: center;">
                         <div style="font-size: 0.85rem; color: #5F6C7B; margin-bottom: 4px;">Total Rows</div>
-                        <div style="font-size: 1.5rem; font-weight: 700; color: #1C2D4A;">{len(df)}</div>
+                        <div style="font-size: 1.5rem; font-weight: 700; color: #1C2D4A;">{table.num_rows}</div>
                     </div>
                 """, unsafe_allow_html=True)
             
             with col_stat2:
-                unique_bates = df['bate_number'].nunique() if 'bate_number' in df.columns else 0
+                unique_bates = table.unique_bates
                 st.markdown(f"""
                     <div style="padding: 12px; background: #DAF5DB; border-radius: 8px; text-align: center;">
                         <div style="font-size: 0.85rem; color: #5F6C7B; margin-bottom: 4px;">Unique Bates</div>
@@ -520,7 +561,7 @@ class SectionRenderer:
                 """, unsafe_allow_html=True)
             
             with col_stat3:
-                unique_ros = df['repair_order_number'].nunique() if 'repair_order_number' in df.columns else 0
+                unique_ros = bates_index.unique_ros
                 st.markdown(f"""
                     <div style="padding: 12px; background: #FFF3CD; border-radius: 8px; text-align: center;">
                         <div style="font-size: 0.85rem; color: #5F6C7B; margin-bottom: 4px;">Unique ROs</div>
@@ -530,60 +571,274 @@ class SectionRenderer:
             
             st.markdown('</div>', unsafe_allow_html=True)
 
+    @staticmethod
+    def render_case_search_section(case_index):
+        stats = case_index.stats()
+        if not stats["documents"]:
+            return
+
+        with st.container():
+            st.markdown('<div class="card">', unsafe_allow_html=True)
+            st.markdown('<div class="section-header"><span class="section-icon">🗂️</span> Case-wide Search</div>', unsafe_allow_html=True)
+            st.caption(
+                f"Every processed document is merged into one case index: {stats['documents']:,} documents, "
+                f"{stats['bates']:,} Bates pages, {stats['ro_pages']:,} repair order pages."
+            )
+
+            col1, col2 = st.columns([2, 0.6])
+            with col1:
+                search_term = st.text_input(
+                    "🔧 Repair Order Number:",
+                    placeholder="Enter Repair Order Number (e.g., 12345)",
+                    key="case_search_input",
+                    label_visibility="collapsed"
+                )
+            with col2:
+                prefix_match = st.checkbox("Prefix match", key="case_search_prefix", help="Match every repair order starting with the search term")
+
+            if search_term and search_term.strip():
+                search_value = search_term.strip()
+                if prefix_match:
+                    matched_keys = case_index.prefix_search(search_value, limit=AppConfig.MAX_PREFIX_MATCHES)
+                    if matched_keys:
+                        st.dataframe(
+                            pd.DataFrame({
+                                "Repair Order Number": matched_keys,
+                                "Bates Numbers": [case_index.bates_csv_for_ro(key) for key in matched_keys],
+                            }),
+                            width="stretch",
+                            hide_index=True,
+                        )
+                    else:
+                        st.warning(f"⚠️ No repair orders in the case start with '{search_value}'")
+                else:
+                    rows = case_index.pages_for_ro(search_value)
+                    if rows:
+                        st.success(f"✅ Repair order {search_value} appears on {len(rows)} Bates page(s)")
+                        st.markdown("**All Bates numbers for this Repair Order** (comma-separated, ready to copy)")
+                        st.code(", ".join(row[BATE_FIELD] for row in rows), language=None)
+                        st.dataframe(
+                            pd.DataFrame(rows).rename(columns={
+                                "bate_number": "Bate Number", "page_number": "Page Number", "source": "Source File",
+                            }),
+                            width="stretch",
+                            hide_index=True,
+                        )
+                    else:
+                        st.warning(f"⚠️ Repair order {search_value} was not found in the case index")
+
+            st.markdown('</div>', unsafe_allow_html=True)
+
+# ------------------- Export Manager ------------------- #
+class ExportManager:
+    """
+    Builds export files on demand from the stored extraction result and memoises them per format,
+    so switching the export format never re-runs extraction and each format is encoded at most once.
+    """
+
+    @staticmethod
+    def get_export(results, output_format):
+        exports = results.setdefault("exports", {})
+        if output_format not in exports:
+            logging.info(f"Building {output_format} export")
+            table = results["table"]
+            with results["metrics"].timer(STAGE_EXPORT, pages=table.num_entries, rows=table.num_rows) as measured:
+                if output_format.upper() in COLUMNAR_FORMATS:
+                    # Written straight from the table columns, with issue flags, and reopenable as a saved index
+                    exports[output_format] = IndexArchive.export_bytes(
+                        table, output_format, results.get("pages_with_issues", []),
+                        results.get("total_pages"), results.get("tier_stats"),
+                    )
+                else:
+                    rows = table.iter_rows()
+                    exports[output_format] = IndexExporter.export_bytes(rows, output_format, results.get("pages_with_issues", []))
+                measured["bytes"] = len(exports[output_format])
+        return exports[output_format]
+
+    @staticmethod
+    def get_issues_export(results, output_format):
+        exports = results.setdefault("issue_exports", {})
+        if output_format not in exports:
+            pages_list = sorted(results.get("pages_with_issues", []))
+            if output_format == "CSV":
+                buffer = io.StringIO()
+                buffer.write("Page Number\n")
+                for page_num in pages_list:
+                    buffer.write(f"{page_num}\n")
+                exports[output_format] = buffer.getvalue().encode("utf-8")
+            else:
+                bytes_buffer = io.BytesIO()
+                IndexExporter.write_issues_xlsx(pages_list, bytes_buffer)
+                exports[output_format] = bytes_buffer.getvalue()
+        return exports[output_format]
+
+# ------------------- Viewer Cache ------------------- #
+class ViewerCache:
+    """
+    Objects derived from the extraction table for the data viewer, built on first use and kept
+    in the session result so reruns (e.g. each search keystroke) only do lookups.
+    """
+
+    @staticmethod
+    def get_dataframe(results):
+        if results.get("dataframe") is None:
+            results["dataframe"] = results["table"].to_dataframe()
+        return results["dataframe"]
+
+    @staticmethod
+    def get_index(results):
+        if results.get("bates_index") is None:
+            results["bates_index"] = BatesIndex(results["table"].iter_rows())
+        return results["bates_index"]
+
+# ------------------- Job Monitor ------------------- #
+class JobMonitor:
+    """
+    Live view of a queued or running job. Only this fragment re-runs while the workers process the
+    document, so the rest of the page stays responsive; the whole app reruns once the job finishes.
+    """
+
+    @staticmethod
+    @st.fragment(run_every=AppConfig.JOB_POLL_SECONDS)
+    def render_progress(job_store, job_id):
+        job = job_store.get_job(job_id)
+        if job is None or job["status"] in (JOB_COMPLETED, JOB_FAILED):
+            st.rerun()
+
+        total_pages = job["total_pages"] or 0
+        if job["status"] == JOB_QUEUED:
+            message = f"🕒 {job['file_name']} is queued and will start as soon as a worker is free..."
+        elif job["engine"] == ENGINE_AI and not job["pages_done"]:
+            message = f"🔄 OCR in progress for {job['file_name']}..."
+        else:
+            message = f"📄 {job['pages_done']:,}/{total_pages:,} pages of {job['file_name']} processed and saved..."
+        st.markdown(f'<div class="status-processing">{message}</div>', unsafe_allow_html=True)
+        st.progress(min(job["pages_done"] / total_pages, 1.0) if total_pages else 0)
+        st.caption(f"Job ID: {job_id} — you can close this tab and reopen this link later.")
+
 # ------------------- Processing Logic ------------------- #
 class DocumentProcessor:
-    def __init__(self, extraction_service, output_format):
+    def __init__(self, extraction_service, job_store, case_index=None):
         self.extraction_service = extraction_service
-        self.output_format = output_format
+        self.job_store = job_store
+        self.case_index = case_index
+
+    def store_results(self, bate_dict, pages_with_issues, total_pages, num_chunks=1, tier_stats=None, metrics=None):
+        """
+        Stores the extraction result in session state as a compact ExtractionTable.
+        """
+        return self.store_table(
+            ExtractionTable.from_bate_dict(bate_dict), pages_with_issues, total_pages, num_chunks, tier_stats, metrics
+        )
+
+    def store_table(self, table, pages_with_issues, total_pages, num_chunks=1, tier_stats=None, metrics=None):
+        """
+        Stores an ExtractionTable in session state. Export files, the viewer DataFrame and the search
+        index are not built here; they are derived from the table when a section first asks for them.
+        metrics are the per-stage metrics of the extraction; export builds are added to them.
+        """
+        st.session_state.extraction_results = {
+            "total_pages": total_pages,
+            "num_chunks": num_chunks,
+            "table": table,
+            "pages_with_issues": pages_with_issues,
+            "tier_stats": tier_stats or {},
+            "metrics": PipelineMetrics(metrics),
+            "exports": {},
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        st.session_state.extraction_complete = True
+        st.session_state.processing_stage = 4
+
+        return st.session_state.extraction_results
+
+    def submit_job(self, document_bytes, file_name, engine, options=None):
+        """
+        Queues the document for the job workers, or attaches to the existing job for the same document and
+        settings (a completed one shows its result, a failed one is re-queued and resumes from its last
+        completed page). The job ID goes into
+        the URL (?job=<id>) so a reconnecting browser can reattach to it.
+        """
+        job_id = self.job_store.find_existing(document_bytes, engine, options)
+        if job_id:
+            job = self.job_store.get_job(job_id)
+            logging.info(f"Attaching to {job['status']} job {job_id} at page {job['pages_done']}")
+            if job["status"] == JOB_FAILED:
+                self.job_store.update(job_id, status=JOB_QUEUED, error=None)
+        else:
+            job_id = self.job_store.create_job(document_bytes, file_name, engine, options, status=JOB_QUEUED)
+
+        st.query_params["job"] = job_id
+        st.session_state.job_id = job_id
+        st.session_state.extraction_complete = False
+        st.session_state.extraction_results = None
+        st.session_state.processing_stage = 3
+        return job_id
+
+    def attach_job(self, job_id):
+        """
+        Shows the job in the URL: live progress while it is queued or running, its result once completed
+        (also after a browser reconnect), or the error with a button to resume it from its last completed page.
+        """
+        job = self.job_store.get_job(job_id)
+        if job is None:
+            st.warning(f"⚠️ Job {job_id} was not found.")
+            del st.query_params["job"]
+            return None
+        st.session_state.job_id = job_id
 
-    def process_pdf(self, pdf_bytes):
-        try:
-            st.markdown('<div class="status-processing">🔄 Analyzing the document type</div>', unsafe_allow_html=True)
-            
-            extracted_res = self.extraction_service.is_text_based_pdf(pdf_bytes)
-            bate_dict, pages_with_issues = self.extraction_service.process_structured_ocr_pdf(extracted_res)
-            
+        if job["status"] == JOB_COMPLETED:
+            bate_dict, pages_with_issues = self.job_store.load_results(job_id)
             if not bate_dict:
-                logging.error("Processing returned no response dictionary.")
-                st.error("❌ Processing failed. Please try again.", icon="❌")
+                logging.error(f"Job {job_id} returned no Bates / Repair Order results.")
+                st.error("❌ Processing returned no Bates / Repair Order results. Please check the logs.", icon="❌")
                 return None
-
-            logging.info("Processing completed successfully.")
-            st.markdown('<div class="status-success">✅ Processing complete!</div>', unsafe_allow_html=True)
-
-            formatted_data, export_bytes = self.extraction_service.format_data_for_excel_or_csv(
-                bate_dict, self.output_format, pages_with_issues
+            logging.info(f"Loaded results of job {job_id}")
+            st.markdown('<div class="status-success">✅ Processing complete! Data ready for download.</div>', unsafe_allow_html=True)
+            tier_stats = dict(job["stats"])
+            metrics = tier_stats.pop("metrics", None)
+            return self.store_results(
+                bate_dict, pages_with_issues, job["total_pages"] or 0, job["num_chunks"], tier_stats, metrics
             )
 
-            total_pages = extracted_res.get("Total pages", 0)
-            st.session_state.extraction_results = {
-                "total_pages": total_pages,
-                "num_chunks": 1,
-                "responses": formatted_data,
-                "pages_with_issues": pages_with_issues,
-                "export_bytes": export_bytes,
-                "export_format": self.output_format,
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            }
-            st.session_state.extraction_complete = True
-            st.session_state.processing_stage = 4
-
-            return formatted_data
+        if job["status"] == JOB_FAILED:
+            progress = f"{job['pages_done']:,}/{job['total_pages'] or 0:,} pages"
+            st.error(f"❌ Processing of {job['file_name']} stopped after {progress}: {job['error']}", icon="❌")
+            if st.button("▶️ Resume from last completed page", key="resume_job"):
+                self.job_store.update(job_id, status=JOB_QUEUED, error=None)
+                st.rerun()
+            return None
+
+        st.session_state.processing_stage = 3
+        JobMonitor.render_progress(self.job_store, job_id)
+        return None
 
+    def process_pdf(self, pdf_bytes, file_name=None):
+        try:
+            st.markdown('<div class="status-processing">🔄 Analyzing the document type</div>', unsafe_allow_html=True)
+            return self.submit_job(pdf_bytes, file_name, ENGINE_TEXT_LAYER)
         except Exception as e:
             logging.error(f"Error processing PDF: {str(e)}", exc_info=True)
             st.error(f"❌ Error processing PDF: {str(e)}", icon="❌")
             return None
 
+    def process_pdf_with_ai(self, pdf_bytes, file_name=None, hybrid_ocr=True):
+        try:
+            st.markdown('<div class="status-processing">🔄 OCR engine started... Extracting text from PDF pages, then sending them to AI for Repair Order & Bates extraction...</div>', unsafe_allow_html=True)
+            return self.submit_job(pdf_bytes, file_name, ENGINE_AI, {"hybrid_ocr": hybrid_ocr})
+        except Exception as e:
+            logging.error(f"Error processing PDF with AI: {str(e)}", exc_info=True)
+            st.error(f"❌ Error processing PDF with AI: {str(e)}", icon="❌")
+            return None
+
     def process_text(self, text_bytes, file_name):
         try:
             st.markdown('<div class="status-processing">🔄 Processing text file...</div>', unsafe_allow_html=True)
             
-            # Decode text bytes to string
-            text_content = text_bytes.decode('utf-8')
-
-            # Calling the function to get all the repair order names
-            repair_orders = self.extraction_service.processing_txt_file(text_content)
+            # Calling the function to get all the repair order names, decoding the upload chunk by chunk
+            metrics = PipelineMetrics()
+            with metrics.timer(STAGE_REGEX_SCAN, pages=1, bytes=len(text_bytes)):
+                repair_orders = self.extraction_service.processing_txt_stream(text_bytes)
             if len(repair_orders) == 0:
                 logging.error("No repair orders found in the text file.")
                 st.error("❌ No repair orders found in the text file.", icon="❌")
@@ -604,31 +859,43 @@ class DocumentProcessor:
             bate_dict[1][bate_numbers[0]] = repair_orders
             pages_with_issues = []
 
-            # Format data for export
-            formatted_data, export_bytes = self.extraction_service.format_data_for_excel_or_csv(
-                bate_dict, self.output_format, pages_with_issues
-            )
+            # PDFs are merged into the case index by the job workers; text files are merged here
+            if self.case_index is not None:
+                self.case_index.merge(
+                    file_name, hashlib.sha256(text_bytes).hexdigest(),
+                    self.extraction_service.iter_index_rows(bate_dict.items()), total_pages=1,
+                )
 
-            # Store results in session state
-            st.session_state.extraction_results = {
-                "total_pages": 1,  # Text files are treated as single page
-                "num_chunks": 1,
-                "responses": formatted_data,
-                "pages_with_issues": pages_with_issues,
-                "export_bytes": export_bytes,
-                "export_format": self.output_format,
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            }
-            st.session_state.extraction_complete = True
-            st.session_state.processing_stage = 4
-
-            return formatted_data
+            # Text files are treated as single page and processed in one go, so they are not run as a job
+            if "job" in st.query_params:
+                del st.query_params["job"]
+            st.session_state.job_id = None
+            return self.store_results(bate_dict, pages_with_issues, total_pages=1, metrics=metrics.snapshot())
 
         except Exception as e:
             logging.error(f"Error processing text file: {str(e)}", exc_info=True)
             st.error(f"❌ Error processing text file: {str(e)}", icon="❌")
             return None
 
+    def open_saved_index(self, index_bytes, file_name):
+        """
+        Loads an index exported as Parquet or Arrow back into the summary, downloads and viewer,
+        without the source document.
+        """
+        try:
+            saved = IndexArchive.load(index_bytes)
+        except Exception as e:
+            logging.error(f"Error opening saved index {file_name}: {str(e)}", exc_info=True)
+            st.error(f"❌ Error opening saved index: {str(e)}", icon="❌")
+            return None
+
+        logging.info(f"Opened saved index {file_name}")
+        st.markdown('<div class="status-success">✅ Saved index loaded!</div>', unsafe_allow_html=True)
+        if "job" in st.query_params:
+            del st.query_params["job"]
+        st.session_state.job_id = None
+        return self.store_table(saved["table"], saved["pages_with_issues"], saved["total_pages"], tier_stats=saved["tier_stats"])
+
 # ------------------- Main Application ------------------- #
 def main():
     # Initialization
@@ -639,12 +906,14 @@ def main():
     SessionManager.initialize()
     
     # Service initialization
-    pdf_service = ServiceManager.init_service(PdfProcessor, "PdfProcessor")
-    llm_service = ServiceManager.init_service(LLMService, "LLMService")
+    # OCR, LLM and PDF extraction run in the job worker processes; the app only submits and polls jobs
     extraction_service = ServiceManager.init_service(DocumentExtractor, "DocumentExtractor")
+    job_store = ServiceManager.init_service(JobStore, "JobStore")
+    ServiceManager.init_service(JobWorkerPool, "JobWorkerPool")
+    case_index = ServiceManager.init_service(CaseIndex, "CaseIndex") if CASE_INDEX else None
     
     # Sidebar configuration
-    output_format = SectionRenderer.config_sidebar()
+    output_format, processing_engine, hybrid_ocr = SectionRenderer.config_sidebar()
     
     # Main UI
     UIComponents.render_header()
@@ -660,6 +929,8 @@ def main():
         with right_col:
             SectionRenderer.render_quick_tips_panel()
 
+    processor = DocumentProcessor(extraction_service, job_store, case_index)
+
     # Processing logic
     if document_uploaded:
         st.session_state.processing_stage = max(st.session_state.processing_stage, 1)
@@ -671,22 +942,30 @@ def main():
             # Determine document type and process accordingly
             document_type = st.session_state.get('document_type')
             document_bytes = st.session_state.document_bytes
-            
-            processor = DocumentProcessor(extraction_service, output_format)
+            document_filename = st.session_state.get('document_filename', '')
             
             # Process based on document type
-            if document_type == AppConfig.DOCUMENT_TYPES["PDF"]:
-                formatted_data = processor.process_pdf(document_bytes)
+            if document_type == AppConfig.DOCUMENT_TYPES["PDF"] and processing_engine == AppConfig.PROCESSING_ENGINES["AI"]:
+                formatted_data = processor.process_pdf_with_ai(document_bytes, document_filename, hybrid_ocr)
+            elif document_type == AppConfig.DOCUMENT_TYPES["PDF"]:
+                formatted_data = processor.process_pdf(document_bytes, document_filename)
             elif document_type == AppConfig.DOCUMENT_TYPES["TEXT"]:
-                document_filename = st.session_state.get('document_filename', '')
                 formatted_data = processor.process_text(document_bytes, document_filename)
+            elif document_type == AppConfig.DOCUMENT_TYPES["INDEX"]:
+                formatted_data = processor.open_saved_index(document_bytes, document_filename)
             else:
                 st.error("❌ Unknown document type. Please select a valid document type.")
                 formatted_data = None
             
             if formatted_data:
-                logging.info("Successfully processed document.")
+                # Text files are processed inline; PDFs return the ID of the job queued for the workers
+                logging.info("Document accepted for processing.")
     
+    # Progress or result of the job in the URL (?job=<id>), also after a reconnect, unless this session already shows it
+    attached_job_id = st.query_params.get("job")
+    if attached_job_id and not (st.session_state.extraction_complete and st.session_state.job_id == attached_job_id):
+        processor.attach_job(attached_job_id)
+
     # Results sections
     if st.session_state.extraction_complete:
         with st.container():
@@ -694,9 +973,12 @@ def main():
             with summary_col:
                 SectionRenderer.render_extraction_summary()
             with download_col:
-                SectionRenderer.render_download_section()
+                SectionRenderer.render_download_section(output_format)
 
         SectionRenderer.render_data_viewer_section()
+
+    if case_index is not None:
+        SectionRenderer.render_case_search_section(case_index)
     
     # Footer
     UIComponents.render_footer()
@@ -0,0 +1,398 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+from utils.extraction_utils import EXTRACTOR_VERSION
+
+# Setting up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Directory holding the on-disk caches
+CACHE_DIR = os.getenv("CACHE_DIR", ".cache")
+# Size limit of the processed-document result cache
+RESULT_CACHE_MAX_MB = int(os.getenv("RESULT_CACHE_MAX_MB", "512"))
+# Size limit of the per-page OCR cache
+OCR_CACHE_MAX_MB = int(os.getenv("OCR_CACHE_MAX_MB", "1024"))
+# Indirect object references ("12 0 R") in the source of a PDF object
+PDF_REFERENCE_PATTERN = re.compile(rb"(\d+) (\d+) R")
+# Object keys that only point back to the page tree
+PAGE_BACK_LINKS = ("Parent", "P")
+# Stream keys describing how a stream is encoded, which saving a PDF again (e.g. with deflate) may change
+STREAM_ENCODING_KEYS = ("Length", "Filter", "DecodeParms", "DL")
+# Image codecs that saving never re-encodes; these streams are hashed as stored instead of decoding the image
+IMAGE_FILTERS = ("/DCTDecode", "/JPXDecode", "/JBIG2Decode", "/CCITTFaxDecode")
+# Bump whenever the page hash recipe changes
+OCR_PAGE_HASH_VERSION = "3"
+# Size limit and entry lifetime of the LLM response cache
+LLM_CACHE_MAX_MB = int(os.getenv("LLM_CACHE_MAX_MB", "256"))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+
+
+@contextmanager
+def sqlite_connection(path: str, synchronous: Optional[str] = None) -> Iterator[sqlite3.Connection]:
+    """
+    Opens a connection to the SQLite database at path for one operation, committing if the block succeeds.
+    A short-lived connection per operation keeps the caches, the job store and the case index safe to use
+    from any thread or process. Rows are sqlite3.Row, so they can be read by index or by column name.
+    """
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    try:
+        if synchronous:
+            conn.execute(f"PRAGMA synchronous={synchronous}")
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+@contextmanager
+def sqlite_schema(path: str, auto_vacuum: Optional[str] = None) -> Iterator[sqlite3.Connection]:
+    """
+    Creates the folder of the SQLite database at path and yields a connection for creating its tables,
+    with write-ahead logging switched on so readers never wait for a writer. auto_vacuum only takes
+    effect on a database that has no tables yet.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with sqlite_connection(path) as conn:
+        if auto_vacuum:
+            conn.execute(f"PRAGMA auto_vacuum={auto_vacuum}")
+        conn.execute("PRAGMA journal_mode=WAL")
+        yield conn
+
+
+class DiskCache:
+    """
+    Small SQLite-backed key/value store shared by threads and processes.
+
+    Entries are evicted least-recently-used first once the stored values exceed max_bytes,
+    and entries written with a TTL are dropped once they expire.
+    """
+
+    def __init__(self, path: str, max_bytes: int, default_ttl: Optional[float] = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        with sqlite_schema(path) as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL,
+                    expires_at REAL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries (last_access)")
+
+    def _connect(self):
+        return sqlite_connection(self.path)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Returns the cached value for key, or None on a miss or an expired entry.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT value, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None or (row[1] is not None and row[1] <= now):
+                if row is not None:
+                    conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                with self._lock:
+                    self.misses += 1
+                return None
+            conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+        with self._lock:
+            self.hits += 1
+        return row[0]
+
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        """
+        Looks up many keys over one connection. Returns only the hits; expired entries count as misses.
+        """
+        now = time.time()
+        found: Dict[str, bytes] = {}
+        with self._connect() as conn:
+            for key in keys:
+                row = conn.execute("SELECT value, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is not None and (row[1] is None or row[1] > now):
+                    found[key] = row[0]
+            conn.executemany("UPDATE entries SET last_access = ? WHERE key = ?", [(now, key) for key in found])
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        """
+        Stores value under key and evicts least-recently-used entries beyond the size limit.
+        """
+        if len(value) > self.max_bytes:
+            logger.warning(f"Not caching {key}: {len(value)} bytes exceeds the cache size limit")
+            return
+        ttl = ttl if ttl is not None else self.default_ttl
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, last_access, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (key, sqlite3.Binary(value), len(value), now, expires_at),
+            )
+            self._evict(conn, now)
+
+    def set_many(self, items: Dict[str, bytes], ttl: Optional[float] = None):
+        """
+        Stores several entries in one transaction, then applies eviction once.
+        """
+        ttl = ttl if ttl is not None else self.default_ttl
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        rows = [
+            (key, sqlite3.Binary(value), len(value), now, expires_at)
+            for key, value in items.items()
+            if len(value) <= self.max_bytes
+        ]
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO entries (key, value, size, last_access, expires_at) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._evict(conn, now)
+
+    def delete(self, key: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        conn.execute("DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY last_access ASC").fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        logger.info(f"Evicted {evicted} entries from {self.path}")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns entry count, stored bytes and this instance's hit/miss counters.
+        """
+        with self._connect() as conn:
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {"entries": entries, "bytes": size, "hits": self.hits, "misses": self.misses}
+
+
+class ResultCache:
+    """
+    Caches the per-page extraction result of a document, keyed by SHA-256 of its bytes plus the extractor version.
+    """
+
+    def __init__(self, cache: Optional[DiskCache] = None, extractor_version: Optional[str] = None):
+        self.extractor_version = extractor_version or EXTRACTOR_VERSION
+        self.cache = cache or DiskCache(
+            os.path.join(CACHE_DIR, "results.sqlite3"), max_bytes=RESULT_CACHE_MAX_MB * 1024 * 1024
+        )
+
+    @staticmethod
+    def content_hash(document_bytes: bytes) -> str:
+        return hashlib.sha256(document_bytes).hexdigest()
+
+    def _key(self, content_hash: str) -> str:
+        return f"{content_hash}:{self.extractor_version}"
+
+    def get(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns {"bate_dict", "pages_with_issues", "total_pages"} for a previously processed document, or None.
+        """
+        try:
+            value = self.cache.get(self._key(content_hash))
+        except sqlite3.Error as e:
+            logger.error(f"Result cache read failed: {str(e)}")
+            return None
+        if value is None:
+            return None
+        result = json.loads(value)
+        # JSON object keys are strings; page numbers are ints everywhere else
+        result["bate_dict"] = {int(page_num): bates for page_num, bates in result["bate_dict"].items()}
+        return result
+
+    def set(
+        self,
+        content_hash: str,
+        bate_dict: Dict[int, Dict[str, List[Any]]],
+        pages_with_issues: List[int],
+        total_pages: int,
+    ):
+        value = json.dumps(
+            {"bate_dict": bate_dict, "pages_with_issues": pages_with_issues, "total_pages": total_pages},
+            separators=(",", ":"),
+        ).encode("utf-8")
+        try:
+            self.cache.set(self._key(content_hash), value)
+        except sqlite3.Error as e:
+            logger.error(f"Result cache write failed: {str(e)}")
+
+
+class OcrPageCache:
+    """
+    Caches OCR markdown per PDF page, keyed by a hash of everything the page draws (its object and every
+    stream and object it references: content streams, images, Form XObjects, fonts, annotation appearance
+    streams) plus the OCR model, so the same page is recognised in any document, at any position, across
+    reprocessing runs.
+    """
+
+    def __init__(self, cache: Optional[DiskCache] = None, model: str = "mistral-ocr-latest"):
+        self.model = model
+        self.cache = cache or DiskCache(
+            os.path.join(CACHE_DIR, "ocr_pages.sqlite3"), max_bytes=OCR_CACHE_MAX_MB * 1024 * 1024
+        )
+
+    def page_hash(self, doc, page, memo: Optional[Dict[int, bytes]] = None) -> str:
+        """
+        SHA-256 of what OCR actually sees on a fitz page: the page object and, recursively, every object
+        and stream it references, so a Bates number stamped as a Form XObject, a font or an annotation
+        appearance changes the key. Object numbers are deliberately left out, since they change whenever
+        a page is copied into another PDF, and so is how streams are compressed: they are hashed decoded,
+        except images in a codec saving never touches (JPEG, JPEG 2000, JBIG2, CCITT), hashed as stored.
+
+        Args:
+            memo (Optional[Dict[int, bytes]]): Digests of already hashed objects; pass the same dict for
+                every page of a document so shared fonts and XObjects are hashed once.
+        """
+        memo = {} if memo is None else memo
+        digest = hashlib.sha256()
+        digest.update(f"{OCR_PAGE_HASH_VERSION}|{self.model}".encode("utf-8"))
+        # Covers a MediaBox or Rotate inherited from the page tree
+        digest.update(f"{tuple(page.rect)}|{page.rotation}".encode("utf-8"))
+        digest.update(self._object_digest(doc, page.xref, memo, set()))
+        if doc.xref_get_key(page.xref, "Resources")[0] == "null":
+            # Resources inherited from the page tree
+            parent = doc.xref_get_key(page.xref, "Parent")
+            while parent[0] == "xref":
+                parent_xref = int(parent[1].split()[0])
+                resources = doc.xref_get_key(parent_xref, "Resources")
+                if resources[0] != "null":
+                    digest.update(self._resolve_references(doc, resources[1].encode("utf-8"), memo, set()))
+                    break
+                parent = doc.xref_get_key(parent_xref, "Parent")
+        return digest.hexdigest()
+
+    def _object_digest(self, doc, xref: int, memo: Dict[int, bytes], visiting: set) -> bytes:
+        """
+        Digest of one PDF object (and its stream) with each reference replaced by the digest of the referenced
+        object. References to pages and to the page tree (e.g. link destinations) are not followed, as they
+        do not change what this page draws.
+        """
+        if xref in memo:
+            return memo[xref]
+        if xref in visiting:
+            return b"cycle"
+        visiting.add(xref)
+        # Dictionary keys are hashed in sorted order, as copying a page into another PDF may reorder them;
+        # the back-links to the page tree (/Parent, an annotation's /P) may be dropped by the copy
+        is_stream = doc.xref_is_stream(xref)
+        stream_filter = doc.xref_get_key(xref, "Filter")[1] if is_stream else None
+        # Other streams are hashed decoded, so compressing them on save does not change the key
+        raw_stream = stream_filter in IMAGE_FILTERS
+        skipped_keys = PAGE_BACK_LINKS
+        if is_stream:
+            skipped_keys += ("Length",) if raw_stream else STREAM_ENCODING_KEYS
+        keys = doc.xref_get_keys(xref)
+        if keys:
+            source = "".join(
+                f"/{key} {doc.xref_get_key(xref, key)[1]}" for key in sorted(keys) if key not in skipped_keys
+            ).encode("utf-8")
+        else:
+            source = doc.xref_object(xref, compressed=True).encode("utf-8")
+        digest = hashlib.sha256(self._resolve_references(doc, source, memo, visiting))
+        if is_stream:
+            digest.update((doc.xref_stream_raw(xref) if raw_stream else doc.xref_stream(xref)) or b"")
+        visiting.discard(xref)
+        memo[xref] = digest.digest()
+        return memo[xref]
+
+    def _resolve_references(self, doc, source: bytes, memo: Dict[int, bytes], visiting: set) -> bytes:
+        """
+        Replaces each "n 0 R" in an object source by the hex digest of the referenced object.
+        """
+        def reference_digest(reference) -> bytes:
+            referenced = int(reference.group(1))
+            if doc.xref_get_key(referenced, "Type")[1] in ("/Page", "/Pages"):
+                return b"page"
+            return self._object_digest(doc, referenced, memo, visiting).hex().encode("ascii")
+
+        return PDF_REFERENCE_PATTERN.sub(reference_digest, source)
+
+    def get_many(self, page_hashes: List[str]) -> Dict[str, str]:
+        try:
+            found = self.cache.get_many(page_hashes)
+        except sqlite3.Error as e:
+            logger.error(f"OCR page cache read failed: {str(e)}")
+            return {}
+        return {page_hash: value.decode("utf-8") for page_hash, value in found.items()}
+
+    def set_many(self, pages: Dict[str, str]):
+        try:
+            self.cache.set_many({page_hash: markdown.encode("utf-8") for page_hash, markdown in pages.items()})
+        except sqlite3.Error as e:
+            logger.error(f"OCR page cache write failed: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        return self.cache.stats()
+
+
+class LlmResponseCache:
+    """
+    Caches LLM chat completions keyed by model, temperature, output token cap, system message and a hash of the prompt,
+    so reprocessing the same OCR chunks costs neither time nor tokens. Entries expire after
+    LLM_CACHE_TTL_SECONDS; callers only cache deterministic (temperature 0) requests.
+    """
+
+    def __init__(self, cache: Optional[DiskCache] = None, ttl: Optional[float] = None):
+        self.cache = cache or DiskCache(
+            os.path.join(CACHE_DIR, "llm_responses.sqlite3"),
+            max_bytes=LLM_CACHE_MAX_MB * 1024 * 1024,
+            default_ttl=ttl if ttl is not None else LLM_CACHE_TTL_SECONDS,
+        )
+
+    @staticmethod
+    def request_key(model: str, temperature: float, max_tokens: int, system_message: str, prompt: str) -> str:
+        system_hash = hashlib.sha256(system_message.encode("utf-8")).hexdigest()[:16]
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        return f"{model}:{temperature}:{max_tokens}:{system_hash}:{prompt_hash}"
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            value = self.cache.get(key)
+        except sqlite3.Error as e:
+            logger.error(f"LLM response cache read failed: {str(e)}")
+            return None
+        return value.decode("utf-8") if value is not None else None
+
+    def set(self, key: str, response_text: str):
+        try:
+            self.cache.set(key, response_text.encode("utf-8"))
+        except sqlite3.Error as e:
+            logger.error(f"LLM response cache write failed: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        return self.cache.stats()
@@ -0,0 +1,274 @@
+"""
+Case-wide Bates / Repair Order index, merged incrementally from every processed document.
+
+Look up a repair order from the command line:
+
+    python -m utils.case_index_utils 12345
+    python -m utils.case_index_utils 123 --prefix
+"""
+import os
+import time
+import sqlite3
+import argparse
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+from utils.cache_utils import CACHE_DIR, sqlite_connection, sqlite_schema
+from utils.index_utils import BatesIndex, BATE_FIELD, RO_FIELD
+
+# Setting up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# SQLite database holding the case index
+CASE_INDEX_PATH = os.getenv("CASE_INDEX_PATH", os.path.join(CACHE_DIR, "case_index.sqlite3"))
+# Merge every completed document into the case index
+CASE_INDEX = os.getenv("CASE_INDEX", "1") == "1"
+
+
+class CaseIndex:
+    """
+    SQLite index of where each repair order appears across every document of a case.
+
+    - documents: one row per source file name; re-ingesting a file replaces all of its rows
+    - bates: one row per Bates number (unique across the case) with its page and document; a Bates
+      number ingested again from another file moves to that file
+    - ro_pages: (repair_order_number, bates_id) pairs in a WITHOUT ROWID table, so an RO lookup is a
+      single primary-key range scan however many rows the case holds
+
+    Bates and RO values are normalised with BatesIndex.normalize, as in the viewer search.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or CASE_INDEX_PATH
+        with sqlite_schema(self.path) as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS documents (
+                    document_id INTEGER PRIMARY KEY,
+                    source TEXT NOT NULL UNIQUE,
+                    content_hash TEXT NOT NULL,
+                    total_pages INTEGER,
+                    bates_count INTEGER NOT NULL DEFAULT 0,
+                    ro_count INTEGER NOT NULL DEFAULT 0,
+                    ingested_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS bates (
+                    bates_id INTEGER PRIMARY KEY,
+                    bate_number TEXT NOT NULL UNIQUE,
+                    document_id INTEGER NOT NULL,
+                    page_number INTEGER
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS ro_pages (
+                    repair_order_number TEXT NOT NULL,
+                    bates_id INTEGER NOT NULL,
+                    PRIMARY KEY (repair_order_number, bates_id)
+                ) WITHOUT ROWID
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_bates_document ON bates (document_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_ro_pages_bates ON ro_pages (bates_id)")
+
+    def _connect(self):
+        return sqlite_connection(self.path, synchronous="NORMAL")
+
+    def merge(
+        self, source: str, content_hash: str, rows: Iterable[Dict[str, Any]], total_pages: Optional[int] = None
+    ) -> Dict[str, int]:
+        """
+        Replaces everything indexed from source with rows, in one transaction.
+
+        Args:
+            source (str): File name the rows come from; it identifies the document on re-ingest.
+            content_hash (str): SHA-256 of the document bytes.
+            rows (Iterable[Dict[str, Any]]): Index rows (page_number, bate_number, repair_order_number),
+                e.g. DocumentExtractor.iter_index_rows or ExtractionTable.iter_rows.
+            total_pages (Optional[int]): Page count of the document.
+
+        Returns:
+            Dict[str, int]: bates and ro_pages merged for this document, and bates moved from other documents.
+        """
+        pages: Dict[str, Any] = {}
+        ro_pairs: Dict[tuple, None] = {}
+        for row in rows:
+            bate_number = BatesIndex.normalize(row.get(BATE_FIELD))
+            if not bate_number:
+                continue
+            pages.setdefault(bate_number, row.get("page_number"))
+            repair_order_number = BatesIndex.normalize(row.get(RO_FIELD))
+            if repair_order_number:
+                ro_pairs[(repair_order_number, bate_number)] = None
+
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                """
+                INSERT INTO documents (source, content_hash, total_pages, ingested_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT (source) DO UPDATE SET
+                    content_hash = excluded.content_hash, total_pages = excluded.total_pages, ingested_at = excluded.ingested_at
+                """,
+                (source, content_hash, total_pages, time.time()),
+            )
+            document_id = conn.execute("SELECT document_id FROM documents WHERE source = ?", (source,)).fetchone()[0]
+
+            # Drop the document's previous rows, then take over its Bates numbers from any other document
+            conn.execute(
+                "DELETE FROM ro_pages WHERE bates_id IN (SELECT bates_id FROM bates WHERE document_id = ?)", (document_id,)
+            )
+            conn.execute("DELETE FROM bates WHERE document_id = ?", (document_id,))
+            conn.execute("CREATE TEMP TABLE incoming_bates (bate_number TEXT PRIMARY KEY)")
+            conn.executemany("INSERT INTO incoming_bates (bate_number) VALUES (?)", ((bate_number,) for bate_number in pages))
+            affected_documents = [
+                row[0] for row in conn.execute(
+                    "SELECT DISTINCT document_id FROM bates WHERE bate_number IN (SELECT bate_number FROM incoming_bates)"
+                )
+            ]
+            moved_ro_pages = conn.execute(
+                """
+                DELETE FROM ro_pages WHERE bates_id IN (
+                    SELECT bates_id FROM bates WHERE bate_number IN (SELECT bate_number FROM incoming_bates)
+                )
+                """
+            ).rowcount
+            moved_bates = conn.execute(
+                "DELETE FROM bates WHERE bate_number IN (SELECT bate_number FROM incoming_bates)"
+            ).rowcount
+            conn.execute("DROP TABLE incoming_bates")
+
+            conn.executemany(
+                "INSERT INTO bates (bate_number, document_id, page_number) VALUES (?, ?, ?)",
+                ((bate_number, document_id, page_num) for bate_number, page_num in pages.items()),
+            )
+            bates_ids = {
+                row[0]: row[1]
+                for row in conn.execute("SELECT bate_number, bates_id FROM bates WHERE document_id = ?", (document_id,))
+            }
+            conn.executemany(
+                "INSERT OR IGNORE INTO ro_pages (repair_order_number, bates_id) VALUES (?, ?)",
+                ((repair_order_number, bates_ids[bate_number]) for repair_order_number, bate_number in ro_pairs),
+            )
+            self._refresh_counts(conn, [document_id] + affected_documents)
+
+        logger.info(
+            f"Merged {source} into the case index: {len(pages)} Bates numbers, {len(ro_pairs)} repair order pages"
+            + (f", {moved_bates} Bates numbers moved from other documents" if moved_bates else "")
+        )
+        return {"bates": len(pages), "ro_pages": len(ro_pairs), "moved_bates": moved_bates, "moved_ro_pages": moved_ro_pages}
+
+    @staticmethod
+    def _refresh_counts(conn: sqlite3.Connection, document_ids: List[int]):
+        conn.executemany(
+            """
+            UPDATE documents SET
+                bates_count = (SELECT COUNT(*) FROM bates WHERE document_id = ?),
+                ro_count = (SELECT COUNT(*) FROM ro_pages WHERE bates_id IN (SELECT bates_id FROM bates WHERE document_id = ?))
+            WHERE document_id = ?
+            """,
+            ((document_id, document_id, document_id) for document_id in set(document_ids)),
+        )
+
+    def remove(self, source: str) -> bool:
+        """
+        Deletes a document and its rows. Returns False if source was never ingested.
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT document_id FROM documents WHERE source = ?", (source,)).fetchone()
+            if row is None:
+                return False
+            conn.execute("DELETE FROM ro_pages WHERE bates_id IN (SELECT bates_id FROM bates WHERE document_id = ?)", (row[0],))
+            conn.execute("DELETE FROM bates WHERE document_id = ?", (row[0],))
+            conn.execute("DELETE FROM documents WHERE document_id = ?", (row[0],))
+        return True
+
+    def pages_for_ro(self, repair_order_number: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Returns every Bates page on which the repair order appears, as
+        {"bate_number", "page_number", "source"} dicts ordered by Bates number.
+        """
+        query = """
+            SELECT b.bate_number, b.page_number, d.source
+            FROM ro_pages r
+            JOIN bates b ON b.bates_id = r.bates_id
+            JOIN documents d ON d.document_id = b.document_id
+            WHERE r.repair_order_number = ?
+            ORDER BY b.bate_number
+        """
+        params: List[Any] = [BatesIndex.normalize(repair_order_number)]
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self._connect() as conn:
+            return [dict(row) for row in conn.execute(query, params)]
+
+    def bates_csv_for_ro(self, repair_order_number: str) -> str:
+        """
+        Comma-separated Bates numbers for a repair order across the case, ready to paste into a brief.
+        """
+        return ", ".join(row[BATE_FIELD] for row in self.pages_for_ro(repair_order_number))
+
+    def prefix_search(self, prefix: str, limit: int = 1000) -> List[str]:
+        """
+        Returns up to limit distinct repair order numbers starting with prefix, in sorted order.
+        """
+        prefix = BatesIndex.normalize(prefix)
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                SELECT DISTINCT repair_order_number FROM ro_pages
+                WHERE repair_order_number >= ? AND repair_order_number < ?
+                ORDER BY repair_order_number LIMIT ?
+                """,
+                (prefix, prefix + "\uffff", limit),
+            )
+            return [row[0] for row in rows]
+
+    def documents(self) -> List[Dict[str, Any]]:
+        with self._connect() as conn:
+            return [
+                dict(row) for row in conn.execute(
+                    "SELECT source, content_hash, total_pages, bates_count, ro_count, ingested_at FROM documents ORDER BY source"
+                )
+            ]
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Document, Bates page and RO page counts, summed from the per-document counters.
+        """
+        with self._connect() as conn:
+            documents, bates, ro_pages = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(bates_count), 0), COALESCE(SUM(ro_count), 0) FROM documents"
+            ).fetchone()
+        return {"documents": documents, "bates": bates, "ro_pages": ro_pages}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("repair_order", nargs="?", help="Repair order number (or prefix with --prefix)")
+    parser.add_argument("--prefix", action="store_true", help="List repair order numbers starting with the value")
+    parser.add_argument("--index", default=CASE_INDEX_PATH, help="Case index database (default: CASE_INDEX_PATH)")
+    args = parser.parse_args()
+
+    case_index = CaseIndex(args.index)
+    if not args.repair_order:
+        stats = case_index.stats()
+        print(f"{stats['documents']:,} documents, {stats['bates']:,} Bates pages, {stats['ro_pages']:,} repair order pages")
+        return
+    if args.prefix:
+        for repair_order_number in case_index.prefix_search(args.repair_order):
+            print(repair_order_number)
+        return
+    rows = case_index.pages_for_ro(args.repair_order)
+    for row in rows:
+        print(f"{row['bate_number']}\tpage {row['page_number']}\t{row['source']}")
+    print(", ".join(row["bate_number"] for row in rows))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import io
+import json
+import logging
+from typing import Any, BinaryIO, Dict, List, Optional, Union
+import numpy as np
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+from utils.index_utils import ExtractionTable, RO_INT
+
+# Setting up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Columnar export formats handled by IndexArchive (keys of EXPORT_FORMATS, upper-cased)
+COLUMNAR_FORMATS = ("PARQUET", "ARROW")
+# Bump when the column layout changes; readers reject archives of a newer layout
+ARCHIVE_VERSION = 1
+# Schema metadata keys
+VERSION_KEY = b"bates_index.version"
+TOTAL_PAGES_KEY = b"bates_index.total_pages"
+TIER_STATS_KEY = b"bates_index.tier_stats"
+# File signatures used to tell the formats apart on load
+PARQUET_MAGIC = b"PAR1"
+ARROW_FILE_MAGIC = b"ARROW1"
+
+
+class IndexArchive:
+    """
+    Saves an extraction result as one columnar table (Parquet or Arrow IPC file) and opens it again.
+
+    Columns: page_number (int64), bate_number (dictionary-encoded string), repair_order_number
+    (int64 when every RO is an integer, as from text files, otherwise string, keeping leading zeros)
+    and has_issue (bool). Each page with issues is one row with has_issue set and null Bates / RO.
+    Entries without ROs get a null RO. total_pages and tier_stats are kept in the schema metadata.
+    """
+
+    @staticmethod
+    def to_arrow(
+        table: ExtractionTable,
+        pages_with_issues: Optional[List[int]] = None,
+        total_pages: Optional[int] = None,
+        tier_stats: Optional[Dict[str, Any]] = None,
+    ) -> pa.Table:
+        pages_with_issues = sorted(pages_with_issues or [])
+        rows_per_entry = np.maximum(np.diff(np.frombuffer(table.ro_offsets, dtype=np.int64)), 1)
+        num_issues = len(pages_with_issues)
+
+        repair_order_numbers: List[Any] = []
+        for idx in range(table.num_entries):
+            start, end = table.ro_offsets[idx], table.ro_offsets[idx + 1]
+            if start == end:
+                repair_order_numbers.append(None)
+            else:
+                repair_order_numbers.extend(table.ro_at(position) for position in range(start, end))
+        all_ints = all(kind == RO_INT for kind in table.ro_kinds)
+        ro_type = pa.int64() if all_ints and table.num_ros else pa.string()
+        if ro_type == pa.string():
+            repair_order_numbers = [None if ro is None else str(ro) for ro in repair_order_numbers]
+
+        bates_codes = np.concatenate([
+            np.repeat(np.frombuffer(table.page_bates, dtype=np.int64), rows_per_entry).astype(np.int32),
+            np.zeros(num_issues, dtype=np.int32),
+        ])
+        bates_mask = np.concatenate([np.zeros(len(bates_codes) - num_issues, dtype=bool), np.ones(num_issues, dtype=bool)])
+        arrow_table = pa.table({
+            "page_number": np.concatenate([
+                np.repeat(np.frombuffer(table.page_numbers, dtype=np.int64), rows_per_entry),
+                np.asarray(pages_with_issues, dtype=np.int64),
+            ]),
+            "bate_number": pa.DictionaryArray.from_arrays(
+                pa.array(bates_codes, mask=bates_mask), pa.array(table.bates, type=pa.string())
+            ),
+            "repair_order_number": pa.array(repair_order_numbers + [None] * num_issues, type=ro_type),
+            "has_issue": bates_mask,
+        })
+
+        metadata = {VERSION_KEY: str(ARCHIVE_VERSION).encode()}
+        if total_pages is not None:
+            metadata[TOTAL_PAGES_KEY] = str(total_pages).encode()
+        if tier_stats:
+            metadata[TIER_STATS_KEY] = json.dumps(tier_stats).encode()
+        # Stable sort, so the ROs of a page keep their order
+        return arrow_table.sort_by("page_number").replace_schema_metadata(metadata)
+
+    @staticmethod
+    def write(arrow_table: pa.Table, sink: Union[str, BinaryIO], output_format: str):
+        """
+        Writes the table as Parquet or as an Arrow IPC file (output_format "Parquet" or "Arrow").
+        """
+        normalized_output_format = (output_format or "").strip().upper()
+        if normalized_output_format == "PARQUET":
+            pq.write_table(arrow_table, sink)
+        elif normalized_output_format == "ARROW":
+            with ipc.new_file(sink, arrow_table.schema) as writer:
+                writer.write_table(arrow_table)
+        else:
+            raise ValueError(f"Unsupported columnar format: {output_format}")
+
+    @staticmethod
+    def export_bytes(
+        table: ExtractionTable,
+        output_format: str,
+        pages_with_issues: Optional[List[int]] = None,
+        total_pages: Optional[int] = None,
+        tier_stats: Optional[Dict[str, Any]] = None,
+    ) -> bytes:
+        bytes_buffer = io.BytesIO()
+        IndexArchive.write(
+            IndexArchive.to_arrow(table, pages_with_issues, total_pages, tier_stats), bytes_buffer, output_format
+        )
+        return bytes_buffer.getvalue()
+
+    @staticmethod
+    def read_arrow(data: bytes) -> pa.Table:
+        """
+        Reads a Parquet file, an Arrow IPC file or an Arrow IPC stream, told apart by their signatures.
+        """
+        if data[:4] == PARQUET_MAGIC:
+            return pq.read_table(pa.BufferReader(data))
+        if data[:6] == ARROW_FILE_MAGIC:
+            return ipc.open_file(pa.BufferReader(data)).read_all()
+        return ipc.open_stream(pa.BufferReader(data)).read_all()
+
+    @staticmethod
+    def load(data: bytes) -> Dict[str, Any]:
+        """
+        Opens a saved index.
+
+        Args:
+            data (bytes): Content of a file written by IndexArchive.write.
+
+        Returns:
+            dict: table (ExtractionTable), pages_with_issues, total_pages and tier_stats.
+
+        Raises:
+            ValueError: If the file is not a saved index or was written by a newer version.
+        """
+        try:
+            arrow_table = IndexArchive.read_arrow(data)
+        except pa.ArrowInvalid as e:
+            raise ValueError(f"Not a Parquet or Arrow file: {str(e)}") from e
+
+        metadata = arrow_table.schema.metadata or {}
+        missing = {"page_number", "bate_number", "repair_order_number", "has_issue"} - set(arrow_table.column_names)
+        if missing:
+            raise ValueError(f"Not a saved Bates index, missing columns: {', '.join(sorted(missing))}")
+        version = int(metadata.get(VERSION_KEY, b"1"))
+        if version > ARCHIVE_VERSION:
+            raise ValueError(f"Saved index version {version} is newer than this app supports ({ARCHIVE_VERSION})")
+
+        table = ExtractionTable()
+        pages_with_issues: List[int] = []
+        entry_key = None
+        entry_ros: List[Any] = []
+        columns = zip(
+            arrow_table.column("page_number").to_pylist(),
+            arrow_table.column("bate_number").to_pylist(),
+            arrow_table.column("repair_order_number").to_pylist(),
+            arrow_table.column("has_issue").to_pylist(),
+        )
+        for page_num, bate_number, repair_order_number, has_issue in columns:
+            if has_issue:
+                pages_with_issues.append(page_num)
+                continue
+            if (page_num, bate_number) != entry_key:
+                if entry_key is not None:
+                    table.append(entry_key[0], entry_key[1], entry_ros)
+                entry_key, entry_ros = (page_num, bate_number), []
+            if repair_order_number is not None:
+                entry_ros.append(repair_order_number)
+        if entry_key is not None:
+            table.append(entry_key[0], entry_key[1], entry_ros)
+
+        total_pages = metadata.get(TOTAL_PAGES_KEY)
+        tier_stats = metadata.get(TIER_STATS_KEY)
+        logger.info(f"Loaded saved index: {table.num_entries} pages, {len(pages_with_issues)} pages with issues")
+        return {
+            "table": table,
+            "pages_with_issues": pages_with_issues,
+            "total_pages": int(total_pages) if total_pages is not None else table.num_entries + len(pages_with_issues),
+            "tier_stats": json.loads(tier_stats) if tier_stats else {},
+        }
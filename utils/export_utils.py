@@ -0,0 +1,145 @@
+import io
+import csv
+import json
+import logging
+from typing import Any, BinaryIO, Dict, Iterable, List, TextIO
+from openpyxl import Workbook
+
+# Setting up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Column headers shared by every index export
+INDEX_HEADERS = ["Bate Number", "Repair Order Number", "Page Number"]
+INDEX_SHEET_TITLE = "Index"
+ISSUES_SHEET_TITLE = "Pages with Issues"
+
+# Supported export formats: file extension and MIME type. Parquet and Arrow are columnar tables built by
+# utils.columnar_utils.IndexArchive; IndexExporter writes the row formats (Excel, CSV, JSON)
+EXPORT_FORMATS = {
+    "Excel": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "CSV": (".csv", "text/csv"),
+    "JSON": (".json", "application/json"),
+    "Parquet": (".parquet", "application/vnd.apache.parquet"),
+    "Arrow": (".arrow", "application/vnd.apache.arrow.file"),
+}
+
+
+class IndexExporter:
+    @staticmethod
+    def row_values(row: Dict[str, Any]) -> List[Any]:
+        """
+        Orders a row dict to match INDEX_HEADERS.
+        """
+        return [
+            row.get("bate_number", ""),
+            row.get("repair_order_number", ""),
+            row.get("page_number", ""),
+        ]
+
+    @staticmethod
+    def export_bytes(
+        rows: Iterable[Dict[str, Any]],
+        output_format: str,
+        pages_with_issues: List[int] = None,
+    ) -> bytes:
+        """
+        Builds the index file for one of the row formats of EXPORT_FORMATS.
+
+        Args:
+            rows (Iterable[Dict[str, Any]]): Row dicts, typically a generator.
+            output_format (str): "Excel", "CSV" or "JSON" (case-insensitive).
+            pages_with_issues (List[int]): Page numbers for the Excel "Pages with Issues" sheet.
+
+        Returns:
+            bytes: The encoded file.
+
+        Raises:
+            ValueError: If the format is not supported, including Parquet and Arrow (use IndexArchive.export_bytes).
+        """
+        normalized_output_format = (output_format or "").strip().upper()
+
+        if normalized_output_format == "CSV":
+            buffer = io.StringIO()
+            IndexExporter.write_csv(rows, buffer)
+            return buffer.getvalue().encode("utf-8")
+        if normalized_output_format == "EXCEL":
+            bytes_buffer = io.BytesIO()
+            IndexExporter.write_xlsx(rows, bytes_buffer, pages_with_issues)
+            return bytes_buffer.getvalue()
+        if normalized_output_format == "JSON":
+            return json.dumps(list(rows), indent=2).encode("utf-8")
+        raise ValueError(f"Unsupported export format: {output_format}")
+
+    @staticmethod
+    def write_csv(rows: Iterable[Dict[str, Any]], sink: TextIO) -> int:
+        """
+        Streams index rows into a text sink as CSV, one row at a time.
+
+        Args:
+            rows (Iterable[Dict[str, Any]]): Row dicts, typically a generator.
+            sink (TextIO): Any writable text stream (open file, StringIO, ...).
+                           Files should be opened with newline="".
+
+        Returns:
+            int: Number of data rows written (header excluded).
+        """
+        writer = csv.writer(sink)
+        writer.writerow(INDEX_HEADERS)
+        rows_written = 0
+        for row in rows:
+            writer.writerow(IndexExporter.row_values(row))
+            rows_written += 1
+        return rows_written
+
+    @staticmethod
+    def write_xlsx(
+        rows: Iterable[Dict[str, Any]],
+        sink: BinaryIO,
+        pages_with_issues: Iterable[int] = None,
+    ) -> int:
+        """
+        Streams index rows into an .xlsx file using openpyxl's write-only mode, which serialises each row
+        as it is appended instead of keeping a cell object per value, so memory stays flat for any row count.
+
+        The "Pages with Issues" sheet is written after the rows are exhausted, so pages_with_issues may be a
+        list that the rows generator fills while it is consumed.
+
+        Args:
+            rows (Iterable[Dict[str, Any]]): Row dicts, typically a generator.
+            sink (BinaryIO): Writable binary stream or file path for the workbook.
+            pages_with_issues (Iterable[int]): Page numbers listed on the second sheet (omitted when empty).
+
+        Returns:
+            int: Number of data rows written (header excluded).
+        """
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet(title=INDEX_SHEET_TITLE)
+        ws.append(INDEX_HEADERS)
+        rows_written = 0
+        for row in rows:
+            ws.append(IndexExporter.row_values(row))
+            rows_written += 1
+
+        # Add a second sheet for pages with issues if there are any
+        if pages_with_issues:
+            IndexExporter._append_issues_sheet(wb, pages_with_issues)
+
+        wb.save(sink)
+        return rows_written
+
+    @staticmethod
+    def write_issues_xlsx(pages_with_issues: Iterable[int], sink: BinaryIO):
+        """
+        Writes a workbook that only holds the "Pages with Issues" sheet.
+        """
+        wb = Workbook(write_only=True)
+        IndexExporter._append_issues_sheet(wb, pages_with_issues)
+        wb.save(sink)
+
+    @staticmethod
+    def _append_issues_sheet(wb: Workbook, pages_with_issues: Iterable[int]):
+        ws_issues = wb.create_sheet(title=ISSUES_SHEET_TITLE)
+        ws_issues.append(["Page Number"])
+        for page_num in sorted(pages_with_issues):
+            ws_issues.append([page_num])
@@ -1,20 +1,76 @@
+import os
 import re
+import mmap
+import codecs
+import time
 import logging
 import fitz
 import io
-import csv
-from typing import List, Dict, Any, Tuple
-from openpyxl import Workbook
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Tuple, Optional, Iterable, Iterator, TextIO, BinaryIO, Union
+from utils.export_utils import IndexExporter
+from utils.metrics_utils import METRICS, STAGE_PDF_OPEN, STAGE_TEXT_EXTRACTION, STAGE_REGEX_SCAN
 
 # Setting up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Bump whenever extraction output can change, so cached results from older versions are not reused
+EXTRACTOR_VERSION = "1"
+
+# Number of worker processes used for PDF text extraction (1 = serial extraction)
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", "1"))
+# Documents with fewer pages than this are always extracted serially
+PARALLEL_MIN_PAGES = int(os.getenv("PARALLEL_MIN_PAGES", "200"))
+# Bytes decoded per step when streaming a text file
+TXT_CHUNK_BYTES = int(os.getenv("TXT_CHUNK_BYTES", str(1024 * 1024)))
+
+# One-pass page scanner for Bates codes, standalone 5-6 digit repair order numbers and FOW/FOWS codes
+# starting a word. The shared leading \b keeps sre's fast skip over non-matching positions, and since
+# no alternative can start inside another's match, the Bates and RO matches equal separate scans.
+PAGE_SCANNER_PATTERN = r"\b(?:(?P<bates>AARON\d{8,})\b|(?P<ro>\d{5,6})\b|(?P<fow>FOWS?\d{5}))"
+
+# PDF bytes shared with every worker of the extraction process pool
+_worker_pdf_bytes: Optional[bytes] = None
+
+
+def _init_page_shard_worker(pdf_bytes: bytes):
+    """
+    Process pool initializer: keeps the PDF bytes in the worker so they are sent once per worker,
+    not once per shard.
+    """
+    global _worker_pdf_bytes
+    _worker_pdf_bytes = pdf_bytes
+
+
+def _extract_page_shard(page_range: Tuple[int, int]) -> List[str]:
+    """
+    Opens the worker's copy of the PDF and returns the non-empty text of pages [start, end).
+    """
+    start, end = page_range
+    doc = fitz.open(stream=_worker_pdf_bytes, filetype="pdf")
+    try:
+        text_list = []
+        for page_index in range(start, end):
+            text = doc[page_index].get_text()
+            if text.strip():
+                text_list.append(text)
+        return text_list
+    finally:
+        doc.close()
+
+
 class DocumentExtractor:
-    def __init__(self):
+    def __init__(self, workers: Optional[int] = None):
         # Precompile regex patterns for efficiency
         self.aaron_code_pattern = re.compile(r"\bAARON\d{8,}\b")
-        self.ro_pattern_structured_ocr_pdf = re.compile(r"\b\d{5}\b")
+        self.ro_pattern_structured_ocr_pdf = re.compile(r"\b\d{5,6}\b")
+        self.aaron_filename_pattern = re.compile(r"AARON\d{7,}", re.IGNORECASE)
+        self.page_scanner = re.compile(PAGE_SCANNER_PATTERN)
+        self.txt_whitespace_pattern = re.compile(r'[\s\u200B\u00A0\u200C\u200D\u2060]+')
+        self.fow_pattern = re.compile(r'FOWS?(\d{5})')
+        # Worker processes used by is_text_based_pdf
+        self.workers = workers if workers is not None else EXTRACTION_WORKERS
     
     def extract_aaron_code(self, text: str, is_filename: bool = False) -> List[str]:
         """
@@ -42,7 +98,7 @@ class DocumentExtractor:
         # Use the appropriate pattern based on context
         if is_filename:
             # More flexible pattern for filenames: AARON followed by 7 or more digits
-            pattern = re.compile(r"AARON\d{7,}", re.IGNORECASE)
+            pattern = self.aaron_filename_pattern
         else:
             # Standard pattern for text content: AARON followed by 8 or more digits
             pattern = self.aaron_code_pattern  # Assuming this is already defined in your class
@@ -65,9 +121,35 @@ class DocumentExtractor:
         if not isinstance(text, str):
             raise ValueError("Input text must be a string.")
         
-        # Updated pattern to match 5-digit OR 6-digit numbers
-        ro_pattern = r'\b\d{5,6}\b'
-        return re.findall(ro_pattern, text)
+        # Precompiled pattern matching 5-digit OR 6-digit numbers
+        return self.ro_pattern_structured_ocr_pdf.findall(text)
+
+    def scan_page(self, text: str) -> Tuple[List[str], List[str], List[str]]:
+        """
+        Finds Bates codes, repair order numbers and FOW codes in a single pass over the text.
+
+        Args:
+            text (str): Page text.
+
+        Returns:
+            Tuple[List[str], List[str], List[str]]: (bate_numbers, repair_order_numbers, fow_codes), each in
+            page order; the first two equal extract_aaron_code and extract_repair_order_numbers_structured_ocr_pdf.
+        """
+        if not isinstance(text, str):
+            raise ValueError("Input text must be a string.")
+
+        bate_numbers: List[str] = []
+        repair_order_numbers: List[str] = []
+        fow_codes: List[str] = []
+        # findall returns one (bates, ro, fow) tuple per match, with only the matching group non-empty
+        for bates, ro, fow in self.page_scanner.findall(text):
+            if ro:
+                repair_order_numbers.append(ro)
+            elif bates:
+                bate_numbers.append(bates)
+            else:
+                fow_codes.append(fow)
+        return bate_numbers, repair_order_numbers, fow_codes
     
     def processing_txt_file(self, text: str) -> List[int]:
         """
@@ -82,15 +164,13 @@ class DocumentExtractor:
         
         # Remove ALL whitespace characters including Unicode - MORE AGGRESSIVE
         # This pattern removes spaces, tabs, newlines, and common Unicode spaces
-        cleaned = re.sub(r'[\s\u200B\u00A0\u200C\u200D\u2060]+', '', text)
+        cleaned = self.txt_whitespace_pattern.sub('', text)
         
         # Convert to uppercase for case-insensitive matching
         cleaned = cleaned.upper()
         
         # Pattern: FOW, optional S, then exactly 5 digits
-        pattern = r'FOWS?(\d{5})'
-        
-        matches = re.findall(pattern, cleaned)
+        matches = self.fow_pattern.findall(cleaned)
         
         # Convert to integers, validate they're actually 5-digit numbers
         results = []
@@ -100,50 +180,165 @@ class DocumentExtractor:
         
         return results
 
-    def process_structured_ocr_pdf(self, extracted_res: dict):
+    def iter_txt_fow_codes(
+        self, source: Union[bytes, bytearray, memoryview, mmap.mmap, BinaryIO], chunk_size: Optional[int] = None
+    ) -> Iterator[int]:
         """
-        Process each page's text to extract Bate numbers and Repair Order numbers.
-        Logs pages with issues (no/multiple Bate numbers).
-        Returns a dictionary mapping page numbers to Bate numbers and repair order numbers.
+        Streaming version of processing_txt_file for UTF-8 text that may not fit in memory.
+
+        The input is decoded chunk by chunk; whitespace removal and upper-casing work per character,
+        so they are applied per chunk, and the last few cleaned characters that could still begin a
+        FOW code are carried into the next chunk. Memory stays bounded by chunk_size.
+
+        Args:
+            source: The raw file content (bytes or an mmap, read without copying) or a binary file object.
+            chunk_size (int): Bytes decoded per step (default TXT_CHUNK_BYTES).
+
+        Yields:
+            int: The same repair order numbers, in the same order, as processing_txt_file(source.decode('utf-8')).
         """
-        pages_with_issues = []
-        bate_dict = {}
+        chunk_size = chunk_size or TXT_CHUNK_BYTES
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        # A match is at most 9 characters (FOWS + 5 digits), so an unfinished one is at most 8
+        max_partial = 8
+        carry = ""
+
+        if hasattr(source, "read"):
+            chunks = iter(lambda: source.read(chunk_size), b"")
+        else:
+            view = memoryview(source)
+            chunks = (view[start:start + chunk_size] for start in range(0, len(view), chunk_size))
+
+        for raw_chunk in chunks:
+            buffer = carry + self.txt_whitespace_pattern.sub('', decoder.decode(raw_chunk)).upper()
+            last_match_end = 0
+            for match in self.fow_pattern.finditer(buffer):
+                last_match_end = match.end()
+                yield int(match.group(1))
+            carry = buffer[max(last_match_end, len(buffer) - max_partial):]
+
+        # Raises on a truncated UTF-8 sequence at the end of the input, like bytes.decode('utf-8')
+        buffer = carry + self.txt_whitespace_pattern.sub('', decoder.decode(b"", final=True)).upper()
+        for match in self.fow_pattern.finditer(buffer):
+            yield int(match.group(1))
+
+    def processing_txt_stream(
+        self, source: Union[bytes, bytearray, memoryview, mmap.mmap, BinaryIO], chunk_size: Optional[int] = None
+    ) -> List[int]:
+        """
+        Returns processing_txt_file's result for UTF-8 bytes, an mmap or a binary file object
+        without decoding the whole input at once.
+        """
+        return list(self.iter_txt_fow_codes(source, chunk_size))
+
+    def processing_txt_path(self, path: str, chunk_size: Optional[int] = None) -> List[int]:
+        """
+        Memory-maps a UTF-8 text file and streams it through iter_txt_fow_codes.
+        """
+        with open(path, "rb") as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                # Empty files cannot be memory-mapped
+                return []
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return self.processing_txt_stream(mapped, chunk_size)
+
+    def iter_page_records(
+        self, text_pages: Iterable[str], start_page: int = 1
+    ) -> Iterator[Tuple[int, Optional[str], List[str]]]:
+        """
+        Lazily scans page texts for the Bate number and Repair Order numbers.
+
+        Args:
+            text_pages (Iterable[str]): Page texts in page order (a list or a generator).
+            start_page (int): Page number of the first text, for scanning a document in several pieces.
+
+        Yields:
+            Tuple[int, Optional[str], List[str]]: (page_num, bate_number, repair_order_numbers).
+            bate_number is None for pages with issues (no/multiple Bate numbers, no Repair Order numbers).
+        """
+        # Scan time is summed locally and recorded once, when the generator is exhausted or closed
+        scan_seconds = 0.0
+        pages_scanned = 0
+        try:
+            for page_num, text in enumerate(text_pages, start=start_page):
+                started = time.perf_counter()
+                try:
+                    # Bate Number (should be exactly one per page) and Repair Order Number(s) in one scan
+                    bate_number_list, repair_order_numbers, _ = self.scan_page(text)
+                except Exception as e:
+                    logger.error(f"Error processing page {page_num}: {e}")
+                    bate_number_list = None
+                scan_seconds += time.perf_counter() - started
+                pages_scanned += 1
+
+                if bate_number_list is None:
+                    yield page_num, None, []
+                    continue
 
-        for i, text in enumerate(extracted_res["Text"]):
-            page_num = i + 1
-            try:
-                # Extract the Bate Number (should be exactly one per page)
-                bate_number_list = self.extract_aaron_code(text)
                 if len(bate_number_list) != 1:
-                    # Log the issue and store page number
-                    pages_with_issues.append(page_num)
+                    # Log the issue and flag the page
                     logger.warning(
                         f"Page {page_num} has {'no' if len(bate_number_list)==0 else 'multiple'} Bate numbers: {bate_number_list}"
                     )
-                    # Moving on with the next page
+                    yield page_num, None, []
                     continue
 
-                # Extract the Repair Order Number(s)
-                repair_order_numbers = self.extract_repair_order_numbers_structured_ocr_pdf(text)
                 if len(repair_order_numbers) == 0:
-                    pages_with_issues.append(page_num)
                     logger.warning(
                         f"Page {page_num} has no Repair Order numbers"
                     )
-                    # Moving on with the next page
+                    yield page_num, None, []
                     continue
-                
-                # Adding the Bate number and the repair order numbers to the dictionary for the current page
-                bate_dict[page_num] = {}
-                bate_dict[page_num][bate_number_list[0]] = repair_order_numbers
-            except Exception as e:
-                logger.error(f"Error processing page {page_num}: {e}")
+
+                yield page_num, bate_number_list[0], repair_order_numbers
+        finally:
+            if pages_scanned:
+                METRICS.record(STAGE_REGEX_SCAN, scan_seconds, pages=pages_scanned)
+
+    def process_structured_ocr_pdf(self, extracted_res: dict):
+        """
+        Process each page's text to extract Bate numbers and Repair Order numbers.
+        Logs pages with issues (no/multiple Bate numbers).
+        Returns a dictionary mapping page numbers to Bate numbers and repair order numbers.
+        """
+        pages_with_issues = []
+        bate_dict = {}
+
+        for page_num, bate_number, repair_order_numbers in self.iter_page_records(extracted_res["Text"]):
+            if bate_number is None:
                 pages_with_issues.append(page_num)
-                # Moving on with the next page
                 continue
+            # Adding the Bate number and the repair order numbers to the dictionary for the current page
+            bate_dict[page_num] = {bate_number: repair_order_numbers}
 
         return bate_dict, pages_with_issues
 
+    def iter_index_rows(
+        self, data_items: Iterable[Tuple[int, Dict[str, List[str]]]]
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Lazily expands (page_num, {bate_number: repair_order_numbers}) pairs into index rows.
+
+        For each repair order number on a page, yield a separate row with the same page number and bate number.
+        If there are no repair order numbers, yield a row with repair_order_number as empty.
+        """
+        for page_num, bate_number_dict in data_items:
+            for bate_number, repair_order_numbers in bate_number_dict.items():
+                if repair_order_numbers and len(repair_order_numbers) > 0:
+                    for ro in repair_order_numbers:
+                        yield {
+                            "page_number": page_num,
+                            "bate_number": bate_number,
+                            "repair_order_number": ro,
+                        }
+                else:
+                    # No repair order -- one row with empty repair_order_number
+                    yield {
+                        "page_number": page_num,
+                        "bate_number": bate_number,
+                        "repair_order_number": "",
+                    }
+
     def format_data_for_excel_or_csv(
         self,
         data: Dict[int, Dict[str, List[str]]],
@@ -160,94 +355,174 @@ class DocumentExtractor:
         if pages_with_issues is None:
             pages_with_issues = []
             
-        formatted_data_list: List[Dict[str, Any]] = []
-
         # First build a normalized list of row dicts
-        for page_num, bate_number_dict in data.items():
-            for bate_number, repair_order_numbers in bate_number_dict.items():
-                if repair_order_numbers and len(repair_order_numbers) > 0:
-                    for ro in repair_order_numbers:
-                        formatted_data_list.append(
-                            {
-                                "page_number": page_num,
-                                "bate_number": bate_number,
-                                "repair_order_number": ro,
-                            }
-                        )
-                else:
-                    # No repair order -- create one row with empty repair_order_number
-                    formatted_data_list.append(
-                        {
-                            "page_number": page_num,
-                            "bate_number": bate_number,
-                            "repair_order_number": "",
-                        }
-                    )
+        formatted_data_list: List[Dict[str, Any]] = list(self.iter_index_rows(data.items()))
 
         # Build binary export (CSV or Excel) with consistent headers
-        headers = ["Bate Number", "Repair Order Number", "Page Number"]
         normalized_output_format = (output_format or "").strip().upper()
 
         if normalized_output_format == "CSV":
             buffer = io.StringIO()
-            writer = csv.writer(buffer)
-            writer.writerow(headers)
-            for row in formatted_data_list:
-                writer.writerow(
-                    [
-                        row.get("bate_number", ""),
-                        row.get("repair_order_number", ""),
-                        row.get("page_number", ""),
-                    ]
-                )
+            IndexExporter.write_csv(formatted_data_list, buffer)
             export_bytes = buffer.getvalue().encode("utf-8")
         else:
-            # Default to Excel (.xlsx) using openpyxl
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "Index"
-            # Write headers
-            ws.append(headers)
-            # Write rows
-            for row in formatted_data_list:
-                ws.append(
-                    [
-                        row.get("bate_number", ""),
-                        row.get("repair_order_number", ""),
-                        row.get("page_number", ""),
-                    ]
-                )
-            
-            # Add a second sheet for pages with issues if there are any
-            if pages_with_issues:
-                ws_issues = wb.create_sheet(title="Pages with Issues")
-                ws_issues.append(["Page Number"])
-                for page_num in sorted(pages_with_issues):
-                    ws_issues.append([page_num])
-            
+            # Default to Excel (.xlsx), streamed through openpyxl's write-only mode
             bytes_buffer = io.BytesIO()
-            wb.save(bytes_buffer)
+            IndexExporter.write_xlsx(formatted_data_list, bytes_buffer, pages_with_issues)
             export_bytes = bytes_buffer.getvalue()
 
         return formatted_data_list, export_bytes
 
-    def is_text_based_pdf(self,pdf_bytes: bytes) -> dict:
+    def is_text_based_pdf(self, pdf_bytes: bytes, workers: Optional[int] = None) -> dict:
         """
         Returns information about the number of text pages and total pages, as well as a list of text per page.
+
+        Args:
+            pdf_bytes (bytes): Raw PDF file bytes.
+            workers (Optional[int]): Number of worker processes. Defaults to the extractor's setting;
+                                     with more than one worker the page range is split into shards
+                                     that are extracted in parallel and merged back in page order.
         """
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        workers = workers if workers is not None else self.workers
+        with METRICS.timer(STAGE_PDF_OPEN, bytes=len(pdf_bytes)):
+            doc = fitz.open(stream=pdf_bytes, filetype="pdf")
         total_pages = len(doc)
-        text_list = []
-        for page in doc:
-            text = page.get_text()
-            if text.strip():
-                text_list.append(text)
+
+        if workers > 1 and total_pages >= PARALLEL_MIN_PAGES:
+            doc.close()
+            with METRICS.timer(STAGE_TEXT_EXTRACTION, pages=total_pages):
+                text_list = self._extract_text_parallel(pdf_bytes, total_pages, workers)
+        else:
+            text_list = list(self.iter_page_text(doc))
+            doc.close()
+
         return {
             "Total pages": total_pages,
             "Text pages": len(text_list),
             "Text": text_list
         }
 
+    def iter_page_text(self, doc) -> Iterator[str]:
+        """
+        Lazily yields the text of every non-empty page of an open fitz document, in page order.
+        """
+        extract_seconds = 0.0
+        pages_read = 0
+        try:
+            for page in doc:
+                started = time.perf_counter()
+                text = page.get_text()
+                extract_seconds += time.perf_counter() - started
+                pages_read += 1
+                if text.strip():
+                    yield text
+        finally:
+            if pages_read:
+                METRICS.record(STAGE_TEXT_EXTRACTION, extract_seconds, pages=pages_read)
+
+    def stream_pdf_index(self, pdf_bytes: bytes, sink: Union[TextIO, BinaryIO], output_format: str = "CSV") -> dict:
+        """
+        Runs the whole PDF pipeline as a chain of generators (extract page -> regex Bates/RO -> rows -> sink),
+        so only one page of text and one row are held in memory at any time.
+
+        Args:
+            pdf_bytes (bytes): Raw PDF file bytes.
+            sink (Union[TextIO, BinaryIO]): Writable text stream for CSV, binary stream for Excel.
+            output_format (str): "CSV" or "Excel".
+
+        Returns:
+            dict: Total pages, text pages, rows written and the list of pages with issues.
+        """
+        pages_with_issues: List[int] = []
+        text_pages = 0
+
+        def resolved_pages(records):
+            nonlocal text_pages
+            for page_num, bate_number, repair_order_numbers in records:
+                text_pages = page_num
+                if bate_number is None:
+                    pages_with_issues.append(page_num)
+                    continue
+                yield page_num, {bate_number: repair_order_numbers}
+
+        with METRICS.timer(STAGE_PDF_OPEN, bytes=len(pdf_bytes)):
+            doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        try:
+            total_pages = len(doc)
+            records = self.iter_page_records(self.iter_page_text(doc))
+            rows = self.iter_index_rows(resolved_pages(records))
+            if (output_format or "").strip().upper() == "CSV":
+                rows_written = IndexExporter.write_csv(rows, sink)
+            else:
+                rows_written = IndexExporter.write_xlsx(rows, sink, pages_with_issues)
+        finally:
+            doc.close()
+
+        logger.info(f"Streamed {rows_written} rows from {total_pages} pages ({len(pages_with_issues)} pages with issues)")
+        return {
+            "Total pages": total_pages,
+            "Text pages": text_pages,
+            "Rows": rows_written,
+            "Pages with issues": pages_with_issues,
+        }
+
+    def iter_text_shards(
+        self, pdf_bytes: bytes, start_page: int = 0, shard_size: int = 50
+    ) -> Iterator[Tuple[Tuple[int, int], List[str]]]:
+        """
+        Yields ((start, end), non-empty page texts) for consecutive page ranges [start, end) from start_page
+        (0-based) to the end of the document, in page order. Used to checkpoint long documents shard by shard;
+        with more than one worker the shards are extracted on a process pool.
+        """
+        with METRICS.timer(STAGE_PDF_OPEN, bytes=len(pdf_bytes)):
+            doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        total_pages = len(doc)
+        shards = [(start, min(start + shard_size, total_pages)) for start in range(start_page, total_pages, shard_size)]
+
+        if self.workers > 1 and total_pages - start_page >= PARALLEL_MIN_PAGES:
+            doc.close()
+            with ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_page_shard_worker,
+                initargs=(pdf_bytes,),
+            ) as executor:
+                shard_texts = executor.map(_extract_page_shard, shards)
+                for start, end in shards:
+                    # Time spent waiting for the pool, i.e. the extraction time not hidden behind the caller's work
+                    with METRICS.timer(STAGE_TEXT_EXTRACTION, pages=end - start):
+                        texts = next(shard_texts)
+                    yield (start, end), texts
+            return
+
+        try:
+            for start, end in shards:
+                with METRICS.timer(STAGE_TEXT_EXTRACTION, pages=end - start):
+                    texts = [text for text in (doc[page_index].get_text() for page_index in range(start, end)) if text.strip()]
+                yield (start, end), texts
+        finally:
+            doc.close()
+
+    def _extract_text_parallel(self, pdf_bytes: bytes, total_pages: int, workers: int) -> List[str]:
+        """
+        Splits the page range into shards, extracts them on a process pool and merges the results in page order.
+        """
+        # A few shards per worker keeps the pool busy when some pages are much heavier than others
+        num_shards = min(total_pages, workers * 4)
+        shard_size = (total_pages + num_shards - 1) // num_shards
+        shards = [(start, min(start + shard_size, total_pages)) for start in range(0, total_pages, shard_size)]
+        logger.info(f"Extracting {total_pages} pages in {len(shards)} shards on {workers} worker processes")
+
+        text_list = []
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_page_shard_worker,
+            initargs=(pdf_bytes,),
+        ) as executor:
+            # map() yields shard results in submission order, i.e. page order
+            for shard_text in executor.map(_extract_page_shard, shards):
+                text_list.extend(shard_text)
+        return text_list
+
 # Usage example
 # pdf_path = "your_pdf_path_here.pdf"
 # with open(pdf_path, "rb") as f:
@@ -0,0 +1,235 @@
+import logging
+from array import array
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+import numpy as np
+import pandas as pd
+
+# Setting up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Searchable fields of an index row
+BATE_FIELD = "bate_number"
+RO_FIELD = "repair_order_number"
+
+# ExtractionTable.ro_kinds values besides a digit count: an int RO, or a non-numeric RO kept in ro_text
+RO_INT = -1
+RO_TEXT = 0
+# Longest digit string stored as an integer (fits a signed 64-bit array item)
+MAX_PACKED_DIGITS = 18
+
+
+class BatesIndex:
+    """
+    Inverted index over the extraction rows, built once per extraction.
+
+    - RO -> Bates numbers (in first-seen order) and row positions
+    - Bates -> ROs, pages and row positions
+    - Sorted key lists for prefix search
+
+    Keys are normalised with str().strip().upper(), matching the viewer's case-insensitive search.
+    """
+
+    def __init__(self, rows: Iterable[Dict[str, Any]]):
+        # Dicts with None values act as insertion-ordered sets
+        self.ro_to_bates: Dict[str, Dict[str, None]] = {}
+        self.bates_to_ros: Dict[str, Dict[str, None]] = {}
+        self.bates_to_pages: Dict[str, List[int]] = {}
+        self.row_positions: Dict[str, Dict[str, List[int]]] = {BATE_FIELD: {}, RO_FIELD: {}}
+        self.num_rows = 0
+        self.num_ro_rows = 0
+
+        for position, row in enumerate(rows):
+            self.num_rows += 1
+            bate_number = self.normalize(row.get(BATE_FIELD))
+            repair_order_number = self.normalize(row.get(RO_FIELD))
+            page_num = row.get("page_number")
+
+            if bate_number:
+                self.row_positions[BATE_FIELD].setdefault(bate_number, []).append(position)
+                pages = self.bates_to_pages.setdefault(bate_number, [])
+                if not pages or pages[-1] != page_num:
+                    pages.append(page_num)
+            if repair_order_number:
+                self.num_ro_rows += 1
+                self.row_positions[RO_FIELD].setdefault(repair_order_number, []).append(position)
+                self.bates_to_ros.setdefault(bate_number, {})[repair_order_number] = None
+                self.ro_to_bates.setdefault(repair_order_number, {})[bate_number] = None
+
+        self._sorted_keys = {field: sorted(keys) for field, keys in self.row_positions.items()}
+        logger.info(f"Built Bates index: {len(self.bates_to_pages)} Bates numbers, {len(self.ro_to_bates)} repair orders")
+
+    @staticmethod
+    def normalize(value: Any) -> str:
+        if value is None:
+            return ""
+        return str(value).strip().upper()
+
+    @property
+    def unique_bates(self) -> int:
+        return len(self.bates_to_pages)
+
+    @property
+    def unique_ros(self) -> int:
+        return len(self.ro_to_bates)
+
+    def rows_for(self, field: str, value: str) -> List[int]:
+        """
+        Returns the row positions whose field equals value (exact, case-insensitive).
+        """
+        return self.row_positions[field].get(self.normalize(value), [])
+
+    def prefix_search(self, field: str, prefix: str, limit: int = 1000) -> List[str]:
+        """
+        Returns up to limit index keys of field starting with prefix, in sorted order.
+        """
+        prefix = self.normalize(prefix)
+        keys = self._sorted_keys[field]
+        matches = []
+        for key in keys[bisect_left(keys, prefix):]:
+            if not key.startswith(prefix) or len(matches) >= limit:
+                break
+            matches.append(key)
+        return matches
+
+    def bates_for_ro(self, repair_order_number: str) -> List[str]:
+        """
+        Returns every Bates number on which the repair order appears.
+        """
+        return list(self.ro_to_bates.get(self.normalize(repair_order_number), {}))
+
+    def bates_csv_for_ro(self, repair_order_number: str) -> str:
+        """
+        Comma-separated Bates numbers for a repair order, ready to paste into a brief.
+        """
+        return ", ".join(self.bates_for_ro(repair_order_number))
+
+
+class ExtractionTable:
+    """
+    Column-oriented extraction result, kept in the session instead of one dict per index row.
+
+    - bates: interned Bates numbers; page_bates holds an index into it per entry
+    - page_numbers / page_bates: one entry per (page, Bates number) of the result, in result order
+    - ro_offsets: CSR offsets; the ROs of entry i are ro_values[ro_offsets[i]:ro_offsets[i + 1]]
+    - ro_values / ro_kinds: ROs packed as integers. ro_kinds gives each RO back unchanged: RO_INT for
+      ints (text files), the digit count for digit strings (keeping leading zeros), or RO_TEXT for any
+      other string, whose ro_values item indexes ro_text
+
+    iter_rows yields the same rows as DocumentExtractor.iter_index_rows over the bate_dict.
+    """
+
+    def __init__(self):
+        self.bates: List[str] = []
+        self._bates_ids: Dict[str, int] = {}
+        self.page_numbers = array("q")
+        self.page_bates = array("q")
+        self.ro_offsets = array("q", [0])
+        self.ro_values = array("q")
+        self.ro_kinds = array("b")
+        self.ro_text: List[str] = []
+        self._ro_text_ids: Dict[str, int] = {}
+
+    @classmethod
+    def from_bate_dict(cls, bate_dict: Dict[int, Dict[str, List[Any]]]) -> "ExtractionTable":
+        table = cls()
+        for page_num, bate_number_dict in bate_dict.items():
+            for bate_number, repair_order_numbers in bate_number_dict.items():
+                table.append(page_num, bate_number, repair_order_numbers)
+        logger.info(
+            f"Built extraction table: {table.num_entries} pages, {table.unique_bates} Bates numbers, {table.num_ros} repair orders"
+        )
+        return table
+
+    def append(self, page_num: int, bate_number: str, repair_order_numbers: Iterable[Any]):
+        bates_id = self._bates_ids.get(bate_number)
+        if bates_id is None:
+            bates_id = self._bates_ids[bate_number] = len(self.bates)
+            self.bates.append(bate_number)
+        self.page_numbers.append(page_num)
+        self.page_bates.append(bates_id)
+        for ro in repair_order_numbers or []:
+            value, kind = self._pack_ro(ro)
+            self.ro_values.append(value)
+            self.ro_kinds.append(kind)
+        self.ro_offsets.append(len(self.ro_values))
+
+    def _pack_ro(self, ro: Any) -> Tuple[int, int]:
+        if isinstance(ro, int) and not isinstance(ro, bool) and abs(ro) < 10 ** MAX_PACKED_DIGITS:
+            return ro, RO_INT
+        text = str(ro)
+        if text.isascii() and text.isdigit() and len(text) <= MAX_PACKED_DIGITS:
+            return int(text), len(text)
+        text_id = self._ro_text_ids.get(text)
+        if text_id is None:
+            text_id = self._ro_text_ids[text] = len(self.ro_text)
+            self.ro_text.append(text)
+        return text_id, RO_TEXT
+
+    def ro_at(self, position: int) -> Any:
+        """
+        Returns the RO stored at position of ro_values, exactly as it was appended.
+        """
+        value, kind = self.ro_values[position], self.ro_kinds[position]
+        if kind == RO_INT:
+            return value
+        if kind == RO_TEXT:
+            return self.ro_text[value]
+        return str(value).zfill(kind)
+
+    @property
+    def num_entries(self) -> int:
+        return len(self.page_numbers)
+
+    @property
+    def num_ros(self) -> int:
+        return len(self.ro_values)
+
+    @property
+    def num_rows(self) -> int:
+        # An entry without ROs still takes one index row
+        return int(self._rows_per_entry().sum())
+
+    @property
+    def unique_bates(self) -> int:
+        return len(self.bates)
+
+    def _rows_per_entry(self) -> np.ndarray:
+        return np.maximum(np.diff(np.frombuffer(self.ro_offsets, dtype=np.int64)), 1)
+
+    def iter_entries(self) -> Iterator[Tuple[int, str, List[Any]]]:
+        """
+        Yields (page_num, bate_number, repair_order_numbers) per entry, as in the bate_dict.
+        """
+        for idx in range(self.num_entries):
+            ros = [self.ro_at(position) for position in range(self.ro_offsets[idx], self.ro_offsets[idx + 1])]
+            yield self.page_numbers[idx], self.bates[self.page_bates[idx]], ros
+
+    def iter_rows(self) -> Iterator[Dict[str, Any]]:
+        """
+        Lazily yields index rows: one per RO, or one with an empty RO for an entry without any.
+        """
+        for page_num, bate_number, repair_order_numbers in self.iter_entries():
+            for ro in repair_order_numbers or [""]:
+                yield {"page_number": page_num, "bate_number": bate_number, "repair_order_number": ro}
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        Index rows as a DataFrame built from the columns; the Bates column is categorical over the interned table.
+        """
+        rows_per_entry = self._rows_per_entry()
+        repair_order_numbers: List[Any] = []
+        for idx in range(self.num_entries):
+            start, end = self.ro_offsets[idx], self.ro_offsets[idx + 1]
+            if start == end:
+                repair_order_numbers.append("")
+            else:
+                repair_order_numbers.extend(self.ro_at(position) for position in range(start, end))
+        return pd.DataFrame({
+            "page_number": np.repeat(np.frombuffer(self.page_numbers, dtype=np.int64), rows_per_entry),
+            "bate_number": pd.Categorical.from_codes(
+                np.repeat(np.frombuffer(self.page_bates, dtype=np.int64), rows_per_entry), categories=self.bates
+            ),
+            "repair_order_number": pd.Series(repair_order_numbers, dtype=object),
+        })
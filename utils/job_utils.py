@@ -0,0 +1,573 @@
+import os
+import re
+import json
+import asyncio
+import time
+import uuid
+import sqlite3
+import hashlib
+import logging
+import fitz
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from utils.cache_utils import CACHE_DIR, sqlite_connection, sqlite_schema
+from utils.llm_pipeline import ChunkedExtractionPipeline
+from utils.metrics_utils import METRICS, STAGE_TOTAL, PipelineMetrics
+
+# Setting up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# SQLite database holding jobs, their documents and their per-page checkpoints
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", os.path.join(CACHE_DIR, "jobs.sqlite3"))
+# Text-layer jobs are checkpointed every this many PDF pages
+JOB_CHECKPOINT_PAGES = int(os.getenv("JOB_CHECKPOINT_PAGES", "50"))
+# A running job whose checkpoint or heartbeat has not moved for this long is treated as interrupted and may be resumed
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "300"))
+# Completed and failed jobs (with their page results) are deleted once they have not been touched for this many days
+JOB_RETENTION_DAYS = float(os.getenv("JOB_RETENTION_DAYS", "30"))
+# AI jobs run the regex extractor on every OCR page first and only send the pages it cannot resolve to the LLM
+REGEX_PREFILTER = os.getenv("REGEX_PREFILTER", "1") == "1"
+
+# "**PAGE n**" marker that PdfProcessor puts in front of every OCR page
+PAGE_MARKER_PATTERN = re.compile(r"^\*\*PAGE \d+\*\*\s*")
+
+# Processing engines a job can run
+ENGINE_TEXT_LAYER = "text_layer"
+ENGINE_AI = "ai"
+
+# Job statuses
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+# (page_num, bate_number or None for a page with issues, repair_order_numbers), as yielded by iter_page_records
+PageRecord = Tuple[int, Optional[str], List[Any]]
+
+# Job columns returned by get_job (everything except the document bytes)
+JOB_COLUMNS = (
+    "job_id, file_name, engine, options, content_hash, status, total_pages, pages_done, "
+    "next_page, text_pages, num_chunks, stats, error, created_at, updated_at"
+)
+
+# The document is kept until the job completes, then set to NULL
+JOBS_TABLE = """
+CREATE TABLE IF NOT EXISTS {name} (
+    job_id TEXT PRIMARY KEY,
+    file_name TEXT,
+    engine TEXT NOT NULL,
+    options TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    status TEXT NOT NULL,
+    total_pages INTEGER,
+    pages_done INTEGER NOT NULL DEFAULT 0,
+    next_page INTEGER NOT NULL DEFAULT 0,
+    text_pages INTEGER NOT NULL DEFAULT 0,
+    num_chunks INTEGER NOT NULL DEFAULT 1,
+    stats TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    document BLOB
+)
+"""
+
+
+class JobStore:
+    """
+    SQLite-backed store of processing jobs. A job keeps its document bytes and every page result
+    checkpointed so far, so it can be resumed after a crash, a restart or a browser reconnect.
+    The document bytes are dropped once the job completes, and finished jobs are deleted after
+    JOB_RETENTION_DAYS (purge_expired), so the database does not grow with every upload.
+
+    Text-layer jobs also keep a cursor (next physical page, non-empty pages seen so far), because their
+    page numbers count non-empty pages only.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or JOBS_DB_PATH
+        # Incremental auto-vacuum lets purge_expired hand the freed pages back to the file system
+        with sqlite_schema(self.path, auto_vacuum="INCREMENTAL") as conn:
+            conn.execute(JOBS_TABLE.format(name="jobs"))
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS job_pages (
+                    job_id TEXT NOT NULL,
+                    page_number INTEGER NOT NULL,
+                    bate_number TEXT,
+                    repair_order_numbers TEXT NOT NULL,
+                    PRIMARY KEY (job_id, page_number)
+                )
+                """
+            )
+            columns = {row["name"]: row for row in conn.execute("PRAGMA table_info(jobs)")}
+            # Job databases created before per-tier stats were recorded
+            if "stats" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN stats TEXT")
+            # Job databases created when the document was NOT NULL; SQLite cannot drop a constraint, so copy the table
+            if columns["document"]["notnull"]:
+                conn.execute(JOBS_TABLE.format(name="jobs_rebuilt"))
+                conn.execute(f"INSERT INTO jobs_rebuilt ({JOB_COLUMNS}, document) SELECT {JOB_COLUMNS}, document FROM jobs")
+                conn.execute("DROP TABLE jobs")
+                conn.execute("ALTER TABLE jobs_rebuilt RENAME TO jobs")
+                conn.execute(f"UPDATE jobs SET document = NULL WHERE status = '{JOB_COMPLETED}'")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_content ON jobs (content_hash, engine, status)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs (status, created_at)")
+
+    def _connect(self):
+        return sqlite_connection(self.path)
+
+    @staticmethod
+    def _job_from_row(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job["options"] = json.loads(job["options"])
+        job["stats"] = json.loads(job["stats"]) if job["stats"] else {}
+        return job
+
+    def create_job(
+        self,
+        document_bytes: bytes,
+        file_name: str,
+        engine: str,
+        options: Optional[Dict[str, Any]] = None,
+        status: str = JOB_RUNNING,
+    ) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT INTO jobs (job_id, file_name, engine, options, content_hash, status, created_at, updated_at, document)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    job_id, file_name, engine, json.dumps(options or {}, sort_keys=True),
+                    hashlib.sha256(document_bytes).hexdigest(), status, now, now, sqlite3.Binary(document_bytes),
+                ),
+            )
+        logger.info(f"Created {engine} job {job_id} for {file_name}")
+        return job_id
+
+    def find_existing(self, document_bytes: bytes, engine: str, options: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """
+        Returns the most recent job for the same document and settings, so that processing the same upload
+        again shows its result or attaches to it (or resumes it) instead of storing the document once more.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                """
+                SELECT job_id FROM jobs WHERE content_hash = ? AND engine = ? AND options = ?
+                ORDER BY updated_at DESC LIMIT 1
+                """,
+                (hashlib.sha256(document_bytes).hexdigest(), engine, json.dumps(options or {}, sort_keys=True)),
+            ).fetchone()
+        return row["job_id"] if row else None
+
+    def claim_next(self) -> Optional[str]:
+        """
+        Atomically takes the oldest queued job (or a running job whose worker stopped sending heartbeats)
+        and marks it running. Safe to call from any number of worker processes.
+
+        Returns:
+            Optional[str]: The claimed job ID, or None when the queue is empty.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            # Take the write lock before reading, so two workers can never claim the same job
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                """
+                SELECT job_id FROM jobs WHERE status = ? OR (status = ? AND updated_at < ?)
+                ORDER BY created_at LIMIT 1
+                """,
+                (JOB_QUEUED, JOB_RUNNING, now - JOB_STALE_SECONDS),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE jobs SET status = ?, updated_at = ? WHERE job_id = ?", (JOB_RUNNING, now, row["job_id"]))
+        return row["job_id"]
+
+    def heartbeat(self, job_id: str):
+        """
+        Marks a running job as alive, so long stretches without a checkpoint (e.g. OCR) do not make it look stale.
+        """
+        self.update(job_id)
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the job's metadata and progress (without the document bytes), or None for an unknown ID.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                f"""
+                SELECT {JOB_COLUMNS} FROM jobs WHERE job_id = ?
+                """,
+                (job_id,),
+            ).fetchone()
+        return self._job_from_row(row) if row else None
+
+    def get_document(self, job_id: str) -> bytes:
+        with self._connect() as conn:
+            row = conn.execute("SELECT document FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"Unknown job: {job_id}")
+        if row["document"] is None:
+            raise ValueError(f"Job {job_id} is completed and no longer keeps its document")
+        return bytes(row["document"])
+
+    def document_size(self, job_id: str) -> int:
+        """
+        Size of the job's document in bytes (0 once it has been released), without reading the document.
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT length(document) AS size FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"Unknown job: {job_id}")
+        return row["size"] or 0
+
+    def purge_expired(self, retention_days: Optional[float] = None) -> int:
+        """
+        Deletes completed and failed jobs, with their page results, that have not been updated for
+        retention_days (default JOB_RETENTION_DAYS).
+
+        Returns:
+            int: Number of jobs deleted.
+        """
+        retention_days = JOB_RETENTION_DAYS if retention_days is None else retention_days
+        cutoff = time.time() - retention_days * 24 * 3600
+        with self._connect() as conn:
+            expired = [
+                row["job_id"] for row in conn.execute(
+                    "SELECT job_id FROM jobs WHERE status IN (?, ?) AND updated_at < ?", (JOB_COMPLETED, JOB_FAILED, cutoff)
+                )
+            ]
+            conn.executemany("DELETE FROM job_pages WHERE job_id = ?", [(job_id,) for job_id in expired])
+            conn.executemany("DELETE FROM jobs WHERE job_id = ?", [(job_id,) for job_id in expired])
+        if expired:
+            with self._connect() as conn:
+                conn.execute("PRAGMA incremental_vacuum")
+            logger.info(f"Deleted {len(expired)} jobs older than {retention_days:g} days")
+        return len(expired)
+
+    @staticmethod
+    def is_stale(job: Dict[str, Any]) -> bool:
+        return job["status"] == JOB_RUNNING and time.time() - job["updated_at"] > JOB_STALE_SECONDS
+
+    def update(self, job_id: str, **fields):
+        """
+        Sets job columns (status, total_pages, num_chunks, error, ...) and refreshes updated_at.
+        """
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id))
+
+    def checkpoint(self, job_id: str, records: Iterable[PageRecord], pages_done: int, **cursor):
+        """
+        Saves page results and the job's progress in one transaction, so a resumed job never sees a page
+        whose cursor was not advanced (or the other way round).
+
+        Args:
+            job_id (str): Job to update.
+            records (Iterable[PageRecord]): (page_num, bate_number or None, repair_order_numbers) per page.
+            pages_done (int): Progress shown to the user, against total_pages.
+            **cursor: Optional next_page / text_pages of a text-layer job.
+        """
+        rows = [
+            (job_id, page_num, bate_number, json.dumps(list(repair_order_numbers)))
+            for page_num, bate_number, repair_order_numbers in records
+        ]
+        fields = {"pages_done": pages_done, **cursor, "updated_at": time.time()}
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO job_pages (job_id, page_number, bate_number, repair_order_numbers) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id))
+
+    def completed_pages(self, job_id: str) -> Set[int]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT page_number FROM job_pages WHERE job_id = ?", (job_id,)).fetchall()
+        return {row["page_number"] for row in rows}
+
+    def load_results(self, job_id: str) -> Tuple[Dict[int, Dict[str, List[Any]]], List[int]]:
+        """
+        Rebuilds (bate_dict, pages_with_issues) from the job's checkpointed pages, in the shape returned by
+        DocumentExtractor.process_structured_ocr_pdf.
+        """
+        bate_dict: Dict[int, Dict[str, List[Any]]] = {}
+        pages_with_issues: List[int] = []
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT page_number, bate_number, repair_order_numbers FROM job_pages WHERE job_id = ? ORDER BY page_number",
+                (job_id,),
+            ).fetchall()
+        for row in rows:
+            if row["bate_number"] is None:
+                pages_with_issues.append(row["page_number"])
+            else:
+                bate_dict[row["page_number"]] = {row["bate_number"]: json.loads(row["repair_order_numbers"])}
+        return bate_dict, pages_with_issues
+
+
+class JobRunner:
+    """
+    Runs a stored job from its last checkpoint to the end. A job that raises is marked failed with its
+    checkpoints intact, so running it again picks up where it stopped.
+
+    - Text-layer jobs are read shard by shard (JOB_CHECKPOINT_PAGES PDF pages) and checkpointed after each shard.
+    - AI jobs run on an event loop owned by the runner, with AsyncPdfProcessor and AsyncLLMService as
+      pdf_service and llm_service, so OCR batches and LLM chunks are awaited concurrently without a thread each.
+      They rely on the OCR page cache for pages already OCR'd, and checkpoint each LLM chunk as it returns;
+      chunks whose pages are all checkpointed are not sent again. A chunk that still fails after its retries
+      is not checkpointed and the job fails once the others are done, so resuming it retries only those chunks.
+    - With a case_index, a finished job's result is merged into it before the job is marked completed.
+    - The stage metrics recorded while the job runs are saved under stats["metrics"], added up over resumes.
+    """
+
+    def __init__(
+        self,
+        job_store: JobStore,
+        extraction_service,
+        pdf_service=None,
+        llm_service=None,
+        result_cache=None,
+        checkpoint_pages: Optional[int] = None,
+        case_index=None,
+    ):
+        self.job_store = job_store
+        self.extraction_service = extraction_service
+        self.pdf_service = pdf_service
+        self.llm_service = llm_service
+        self.result_cache = result_cache
+        self.checkpoint_pages = max(1, checkpoint_pages or JOB_CHECKPOINT_PAGES)
+        self.case_index = case_index
+        # Created on the first AI job and reused: the async services' connection pools belong to the loop they ran on
+        self.event_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def close(self):
+        """
+        Closes the async services' HTTP clients and the runner's event loop.
+        """
+        if self.event_loop is None:
+            return
+        for service in (self.pdf_service, self.llm_service):
+            if service is not None and hasattr(service, "aclose"):
+                self.event_loop.run_until_complete(service.aclose())
+        self.event_loop.close()
+        self.event_loop = None
+
+    def run(self, job_id: str, progress_callback: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        """
+        Runs (or resumes) a job and returns {"bate_dict", "pages_with_issues", "total_pages", "num_chunks", "stats"}.
+
+        Args:
+            job_id (str): Job created with JobStore.create_job.
+            progress_callback (Optional[Callable[[int, int], None]]): Called as (pages_done, total_pages)
+                after every checkpoint, from the thread that wrote it (a worker thread for LLM chunks).
+
+        Raises:
+            KeyError: If the job does not exist.
+            Exception: Whatever stopped the job; it is recorded on the job before being re-raised.
+        """
+        job = self.job_store.get_job(job_id)
+        if job is None:
+            raise KeyError(f"Unknown job: {job_id}")
+        if job["status"] != JOB_COMPLETED:
+            self.job_store.update(job_id, status=JOB_RUNNING, error=None)
+            if job["pages_done"]:
+                logger.info(f"Resuming job {job_id} at {job['pages_done']}/{job['total_pages']} pages")
+            # Workers run one job at a time, so everything METRICS records from here on belongs to this job
+            metrics_before = METRICS.snapshot()
+            started = time.perf_counter()
+            try:
+                if job["engine"] == ENGINE_AI:
+                    self._run_ai(job, progress_callback)
+                else:
+                    self._run_text_layer(job, progress_callback)
+                if self.case_index is not None:
+                    self.merge_into_case_index(job_id)
+            except Exception as e:
+                logger.error(f"Job {job_id} failed: {str(e)}", exc_info=True)
+                self.store_metrics(job_id, job["stats"].get("metrics"), metrics_before, started)
+                self.job_store.update(job_id, status=JOB_FAILED, error=str(e))
+                raise
+            self.store_metrics(job_id, job["stats"].get("metrics"), metrics_before, started)
+            # The page results are all checkpointed, so the document is no longer needed
+            self.job_store.update(job_id, status=JOB_COMPLETED, document=None)
+            job = self.job_store.get_job(job_id)
+
+        bate_dict, pages_with_issues = self.job_store.load_results(job_id)
+        return {
+            "bate_dict": bate_dict,
+            "pages_with_issues": pages_with_issues,
+            "total_pages": job["total_pages"] or 0,
+            "num_chunks": job["num_chunks"],
+            "stats": job["stats"],
+        }
+
+    def _run_text_layer(self, job: Dict[str, Any], progress_callback):
+        job_id = job["job_id"]
+        content_hash = job["content_hash"]
+        # Checked against the content hash stored on the job, so a cache hit never loads the document
+        if self.result_cache and not job["pages_done"]:
+            cached = self.result_cache.get(content_hash)
+            if cached is not None:
+                logger.info(f"Result cache hit for document {content_hash[:12]}")
+                records = [
+                    (page_num, *next(iter(bates.items()))) for page_num, bates in cached["bate_dict"].items()
+                ] + [(page_num, None, []) for page_num in cached["pages_with_issues"]]
+                self.job_store.update(job_id, total_pages=cached["total_pages"])
+                self.job_store.checkpoint(job_id, records, pages_done=cached["total_pages"])
+                self.record_tier_stats(
+                    job_id, regex_pages=len(cached["bate_dict"]), unresolved_pages=len(cached["pages_with_issues"])
+                )
+                return
+
+        pdf_bytes = self.job_store.get_document(job_id)
+        if job["total_pages"] is None:
+            doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+            job["total_pages"] = len(doc)
+            doc.close()
+            self.job_store.update(job_id, total_pages=job["total_pages"])
+
+        text_pages = job["text_pages"]
+        for (start, end), texts in self.extraction_service.iter_text_shards(pdf_bytes, job["next_page"], self.checkpoint_pages):
+            records = list(self.extraction_service.iter_page_records(texts, start_page=text_pages + 1))
+            text_pages += len(texts)
+            self.job_store.checkpoint(job_id, records, pages_done=end, next_page=end, text_pages=text_pages)
+            if progress_callback:
+                progress_callback(end, job["total_pages"])
+
+        bate_dict, pages_with_issues = self.job_store.load_results(job_id)
+        self.record_tier_stats(job_id, regex_pages=len(bate_dict), unresolved_pages=len(pages_with_issues))
+        if self.result_cache and bate_dict:
+            self.result_cache.set(content_hash, bate_dict, pages_with_issues, job["total_pages"] or 0)
+
+    def store_metrics(
+        self, job_id: str, previous: Optional[Dict[str, Dict[str, float]]], metrics_before: Dict[str, Dict[str, float]], started: float
+    ):
+        """
+        Adds what METRICS recorded since metrics_before, plus this run's wall time, to the metrics of earlier runs.
+        The document's pages and bytes are counted in the total stage once per job, not once per run.
+        """
+        job = self.job_store.get_job(job_id)
+        metrics = PipelineMetrics(previous)
+        metrics.merge(METRICS.since(metrics_before))
+        previous_total = (previous or {}).get(STAGE_TOTAL, {})
+        metrics.record(
+            STAGE_TOTAL,
+            time.perf_counter() - started,
+            # A run that failed before the page count was known recorded no pages
+            pages=0 if previous_total.get("pages") else job["total_pages"] or 0,
+            bytes=0 if previous_total else self.job_store.document_size(job_id),
+        )
+        stats = dict(job["stats"], metrics=metrics.snapshot())
+        self.job_store.update(job_id, stats=json.dumps(stats))
+
+    def merge_into_case_index(self, job_id: str):
+        """
+        Replaces the job's document in the case index with the job's result, keyed by its file name.
+        """
+        job = self.job_store.get_job(job_id)
+        bate_dict, _ = self.job_store.load_results(job_id)
+        self.case_index.merge(
+            job["file_name"] or job_id,
+            job["content_hash"],
+            self.extraction_service.iter_index_rows(bate_dict.items()),
+            job["total_pages"],
+        )
+
+    def record_tier_stats(self, job_id: str, regex_pages: int, unresolved_pages: int, llm_pages: Optional[int] = None):
+        """
+        Stores how many pages each extraction tier resolved on the job (llm_pages is left out for text-layer jobs).
+        """
+        tier_stats = {"regex_pages": regex_pages, "unresolved_pages": unresolved_pages}
+        if llm_pages is not None:
+            tier_stats["llm_pages"] = llm_pages
+        logger.info(f"Job {job_id} pages resolved per tier: {tier_stats}")
+        stats = self.job_store.get_job(job_id)["stats"]
+        # Keep the metrics of earlier runs of the job
+        stats = {key: value for key, value in stats.items() if key == "metrics"}
+        stats.update(tier_stats)
+        self.job_store.update(job_id, stats=json.dumps(stats))
+
+    def _run_ai(self, job: Dict[str, Any], progress_callback):
+        pdf_bytes = self.job_store.get_document(job["job_id"])
+        if self.event_loop is None:
+            self.event_loop = asyncio.new_event_loop()
+        self.event_loop.run_until_complete(self._run_ai_async(job, pdf_bytes, progress_callback))
+
+    async def _run_ai_async(self, job: Dict[str, Any], pdf_bytes: bytes, progress_callback):
+        job_id = job["job_id"]
+        if job["options"].get("hybrid_ocr", True):
+            ocr_pages = await self.pdf_service.extract_text_hybrid(pdf_bytes)
+        else:
+            ocr_pages = await self.pdf_service.extract_text_cached(pdf_bytes)
+        if not ocr_pages:
+            raise ValueError("OCR processing returned no pages.")
+
+        total_pages = len(ocr_pages)
+        self.job_store.update(job_id, total_pages=total_pages)
+        done = self.job_store.completed_pages(job_id)
+        llm_page_numbers = list(range(1, total_pages + 1))
+        regex_pages = 0
+
+        if REGEX_PREFILTER:
+            # Tier 1: the regex extractor; pages it resolves (one Bates number, at least one RO) skip the LLM
+            records = list(self.extraction_service.iter_page_records(
+                PAGE_MARKER_PATTERN.sub("", page_markdown, count=1) for page_markdown in ocr_pages
+            ))
+            resolved = [record for record in records if record[1] is not None]
+            llm_page_numbers = [page_num for page_num, bate_number, _ in records if bate_number is None]
+            regex_pages = len(resolved)
+            new_records = [record for record in resolved if record[0] not in done]
+            if new_records:
+                done.update(page_num for page_num, _, _ in new_records)
+                self.job_store.checkpoint(job_id, new_records, pages_done=len(done))
+            logger.info(f"Job {job_id}: regex resolved {regex_pages} of {total_pages} pages, {len(llm_page_numbers)} left for the LLM")
+
+        # Tier 2: the LLM, on the remaining pages only
+        pipeline = ChunkedExtractionPipeline(self.llm_service)
+        chunks = pipeline.build_chunks(
+            [ocr_pages[page_num - 1] for page_num in llm_page_numbers], page_numbers=llm_page_numbers
+        )
+        pending = [chunk for chunk in chunks if not done.issuperset(chunk["page_numbers"])]
+        self.job_store.update(job_id, num_chunks=len(chunks))
+        logger.info(f"Job {job_id}: {len(chunks) - len(pending)} of {len(chunks)} chunks already checkpointed")
+        if progress_callback:
+            progress_callback(len(done), total_pages)
+
+        def checkpoint_chunk(idx: int, response: Optional[str]):
+            chunk = pending[idx]
+            if response is None:
+                # Not checkpointed, so a resumed job sends the chunk again
+                return
+            # Pages the reply does not resolve are recorded as pages with issues, exactly as assemble() reports them
+            bate_dict, _ = pipeline.assemble([chunk], [response])
+            records = [
+                (page_num, *next(iter(bate_dict[page_num].items()))) if page_num in bate_dict else (page_num, None, [])
+                for page_num in chunk["page_numbers"]
+            ]
+            done.update(chunk["page_numbers"])
+            self.job_store.checkpoint(job_id, records, pages_done=len(done))
+            if progress_callback:
+                progress_callback(len(done), total_pages)
+
+        responses = await pipeline.run_async(pending, result_callback=checkpoint_chunk)
+        failed_chunks = [chunk for chunk, response in zip(pending, responses) if response is None]
+        if failed_chunks:
+            failed_pages = sum(len(chunk["page_numbers"]) for chunk in failed_chunks)
+            raise RuntimeError(
+                f"{len(failed_chunks)} of {len(chunks)} LLM chunks ({failed_pages} pages) failed after retries; "
+                f"resume the job to retry them"
+            )
+
+        bate_dict, pages_with_issues = self.job_store.load_results(job_id)
+        self.record_tier_stats(
+            job_id,
+            regex_pages=regex_pages,
+            llm_pages=len(bate_dict) - regex_pages,
+            unresolved_pages=len(pages_with_issues),
+        )
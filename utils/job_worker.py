@@ -0,0 +1,137 @@
+"""
+Worker processes for the job queue in utils.job_utils.
+
+The Streamlit app starts a pool of JOB_WORKERS processes on first use; for more throughput, or to run
+workers on their own container, start them separately against the same JOBS_DB_PATH:
+
+    python -m utils.job_worker --workers 4
+"""
+import os
+import time
+import argparse
+import logging
+import threading
+import multiprocessing
+from typing import Optional
+from utils.extraction_utils import DocumentExtractor
+from utils.cache_utils import ResultCache
+from utils.job_utils import JobStore, JobRunner, ENGINE_AI
+from utils.case_index_utils import CaseIndex, CASE_INDEX
+
+# Setting up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Worker processes started by the app (0 = only use workers started with `python -m utils.job_worker`)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+# Seconds an idle worker waits before looking at the queue again
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+# Seconds between heartbeats of a running job
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "30"))
+
+
+def run_worker(worker_name: str, stop_event=None, poll_seconds: Optional[float] = None):
+    """
+    Worker process loop: claims queued jobs one at a time and runs them until stop_event is set.
+
+    Each worker extracts serially; throughput comes from running several workers. The OCR and LLM
+    services are only created once the worker meets its first AI job.
+    """
+    poll_seconds = poll_seconds if poll_seconds is not None else JOB_POLL_SECONDS
+    stop_event = stop_event or threading.Event()
+    job_store = JobStore()
+    runner = JobRunner(
+        job_store,
+        DocumentExtractor(workers=1),
+        result_cache=ResultCache(),
+        case_index=CaseIndex() if CASE_INDEX else None,
+    )
+    logger.info(f"{worker_name} started (pid {os.getpid()})")
+    job_store.purge_expired()
+
+    while not stop_event.is_set():
+        job_id = job_store.claim_next()
+        if job_id is None:
+            stop_event.wait(poll_seconds)
+            continue
+
+        job = job_store.get_job(job_id)
+        if job["engine"] == ENGINE_AI and runner.pdf_service is None:
+            # Imported here: these modules require the API keys at import time, which text-layer-only workers may lack
+            from utils.ocr_utils import AsyncPdfProcessor
+            from utils.llm_utils import AsyncLLMService
+            runner.pdf_service = AsyncPdfProcessor()
+            runner.llm_service = AsyncLLMService()
+
+        logger.info(f"{worker_name} running job {job_id} ({job['engine']}, {job['file_name']})")
+        started = time.perf_counter()
+        heartbeat_stop = threading.Event()
+        heartbeat = threading.Thread(
+            target=_send_heartbeats, args=(job_store, job_id, heartbeat_stop), daemon=True
+        )
+        heartbeat.start()
+        try:
+            runner.run(job_id)
+            logger.info(f"{worker_name} finished job {job_id} in {time.perf_counter() - started:.1f}s")
+        except Exception as e:
+            # JobRunner has already marked the job failed with its checkpoints intact
+            logger.error(f"{worker_name} job {job_id} failed: {str(e)}")
+        finally:
+            heartbeat_stop.set()
+            heartbeat.join()
+        job_store.purge_expired()
+
+    runner.close()
+    logger.info(f"{worker_name} stopped")
+
+
+def _send_heartbeats(job_store: JobStore, job_id: str, stop_event: threading.Event):
+    while not stop_event.wait(JOB_HEARTBEAT_SECONDS):
+        job_store.heartbeat(job_id)
+
+
+class JobWorkerPool:
+    """
+    Starts num_workers worker processes. Processes are spawned, not forked, so they never inherit the
+    Streamlit server's threads, and run as daemons so they stop with the server.
+    """
+
+    def __init__(self, num_workers: Optional[int] = None):
+        num_workers = JOB_WORKERS if num_workers is None else num_workers
+        context = multiprocessing.get_context("spawn")
+        self.stop_event = context.Event()
+        self.processes = [
+            context.Process(
+                target=run_worker,
+                args=(f"job-worker-{idx + 1}", self.stop_event),
+                name=f"job-worker-{idx + 1}",
+                daemon=True,
+            )
+            for idx in range(num_workers)
+        ]
+        for process in self.processes:
+            process.start()
+        logger.info(f"Started {num_workers} job worker processes")
+
+    def stop(self, timeout: float = 30):
+        self.stop_event.set()
+        for process in self.processes:
+            process.join(timeout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-w", "--workers", type=int, default=JOB_WORKERS, help="Worker processes (default: JOB_WORKERS)")
+    args = parser.parse_args()
+
+    pool = JobWorkerPool(max(1, args.workers))
+    try:
+        for process in pool.processes:
+            process.join()
+    except KeyboardInterrupt:
+        logger.info("Stopping job workers...")
+        pool.stop()
+
+
+if __name__ == "__main__":
+    main()
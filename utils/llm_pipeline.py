@@ -0,0 +1,404 @@
+import os
+import json
+import asyncio
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from statistics import mean, median
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import tiktoken
+except ImportError:  # Declared dependency; without it token counts fall back to a ~4 characters per token estimate
+    tiktoken = None
+
+# Setting up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Pipeline configuration
+PROMPT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "prompt_registry", "document_analysis_propmt.md")
+LLM_CHUNK_SIZE = int(os.getenv("LLM_CHUNK_SIZE", "10"))  # OCR pages per LLM request when LLM_CHUNK_TOKENS is 0
+LLM_CHUNK_TOKENS = int(os.getenv("LLM_CHUNK_TOKENS", "8000"))  # Prompt token budget per LLM request (0 = fixed page count)
+LLM_TOKENIZER = os.getenv("LLM_TOKENIZER", "o200k_base")  # tiktoken encoding used to count prompt tokens
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))  # Requests in flight at once
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "500"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "200000"))
+LLM_MAX_OUTPUT_TOKENS = int(os.getenv("LLM_MAX_OUTPUT_TOKENS", "2000"))  # Reserved per request in the token bucket and sent as max_tokens
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Refills continuously at rate_per_minute up to capacity;
+    acquire() blocks until the requested amount is available.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _try_acquire(self, amount: float) -> float:
+        """
+        Takes amount tokens if available and returns 0, otherwise returns the seconds to wait before retrying.
+        """
+        # A request larger than the bucket could never be served; let it through once the bucket is full
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate_per_second)
+            self.updated_at = now
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return 0.0
+            return (amount - self.tokens) / self.rate_per_second
+
+    def acquire(self, amount: float = 1.0):
+        while (wait_seconds := self._try_acquire(amount)) > 0:
+            time.sleep(wait_seconds)
+
+    async def acquire_async(self, amount: float = 1.0):
+        while (wait_seconds := self._try_acquire(amount)) > 0:
+            await asyncio.sleep(wait_seconds)
+
+
+class ChunkedExtractionPipeline:
+    """
+    OCR pages -> token-budgeted chunks -> concurrent LLM extraction -> per-page Bates/RO results.
+
+    build_chunks packs consecutive pages into each chunk until its rendered prompt reaches LLM_CHUNK_TOKENS,
+    counted with tiktoken (LLM_TOKENIZER) or ~4 characters per token if the encoding cannot be loaded.
+    Pages are never split, so a page above the budget goes alone; LLM_CHUNK_TOKENS=0 sends LLM_CHUNK_SIZE
+    pages per chunk instead.
+
+    Requests run on a bounded thread pool and pass through two token buckets (requests/minute and
+    tokens/minute) so bursts stay inside the OpenAI rate limits; tenacity in LLMService still retries
+    the occasional 429. Results are always returned in chunk order.
+    """
+
+    def __init__(
+        self,
+        llm_service,
+        prompt_template: Optional[str] = None,
+        concurrency: Optional[int] = None,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+    ):
+        self.llm_service = llm_service
+        self.prompt_template = prompt_template if prompt_template is not None else self.load_prompt_template()
+        self.encoding = self.load_encoding()
+        self.concurrency = max(1, concurrency or LLM_CONCURRENCY)
+        self.request_bucket = TokenBucket(requests_per_minute or LLM_REQUESTS_PER_MINUTE)
+        self.token_bucket = TokenBucket(tokens_per_minute or LLM_TOKENS_PER_MINUTE)
+
+    @staticmethod
+    def load_prompt_template(prompt_path: str = PROMPT_PATH) -> Optional[str]:
+        try:
+            with open(prompt_path, "r") as file:
+                return file.read()
+        except Exception as e:
+            logger.error(f"Failed to load prompt template: {str(e)}", exc_info=True)
+            return None
+
+    @staticmethod
+    def load_encoding(encoding_name: str = LLM_TOKENIZER):
+        """
+        Returns the tiktoken encoding, or None when tiktoken is not installed or its vocabulary cannot be loaded.
+        """
+        if tiktoken is None:
+            return None
+        try:
+            return tiktoken.get_encoding(encoding_name)
+        except Exception as e:
+            logger.warning(f"Falling back to estimated token counts, tiktoken encoding {encoding_name} unavailable: {str(e)}")
+            return None
+
+    def count_tokens(self, text: str) -> int:
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        # ~4 characters per token for English/OCR text
+        return len(text) // 4 + 1
+
+    def build_prompt(self, combined_markdown: str, start_page: int, end_page: int) -> str:
+        if self.prompt_template and "{ocr_text}" in self.prompt_template:
+            return self.prompt_template.replace("{ocr_text}", combined_markdown)
+        return f"# OCR TEXT DATA (Pages {start_page}-{end_page})\n\n{combined_markdown}"
+
+    def build_chunks(
+        self,
+        ocr_pages: List[str],
+        chunk_size: Optional[int] = None,
+        token_budget: Optional[int] = None,
+        page_numbers: Optional[List[int]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Groups OCR page markdown into chunks and renders each chunk's prompt. With a token budget
+        (token_budget, else LLM_CHUNK_TOKENS) pages are packed by token count, otherwise chunk_size pages
+        (else LLM_CHUNK_SIZE) go into each chunk. The chunk size distribution is logged either way.
+
+        page_numbers gives the document page number of each entry of ocr_pages when only some pages are
+        sent to the LLM; by default pages are numbered from 1.
+
+        Returns:
+            List[Dict[str, Any]]: chunk_number, page_numbers, start_page, end_page, pages, combined_markdown,
+            final_prompt, prompt_tokens.
+        """
+        page_numbers = page_numbers or list(range(1, len(ocr_pages) + 1))
+        token_budget = token_budget if token_budget is not None else LLM_CHUNK_TOKENS
+        if chunk_size is None and token_budget > 0:
+            chunks = self.build_token_chunks(ocr_pages, token_budget, page_numbers)
+        else:
+            chunk_size = max(1, chunk_size or LLM_CHUNK_SIZE)
+            chunks = [
+                self.make_chunk(
+                    chunk_idx + 1, page_numbers[start_idx:start_idx + chunk_size], ocr_pages[start_idx:start_idx + chunk_size]
+                )
+                for chunk_idx, start_idx in enumerate(range(0, len(ocr_pages), chunk_size))
+            ]
+        if chunks:
+            logger.info(f"Chunk size distribution: {self.chunk_size_report(chunks)}")
+        return chunks
+
+    def build_token_chunks(
+        self, ocr_pages: List[str], token_budget: int, page_numbers: List[int]
+    ) -> List[Dict[str, Any]]:
+        """
+        Packs consecutive pages into chunks whose rendered prompt (template + pages) stays within token_budget.
+        Pages are never split: a page that does not fit on its own is sent alone, with a warning.
+        """
+        template_tokens = self.count_tokens(self.build_prompt("", 0, 0))
+        page_budget = max(1, token_budget - template_tokens)
+        if template_tokens >= token_budget:
+            logger.warning(f"Prompt template alone takes {template_tokens} tokens, above the {token_budget}-token chunk budget")
+
+        chunks: List[Dict[str, Any]] = []
+        chunk_pages: List[str] = []
+        chunk_page_numbers: List[int] = []
+        chunk_tokens = 0
+        for page_num, page in zip(page_numbers, ocr_pages):
+            # +1 for the blank line joining pages in combined_markdown
+            page_tokens = self.count_tokens(page) + 1
+            if chunk_pages and chunk_tokens + page_tokens > page_budget:
+                chunks.append(self.make_chunk(len(chunks) + 1, chunk_page_numbers, chunk_pages))
+                chunk_pages, chunk_page_numbers, chunk_tokens = [], [], 0
+            if page_tokens > page_budget:
+                logger.warning(f"Page {page_num} alone takes {page_tokens} tokens, above the chunk budget; sending it on its own")
+            chunk_pages.append(page)
+            chunk_page_numbers.append(page_num)
+            chunk_tokens += page_tokens
+        if chunk_pages:
+            chunks.append(self.make_chunk(len(chunks) + 1, chunk_page_numbers, chunk_pages))
+        return chunks
+
+    @staticmethod
+    def chunk_size_report(chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Summarises pages and prompt tokens per chunk (min / median / mean / max), for tuning the chunk budget.
+        """
+        def summary(values: List[int]) -> Dict[str, float]:
+            return {"min": min(values), "median": median(values), "mean": round(mean(values), 1), "max": max(values)}
+
+        return {
+            "chunks": len(chunks),
+            "pages_per_chunk": summary([len(chunk["pages"]) for chunk in chunks]),
+            "tokens_per_chunk": summary([chunk["prompt_tokens"] for chunk in chunks]),
+        }
+
+    def make_chunk(self, chunk_number: int, page_numbers: List[int], chunk_pages: List[str]) -> Dict[str, Any]:
+        start_page, end_page = page_numbers[0], page_numbers[-1]
+        combined_markdown = "\n\n".join(chunk_pages)
+        final_prompt = self.build_prompt(combined_markdown, start_page, end_page)
+        return {
+            "chunk_number": chunk_number,
+            "page_numbers": list(page_numbers),
+            "start_page": start_page,
+            "end_page": end_page,
+            "pages": chunk_pages,
+            "combined_markdown": combined_markdown,
+            "final_prompt": final_prompt,
+            "prompt_tokens": self.count_tokens(final_prompt),
+        }
+
+    def _process_chunk(self, chunk: Dict[str, Any]) -> Optional[str]:
+        prompt = chunk["final_prompt"]
+        # Cached responses use no OpenAI quota, so they skip the rate limiter
+        cache_key, cached = self.llm_service.cached_response(prompt)
+        if cached is not None:
+            return cached
+        self.request_bucket.acquire(1)
+        self.token_bucket.acquire(chunk["prompt_tokens"] + LLM_MAX_OUTPUT_TOKENS)
+        logger.info(f"Chunk {chunk['chunk_number']}: pages {chunk['start_page']}-{chunk['end_page']} sent to LLM")
+        return self.llm_service.process_document_extraction(prompt, cache_key=cache_key)
+
+    def run(
+        self,
+        chunks: List[Dict[str, Any]],
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+        result_callback: Optional[Callable[[int, Optional[str]], None]] = None,
+    ) -> List[Optional[str]]:
+        """
+        Sends every chunk to the LLM with at most `concurrency` requests in flight.
+
+        Args:
+            chunks (List[Dict[str, Any]]): Output of build_chunks.
+            progress_callback (Optional[Callable[[int, int], None]]): Called as (completed, total) from the
+                calling thread, so it may safely update Streamlit elements.
+            result_callback (Optional[Callable[[int, Optional[str]], None]]): Called as (chunk index, response)
+                from the calling thread as soon as each chunk finishes, e.g. to checkpoint its pages.
+
+        Returns:
+            List[Optional[str]]: Raw LLM responses in chunk order; None for chunks that failed after retries.
+        """
+        responses: List[Optional[str]] = [None] * len(chunks)
+        if not chunks:
+            return responses
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = {executor.submit(self._process_chunk, chunk): idx for idx, chunk in enumerate(chunks)}
+            for completed, future in enumerate(as_completed(futures), start=1):
+                idx = futures[future]
+                try:
+                    responses[idx] = future.result()
+                except Exception as e:
+                    logger.error(f"Chunk {chunks[idx]['chunk_number']} failed: {str(e)}")
+                if result_callback:
+                    result_callback(idx, responses[idx])
+                if progress_callback:
+                    progress_callback(completed, len(chunks))
+
+        failed = sum(1 for response in responses if response is None)
+        logger.info(f"LLM extraction finished: {len(chunks) - failed}/{len(chunks)} chunks succeeded")
+        return responses
+
+    async def _process_chunk_async(self, chunk: Dict[str, Any], semaphore: asyncio.Semaphore) -> Optional[str]:
+        prompt = chunk["final_prompt"]
+        cache_key, cached = await self.llm_service.cached_response_async(prompt)
+        if cached is not None:
+            return cached
+        async with semaphore:
+            await self.request_bucket.acquire_async(1)
+            await self.token_bucket.acquire_async(chunk["prompt_tokens"] + LLM_MAX_OUTPUT_TOKENS)
+            logger.info(f"Chunk {chunk['chunk_number']}: pages {chunk['start_page']}-{chunk['end_page']} sent to LLM")
+            return await self.llm_service.process_document_extraction(prompt, cache_key=cache_key)
+
+    async def run_async(
+        self,
+        chunks: List[Dict[str, Any]],
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+        result_callback: Optional[Callable[[int, Optional[str]], None]] = None,
+    ) -> List[Optional[str]]:
+        """
+        Same contract as run(), for an async LLM service (AsyncLLMService): a single event loop keeps
+        up to `concurrency` requests in flight without a thread per request.
+
+        result_callback usually writes a checkpoint, so it runs on a worker thread (asyncio.to_thread), one
+        chunk at a time, while the other requests stay in flight.
+        """
+        responses: List[Optional[str]] = [None] * len(chunks)
+        if not chunks:
+            return responses
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run_one(idx: int):
+            try:
+                return idx, await self._process_chunk_async(chunks[idx], semaphore)
+            except Exception as e:
+                logger.error(f"Chunk {chunks[idx]['chunk_number']} failed: {str(e)}")
+                return idx, None
+
+        tasks = [asyncio.create_task(run_one(idx)) for idx in range(len(chunks))]
+        for completed, task in enumerate(asyncio.as_completed(tasks), start=1):
+            idx, response = await task
+            responses[idx] = response
+            if result_callback:
+                await asyncio.to_thread(result_callback, idx, response)
+            if progress_callback:
+                progress_callback(completed, len(chunks))
+
+        failed = sum(1 for response in responses if response is None)
+        logger.info(f"LLM extraction finished: {len(chunks) - failed}/{len(chunks)} chunks succeeded")
+        return responses
+
+    @staticmethod
+    def _page_of(snippet: str, pages: List[str]) -> Optional[int]:
+        """
+        Returns the index of the only page that contains snippet, or None if it is missing or ambiguous.
+        """
+        snippet = str(snippet or "").strip()
+        if not snippet:
+            return None
+        found = [idx for idx, page in enumerate(pages) if snippet in page]
+        return found[0] if len(found) == 1 else None
+
+    @staticmethod
+    def _items(parsed: Dict[str, Any], key: str, chunk_number: int) -> List[Dict[str, Any]]:
+        """
+        Returns the objects listed under key in an LLM reply, skipping anything that is not an object
+        (e.g. a bare "AARON00000001" string), so the affected pages become issues instead of failing the job.
+        """
+        items = parsed.get(key) or []
+        if not isinstance(items, list):
+            logger.warning(f"Chunk {chunk_number}: {key} is not a list, ignoring it")
+            return []
+        skipped = [item for item in items if not isinstance(item, dict)]
+        if skipped:
+            logger.warning(f"Chunk {chunk_number}: skipping {len(skipped)} {key} entries that are not objects")
+        return [item for item in items if isinstance(item, dict)]
+
+    def assemble(
+        self, chunks: List[Dict[str, Any]], responses: List[Optional[str]]
+    ) -> Tuple[Dict[int, Dict[str, List[str]]], List[int]]:
+        """
+        Maps each chunk's LLM JSON back onto its pages, in the same shape as
+        DocumentExtractor.process_structured_ocr_pdf: (bate_dict, pages_with_issues).
+
+        Every Bates number and RO is placed on the page whose text contains its raw_context
+        (or its value). A page is an issue when it does not end up with exactly one Bates number
+        and at least one RO, or when its chunk failed or returned invalid JSON.
+        """
+        bate_dict: Dict[int, Dict[str, List[str]]] = {}
+        pages_with_issues: List[int] = []
+
+        for chunk, response in zip(chunks, responses):
+            page_nums = chunk["page_numbers"]
+            try:
+                parsed = json.loads(response) if response else None
+            except json.JSONDecodeError:
+                logger.error(f"Chunk {chunk['chunk_number']} returned invalid JSON")
+                parsed = None
+            if not isinstance(parsed, dict):
+                pages_with_issues.extend(page_nums)
+                continue
+
+            pages = chunk["pages"]
+            page_bates: List[List[str]] = [[] for _ in pages]
+            page_ros: List[List[str]] = [[] for _ in pages]
+            single_page = len(pages) == 1
+
+            for item in self._items(parsed, "bates_numbers", chunk["chunk_number"]):
+                value = str(item.get("value", "")).strip()
+                idx = 0 if single_page else self._page_of(item.get("raw_context"), pages)
+                if idx is None:
+                    idx = self._page_of(value, pages)
+                if value and idx is not None and value not in page_bates[idx]:
+                    page_bates[idx].append(value)
+
+            for item in self._items(parsed, "repair_orders", chunk["chunk_number"]):
+                value = str(item.get("repair_order_number", "")).strip()
+                idx = 0 if single_page else self._page_of(item.get("raw_context"), pages)
+                if idx is None:
+                    idx = self._page_of(value, pages)
+                if value and idx is not None:
+                    page_ros[idx].append(value)
+
+            for idx, page_num in enumerate(page_nums):
+                if len(page_bates[idx]) != 1 or not page_ros[idx]:
+                    pages_with_issues.append(page_num)
+                    continue
+                bate_dict[page_num] = {page_bates[idx][0]: page_ros[idx]}
+
+        return bate_dict, pages_with_issues
@@ -1,11 +1,16 @@
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
+import httpx
 import os
+import asyncio
 import json
 import logging
 import traceback
 from dotenv import load_dotenv
 from rich import print
 from tenacity import retry, stop_after_attempt, wait_exponential_jitter
+from utils.cache_utils import LlmResponseCache
+from utils.llm_pipeline import LLM_MAX_OUTPUT_TOKENS
+from utils.metrics_utils import METRICS, STAGE_LLM, count_retries
 
 load_dotenv()
 
@@ -16,7 +21,12 @@ logger = logging.getLogger(__name__)
 # Getting the OpenAI API key from the environment variables
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL")
-OPENAI_TEMPERATURE = os.getenv("OPENAI_TEMPERATURE", "0.7")  # Default to 0.7 if not set
+OPENAI_TEMPERATURE = os.getenv("OPENAI_TEMPERATURE", "0.7")  # Default to 0.7 if not set; only 0 is cached
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")  # Optional, e.g. a local stub server for testing
+# Size of the keep-alive connection pool shared by every call made through one LLMService
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+# Set LLM_RESPONSE_CACHE=0 to always call OpenAI, even for prompts answered before
+LLM_RESPONSE_CACHE = os.getenv("LLM_RESPONSE_CACHE", "1") == "1"
 
 # Validate required environment variables
 if not OPENAI_API_KEY:
@@ -26,10 +36,17 @@ if not OPENAI_MODEL:
 if not OPENAI_TEMPERATURE:
     raise ValueError("Please set the OPENAI_TEMPERATURE environment variable.")
 
+SYSTEM_MESSAGE = "You are a high-precision extraction engine that returns only valid JSON."
+
 
 class LLMService:
     def __init__(self):
-        self.llm_client = OpenAI(api_key=OPENAI_API_KEY)
+        # One pooled HTTP client per service instance, so keep-alive connections are reused across calls
+        self.http_client = DefaultHttpxClient(
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_CONNECTIONS)
+        )
+        self.llm_client = OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL, http_client=self.http_client)
+        self.response_cache = LlmResponseCache() if LLM_RESPONSE_CACHE else None
         self.logger = logging.getLogger(__name__)
 
     def validate_response():
@@ -38,13 +55,87 @@ class LLMService:
         """
 
 
-    @retry(stop=stop_after_attempt(5), wait=wait_exponential_jitter(initial=1, max=10))
-    def process_document_extraction(self, prompt: str):
+    @staticmethod
+    def build_chat_request(prompt: str) -> dict:
+        """
+        Keyword arguments for chat.completions.create, shared by the sync and async services.
+        """
+        return {
+            "model": OPENAI_MODEL,
+            "messages": [
+                {"role": "system", "content": SYSTEM_MESSAGE},
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": float(OPENAI_TEMPERATURE),
+            # Caps the answer at what the pipeline's token bucket reserved for it
+            "max_tokens": LLM_MAX_OUTPUT_TOKENS,
+            "response_format": {"type": "json_object"}  # Ensure JSON response
+        }
+
+    def response_cache_key(self, request: dict):
+        """
+        Returns the response cache key for a chat request, or None when the request must not be cached:
+        the cache is disabled, or the temperature is above 0 so the same prompt may legitimately answer differently.
+        """
+        if self.response_cache is None or request["temperature"] > 0:
+            return None
+        return LlmResponseCache.request_key(
+            request["model"], request["temperature"], request["max_tokens"],
+            request["messages"][0]["content"], request["messages"][1]["content"],
+        )
+
+    def cached_response(self, prompt: str):
+        """
+        Looks prompt up in the response cache.
+
+        Returns:
+            tuple: (cache_key, cached response). The response is None if the prompt has to be sent to OpenAI;
+                   pass cache_key on to process_document_extraction so the cache is not queried again.
+        """
+        cache_key = self.response_cache_key(self.build_chat_request(prompt))
+        cached = self.response_cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            METRICS.add(STAGE_LLM, cache_hits=1)
+        return cache_key, cached
+
+    @staticmethod
+    def token_usage(response) -> dict:
+        """
+        Token counts reported in a chat completion's usage block (empty if the API returned none).
+        """
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return {}
+        return {
+            "prompt_tokens": usage.prompt_tokens or 0,
+            "completion_tokens": usage.completion_tokens or 0,
+            "total_tokens": usage.total_tokens or 0,
+        }
+
+    def extract_response_text(self, response):
+        """
+        Returns the message content of the first choice, or None if the response has no choices.
+        """
+        if response.choices and len(response.choices) > 0:
+            response_text = response.choices[0].message.content
+            if response.choices[0].finish_reason == "length":
+                self.logger.warning(f"OpenAI response was cut off at max_tokens ({LLM_MAX_OUTPUT_TOKENS}); raise LLM_MAX_OUTPUT_TOKENS")
+            print(response_text)
+            self.logger.info(f"Successfully received response from OpenAI API (length: {len(response_text)} chars)")
+            return response_text
+        else:
+            self.logger.error("No choices in OpenAI API response")
+            return None
+
+    @retry(stop=stop_after_attempt(5), wait=wait_exponential_jitter(initial=1, max=10), before_sleep=count_retries(STAGE_LLM))
+    def process_document_extraction(self, prompt: str, cache_key=None):
         """
         Processes a document and returns a structured JSON of the document.
         
         Args:
             prompt: The prompt text to send to the LLM
+            cache_key: Key returned by cached_response for a prompt that missed the cache; the response is
+                stored under it without looking the prompt up again
             
         Returns:
             str: The extracted text/JSON response from the LLM, or None if an error occurred
@@ -54,34 +145,93 @@ class LLMService:
             if not prompt or not prompt.strip():
                 raise ValueError("Prompt cannot be empty.")
             
+            request = self.build_chat_request(prompt)
+            if cache_key is None:
+                cache_key = self.response_cache_key(request)
+                if cache_key and (cached := self.response_cache.get(cache_key)) is not None:
+                    self.logger.info("Serving LLM response from the response cache")
+                    METRICS.add(STAGE_LLM, cache_hits=1)
+                    return cached
+
             self.logger.info(f"Calling OpenAI API with model: {OPENAI_MODEL}")
             
             # Use chat.completions.create() for GPT-4 models
-            response = self.llm_client.chat.completions.create(
-                model=OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": "You are a high-precision extraction engine that returns only valid JSON."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=float(OPENAI_TEMPERATURE),
-                response_format={"type": "json_object"}  # Ensure JSON response
-            )
-            
-            # Extract the response text
-            if response.choices and len(response.choices) > 0:
-                response_text = response.choices[0].message.content
-                print(response_text)
-                self.logger.info(f"Successfully received response from OpenAI API (length: {len(response_text)} chars)")
-                return response_text
-            else:
-                self.logger.error("No choices in OpenAI API response")
-                return None
+            with METRICS.timer(STAGE_LLM, bytes=len(prompt.encode("utf-8"))) as measured:
+                response = self.llm_client.chat.completions.create(**request)
+                measured.update(self.token_usage(response))
+            response_text = self.extract_response_text(response)
+            if cache_key and response_text is not None:
+                self.response_cache.set(cache_key, response_text)
+            return response_text
                 
         except Exception as e:
             self.logger.error(f"Error processing document extraction: {str(e)}")
             self.logger.error(f"Full traceback: {traceback.format_exc()}")
             raise  # Re-raise to allow tenacity to retry
 
+
+class AsyncLLMService(LLMService):
+    """
+    asyncio-native LLMService: one event loop can keep many requests in flight without a thread per call.
+    tenacity's @retry detects the coroutine and backs off with asyncio.sleep instead of blocking, and the
+    SQLite response cache is read and written on worker threads (asyncio.to_thread), off the event loop.
+    """
+
+    def __init__(self):
+        self.http_client = DefaultAsyncHttpxClient(
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_CONNECTIONS)
+        )
+        self.llm_client = AsyncOpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL, http_client=self.http_client)
+        self.response_cache = LlmResponseCache() if LLM_RESPONSE_CACHE else None
+        self.logger = logging.getLogger(__name__)
+
+    async def cached_response_async(self, prompt: str):
+        """
+        cached_response, run on a worker thread.
+        """
+        return await asyncio.to_thread(self.cached_response, prompt)
+
+    @retry(stop=stop_after_attempt(5), wait=wait_exponential_jitter(initial=1, max=10), before_sleep=count_retries(STAGE_LLM))
+    async def process_document_extraction(self, prompt: str, cache_key=None):
+        """
+        Async version of LLMService.process_document_extraction.
+
+        Args:
+            prompt: The prompt text to send to the LLM
+            cache_key: Key returned by cached_response for a prompt that missed the cache; the response is
+                stored under it without looking the prompt up again
+
+        Returns:
+            str: The extracted text/JSON response from the LLM, or None if an error occurred
+        """
+        try:
+            if not prompt or not prompt.strip():
+                raise ValueError("Prompt cannot be empty.")
+
+            request = self.build_chat_request(prompt)
+            if cache_key is None:
+                cache_key, cached = await self.cached_response_async(prompt)
+                if cached is not None:
+                    self.logger.info("Serving LLM response from the response cache")
+                    return cached
+
+            self.logger.info(f"Calling OpenAI API (async) with model: {OPENAI_MODEL}")
+            with METRICS.timer(STAGE_LLM, bytes=len(prompt.encode("utf-8"))) as measured:
+                response = await self.llm_client.chat.completions.create(**request)
+                measured.update(self.token_usage(response))
+            response_text = self.extract_response_text(response)
+            if cache_key and response_text is not None:
+                await asyncio.to_thread(self.response_cache.set, cache_key, response_text)
+            return response_text
+
+        except Exception as e:
+            self.logger.error(f"Error processing document extraction: {str(e)}")
+            self.logger.error(f"Full traceback: {traceback.format_exc()}")
+            raise  # Re-raise to allow tenacity to retry
+
+    async def aclose(self):
+        await self.llm_client.close()
+
 # if __name__ == "__main__":
 #     llm_service = LLMService()
 #     response = llm_service.process_document_extraction("What is the main idea of the document?")
@@ -0,0 +1,116 @@
+import copy
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+# Setting up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Pipeline stages, in processing order
+STAGE_PDF_OPEN = "pdf_open"
+STAGE_TEXT_EXTRACTION = "text_extraction"
+STAGE_OCR = "ocr_call"
+STAGE_REGEX_SCAN = "regex_scan"
+STAGE_LLM = "llm_call"
+STAGE_EXPORT = "export"
+# Wall time of a whole job or batch run; the stages above sum the time of every call, so concurrent
+# calls (OCR batches, LLM chunks) can add up to more than this
+STAGE_TOTAL = "total"
+STAGE_ORDER = [
+    STAGE_PDF_OPEN, STAGE_TEXT_EXTRACTION, STAGE_OCR, STAGE_REGEX_SCAN, STAGE_LLM, STAGE_EXPORT, STAGE_TOTAL,
+]
+
+
+class PipelineMetrics:
+    """
+    Thread-safe per-stage counters. Every stage keeps calls, seconds, pages and bytes, plus any other
+    counter recorded for it (retries, prompt_tokens, completion_tokens, cache_hits, rows, ...).
+
+    Stages are plain dicts of numbers, so they serialise to JSON as they are and can be merged across
+    processes: workers send snapshot deltas (see since) and the parent merges them.
+    """
+
+    def __init__(self, stages: Optional[Dict[str, Dict[str, float]]] = None):
+        self.stages: Dict[str, Dict[str, float]] = copy.deepcopy(stages) if stages else {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, **counters: float):
+        """
+        Adds counters to a stage without counting a call, e.g. add(STAGE_LLM, retries=1).
+        """
+        with self._lock:
+            totals = self.stages.setdefault(stage, {})
+            for name, value in counters.items():
+                totals[name] = totals.get(name, 0) + value
+
+    def record(self, stage: str, seconds: float, pages: int = 0, bytes: int = 0, **counters: float):
+        """
+        Records one call of a stage.
+        """
+        self.add(stage, calls=1, seconds=seconds, pages=pages, bytes=bytes, **counters)
+
+    @contextmanager
+    def timer(self, stage: str, pages: int = 0, bytes: int = 0, **counters: float) -> Iterator[Dict[str, float]]:
+        """
+        Times the block as one call of stage. The yielded dict may be updated inside the block with
+        counts only known at the end (pages, bytes or any other counter). Nothing is recorded if the block raises.
+        """
+        measured: Dict[str, float] = {"pages": pages, "bytes": bytes, **counters}
+        started = time.perf_counter()
+        yield measured
+        self.record(stage, time.perf_counter() - started, **measured)
+
+    def merge(self, stages: Dict[str, Dict[str, float]]):
+        for stage, counters in (stages or {}).items():
+            self.add(stage, **counters)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return copy.deepcopy(self.stages)
+
+    def since(self, snapshot: Dict[str, Dict[str, float]]) -> Dict[str, Dict[str, float]]:
+        """
+        Returns what was recorded after snapshot was taken.
+        """
+        delta: Dict[str, Dict[str, float]] = {}
+        for stage, counters in self.snapshot().items():
+            before = snapshot.get(stage, {})
+            changed = {name: value - before.get(name, 0) for name, value in counters.items() if value != before.get(name, 0)}
+            if changed:
+                delta[stage] = changed
+        return delta
+
+    @staticmethod
+    def summary(stages: Dict[str, Dict[str, float]]) -> List[Dict[str, Any]]:
+        """
+        One row per stage in STAGE_ORDER (other stages after it), with pages/sec and MB/sec derived
+        from the summed seconds.
+        """
+        ordered = [stage for stage in STAGE_ORDER if stage in stages] + sorted(set(stages) - set(STAGE_ORDER))
+        rows = []
+        for stage in ordered:
+            counters = stages[stage]
+            seconds = counters.get("seconds", 0)
+            row = {"stage": stage, **{name: counters[name] for name in sorted(counters)}}
+            # Rates are left empty for stages that count no pages (or bytes), e.g. the PDF open
+            row["pages_per_sec"] = counters["pages"] / seconds if seconds and counters.get("pages") else None
+            row["mb_per_sec"] = counters["bytes"] / (1024 * 1024) / seconds if seconds and counters.get("bytes") else None
+            rows.append(row)
+        return rows
+
+
+# Process-wide metrics; the job runner and the batch workers turn them into per-document deltas
+METRICS = PipelineMetrics()
+
+
+def count_retries(stage: str):
+    """
+    tenacity before_sleep hook that counts each retry of a stage in METRICS.
+    """
+    def before_sleep(retry_state):
+        METRICS.add(stage, retries=1)
+        logger.warning(f"Retrying {stage} (attempt {retry_state.attempt_number} failed)")
+    return before_sleep
@@ -1,10 +1,16 @@
 import os
 import logging
 import base64
+import httpx
+import fitz
 from mistralai import Mistral
 from dotenv import load_dotenv
+import asyncio
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from tenacity import retry, stop_after_attempt, wait_exponential_jitter
+from utils.cache_utils import OcrPageCache
+from utils.metrics_utils import METRICS, STAGE_OCR, count_retries
 load_dotenv()
 
 # Setting up the logging configuration
@@ -15,20 +21,40 @@ logger = logging.getLogger(__name__)
 MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
 if not MISTRAL_API_KEY:
     raise ValueError("Please set the MISTRAL_API_KEY environment variable.")
+# Size of the keep-alive connection pool shared by every call made through one PdfProcessor
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+# Pages per OCR request and number of OCR requests in flight when a PDF is split into page batches
+OCR_BATCH_PAGES = int(os.getenv("OCR_BATCH_PAGES", "50"))
+OCR_MAX_WORKERS = int(os.getenv("OCR_MAX_WORKERS", "4"))
+# Pages whose PyMuPDF text layer has fewer non-whitespace characters than this are sent to OCR in hybrid mode
+HYBRID_MIN_TEXT_CHARS = int(os.getenv("HYBRID_MIN_TEXT_CHARS", "1"))
+# Set OCR_PAGE_CACHE=0 to send every page to Mistral even when it was OCR'd before
+OCR_PAGE_CACHE = os.getenv("OCR_PAGE_CACHE", "1") == "1"
 
 
 class PdfProcessor:
     def __init__(self):
         # You can set the API key via argument or environment variable
         self.api_key = MISTRAL_API_KEY
-        self.client = Mistral(api_key=self.api_key)
+        # One pooled HTTP client per service instance, so keep-alive connections are reused across calls
+        self.http_client = httpx.Client(
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_CONNECTIONS)
+        )
+        self.client = Mistral(api_key=self.api_key, client=self.http_client)
+        self.page_cache = OcrPageCache() if OCR_PAGE_CACHE else None
 
-    def validate_ocr_response(self, ocr_response):
+    def validate_ocr_response(self, ocr_response, page_numbers=None):
         """
         Simple validation of OCR response, with page number injected:
         - If no response, raise error.
         - If response has 'pages', and it's not empty, return a list of markdown with prepended page number.
         - If no pages, raise error.
+
+        page_numbers optionally maps the i-th page of the submitted PDF to its page number in the original
+        document (used when only a subset of pages was sent to OCR); by default pages are numbered from 1.
+        Pages are matched on the index Mistral reports for them, not on their position in the response,
+        and with page_numbers a response missing any of the submitted pages raises instead of shifting
+        the remaining pages onto the wrong numbers.
         """
         if not ocr_response:
             raise ValueError("OCR response is empty or None.")
@@ -38,13 +64,21 @@ class PdfProcessor:
             if not pages or len(pages) == 0:
                 raise ValueError("OCR response does not contain any pages.")
             
-            markdown_pages = []
-            for idx, page in enumerate(pages):
+            markdown_by_index = {}
+            for position, page in enumerate(pages):
                 if hasattr(page, 'markdown'):
-                    page_num = idx + 1  # 1-based indexing
-                    page_markdown_with_number = f"**PAGE {page_num}**\n\n{page.markdown}"
-                    markdown_pages.append(page_markdown_with_number)
-            return markdown_pages
+                    page_index = getattr(page, 'index', position)  # 0-based page index in the submitted PDF
+                    if page_numbers and not 0 <= page_index < len(page_numbers):
+                        raise ValueError(f"OCR response has page index {page_index} for a {len(page_numbers)}-page PDF.")
+                    markdown_by_index[page_index] = page.markdown
+
+            if page_numbers and len(markdown_by_index) != len(page_numbers):
+                missing = [page_num for idx, page_num in enumerate(page_numbers) if idx not in markdown_by_index]
+                raise ValueError(f"OCR response is missing pages {missing}.")
+            return [
+                f"**PAGE {page_numbers[idx] if page_numbers else idx + 1}**\n\n{markdown_by_index[idx]}"  # 1-based numbering
+                for idx in sorted(markdown_by_index)
+            ]
 
         else:
             raise ValueError("OCR response does not have pages attribute.")
@@ -60,13 +94,44 @@ class PdfProcessor:
             raise e
 
 
-    @retry(stop=stop_after_attempt(5), wait=wait_exponential_jitter(initial=1, max=10))
-    def extract_text_from_pdf(self, pdf_bytes):
+    @staticmethod
+    def build_ocr_request(pdf_bytes) -> dict:
+        """
+        Validates the PDF bytes and returns the keyword arguments for ocr.process / ocr.process_async.
+
+        Raises:
+            ValueError: If pdf_bytes is None, empty or not a PDF
+        """
+        # Validate PDF bytes
+        if not pdf_bytes:
+            raise ValueError("PDF bytes are empty or None. Please ensure the PDF file was read correctly.")
+        
+        if len(pdf_bytes) == 0:
+            raise ValueError("PDF bytes length is 0. Please check the uploaded file.")
+        
+        # Validate PDF header (PDF files should start with %PDF)
+        if not pdf_bytes.startswith(b'%PDF'):
+            raise ValueError("Invalid PDF format. File does not appear to be a valid PDF.")
+        
+        # Encode PDF bytes to base64 for Mistral OCR API
+        base64_pdf = base64.b64encode(pdf_bytes).decode("utf-8")
+        return {
+            "model": "mistral-ocr-latest",
+            "document": {
+                "type": "document_url",
+                "document_url": f"data:application/pdf;base64,{base64_pdf}"
+            },
+            "include_image_base64": False  # Set to True if you need embedded images
+        }
+
+    @retry(stop=stop_after_attempt(5), wait=wait_exponential_jitter(initial=1, max=10), before_sleep=count_retries(STAGE_OCR))
+    def extract_text_from_pdf(self, pdf_bytes, page_numbers=None):
         """
         Extracts text from a local PDF using Mistral OCR.
         
         Args:
             pdf_bytes: Raw PDF file bytes to be processed
+            page_numbers: Optional original page numbers of the pages in pdf_bytes (see validate_ocr_response)
             
         Returns:
             OCR response object containing extracted text (markdown format)
@@ -75,36 +140,322 @@ class PdfProcessor:
             ValueError: If pdf_bytes is None or empty
         """
         try:
-            # Validate PDF bytes
-            if not pdf_bytes:
-                raise ValueError("PDF bytes are empty or None. Please ensure the PDF file was read correctly.")
-            
-            if len(pdf_bytes) == 0:
-                raise ValueError("PDF bytes length is 0. Please check the uploaded file.")
-            
-            # Validate PDF header (PDF files should start with %PDF)
-            if not pdf_bytes.startswith(b'%PDF'):
-                raise ValueError("Invalid PDF format. File does not appear to be a valid PDF.")
-            
-            # Encode PDF bytes to base64 for Mistral OCR API
-            base64_pdf = base64.b64encode(pdf_bytes).decode("utf-8")
-
-            ocr_response = self.client.ocr.process(
-                model="mistral-ocr-latest",
-                document={
-                    "type": "document_url",
-                    "document_url": f"data:application/pdf;base64,{base64_pdf}"
-                },
-                include_image_base64=False  # Set to True if you need embedded images
+            with METRICS.timer(STAGE_OCR, bytes=len(pdf_bytes)) as measured:
+                ocr_response = self.client.ocr.process(**self.build_ocr_request(pdf_bytes))
+                validated_ocr_response = self.validate_ocr_response(ocr_response, page_numbers)
+                measured["pages"] = len(validated_ocr_response)
+            return validated_ocr_response
+        except Exception as e:
+            logger.error(f"Error during OCR extraction: {str(e)}")
+            logger.error(traceback.format_exc())
+            raise e
+
+    def split_into_batches(self, pdf_bytes, batch_size=None, page_numbers=None):
+        """
+        Splits a PDF into sub-PDFs of at most batch_size pages.
+
+        Returns:
+            List of (sub_pdf_bytes, page_numbers) tuples, where page_numbers are the global numbers of the batch's
+            pages (taken from page_numbers when given, otherwise 1..N).
+        """
+        batch_size = max(1, batch_size or OCR_BATCH_PAGES)
+        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        try:
+            total_pages = len(doc)
+            page_numbers = page_numbers or list(range(1, total_pages + 1))
+            return [
+                (
+                    self.build_sub_pdf(doc, range(start, min(start + batch_size, total_pages))),
+                    page_numbers[start:start + batch_size],
+                )
+                for start in range(0, total_pages, batch_size)
+            ]
+        finally:
+            doc.close()
+
+    def extract_text_from_pdf_batched(self, pdf_bytes, batch_size=None, max_workers=None, page_numbers=None, page_hashes=None):
+        """
+        Splits the PDF into fixed-size page batches and OCRs them concurrently. Each batch goes through
+        extract_text_from_pdf, so a transient failure retries only that batch, and its pages are numbered
+        globally, so the merged result reads as one continuous document.
+
+        When page_hashes is given, every batch is written to the OCR page cache as soon as it succeeds,
+        so a run that fails part-way only has to OCR the failed batches again.
+
+        Args:
+            pdf_bytes: Raw PDF file bytes to be processed
+            batch_size: Pages per OCR request (defaults to OCR_BATCH_PAGES)
+            max_workers: OCR requests in flight (defaults to OCR_MAX_WORKERS)
+            page_numbers: Optional original page numbers of the pages in pdf_bytes
+            page_hashes: Optional mapping of page number to OCR page cache key (see lookup_cached_pages)
+
+        Returns:
+            List of page markdown strings in page order, each prefixed with its global page number
+
+        Raises:
+            RuntimeError: If any batch still fails after its retries
+        """
+        batches = self.split_into_batches(pdf_bytes, batch_size, page_numbers)
+        if len(batches) == 1:
+            ocr_pages = self.extract_text_from_pdf(batches[0][0], page_numbers=batches[0][1])
+            self.cache_ocr_pages(page_hashes, batches[0][1], ocr_pages)
+            return ocr_pages
+
+        logger.info(f"OCR: {len(batches)} batches of up to {batch_size or OCR_BATCH_PAGES} pages")
+        results = [None] * len(batches)
+        failed_ranges = []
+        with ThreadPoolExecutor(max_workers=max_workers or OCR_MAX_WORKERS) as executor:
+            futures = [
+                executor.submit(self.extract_text_from_pdf, batch_bytes, page_numbers=batch_page_numbers)
+                for batch_bytes, batch_page_numbers in batches
+            ]
+            for idx, future in enumerate(futures):
+                try:
+                    results[idx] = future.result()
+                    self.cache_ocr_pages(page_hashes, batches[idx][1], results[idx])
+                except Exception as e:
+                    batch_page_numbers = batches[idx][1]
+                    failed_ranges.append(f"{batch_page_numbers[0]}-{batch_page_numbers[-1]}")
+                    logger.error(f"OCR batch for pages {failed_ranges[-1]} failed: {str(e)}")
+
+        if failed_ranges:
+            raise RuntimeError(f"OCR failed for pages {', '.join(failed_ranges)}")
+        return [page_markdown for batch_pages in results for page_markdown in batch_pages]
+
+    @staticmethod
+    def build_sub_pdf(doc, page_indexes):
+        """
+        Copies the given 0-based pages of an open fitz document into a new PDF and returns its bytes.
+        """
+        sub_doc = fitz.open()
+        try:
+            for page_index in page_indexes:
+                sub_doc.insert_pdf(doc, from_page=page_index, to_page=page_index)
+            return sub_doc.tobytes(garbage=3, deflate=True)
+        finally:
+            sub_doc.close()
+
+    def lookup_cached_pages(self, doc, page_indexes):
+        """
+        Looks the given 0-based pages of an open fitz document up in the OCR page cache and packs the
+        misses into a sub-PDF.
+
+        Returns:
+            (cached_pages, pending_page_numbers, sub_pdf_bytes, page_hashes): cached_pages maps page number to
+            "**PAGE n**" markdown; sub_pdf_bytes holds the pending pages (None when there are none); page_hashes
+            maps each pending page number to its cache key, for extract_text_from_pdf_batched.
+        """
+        page_indexes = list(page_indexes)
+        if self.page_cache is None:
+            pending = page_indexes
+            cached_pages, page_hashes = {}, None
+        else:
+            memo = {}
+            hashes = {idx: self.page_cache.page_hash(doc, doc[idx], memo) for idx in page_indexes}
+            found = self.page_cache.get_many(list(set(hashes.values())))
+            cached_pages = {
+                idx + 1: f"**PAGE {idx + 1}**\n\n{found[page_hash]}"
+                for idx, page_hash in hashes.items()
+                if page_hash in found
+            }
+            pending = [idx for idx in page_indexes if idx + 1 not in cached_pages]
+            page_hashes = {idx + 1: hashes[idx] for idx in pending}
+            stats = self.page_cache.stats()
+            logger.info(
+                f"OCR page cache: {len(cached_pages)} of {len(page_indexes)} pages cached "
+                f"({stats['hits']} hits / {stats['misses']} misses, {stats['entries']} pages stored)"
             )
 
-            validated_ocr_response = self.validate_ocr_response(ocr_response)
+        sub_pdf_bytes = self.build_sub_pdf(doc, pending) if pending else None
+        return cached_pages, [idx + 1 for idx in pending], sub_pdf_bytes, page_hashes
+
+    def cache_ocr_pages(self, page_hashes, page_numbers, ocr_pages):
+        """
+        Stores freshly OCR'd pages in the OCR page cache without their "**PAGE n**" marker, since the same
+        page may sit at a different position in the next document.
+        """
+        if self.page_cache is None or not page_hashes:
+            return
+        self.page_cache.set_many({
+            page_hashes[page_num]: page_markdown.split("\n\n", 1)[-1]
+            for page_num, page_markdown in zip(page_numbers, ocr_pages, strict=True)
+            if page_num in page_hashes
+        })
+
+    def split_cached_pages(self, pdf_bytes):
+        """
+        Same as split_text_and_image_pages, for full OCR: every page is an OCR page, served from the cache when possible.
+        """
+        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        try:
+            return self.lookup_cached_pages(doc, range(len(doc)))
+        finally:
+            doc.close()
+
+    def extract_text_cached(self, pdf_bytes):
+        """
+        OCRs the whole PDF like extract_text_from_pdf_batched, but pages already in the OCR page cache are
+        not sent to Mistral again.
+
+        Returns:
+            List of page markdown strings in page order, each prefixed with "**PAGE n**"
+        """
+        cached_pages, pending_page_numbers, sub_pdf_bytes, page_hashes = self.split_cached_pages(pdf_bytes)
+        ocr_pages = self.extract_text_from_pdf_batched(
+            sub_pdf_bytes, page_numbers=pending_page_numbers, page_hashes=page_hashes
+        ) if sub_pdf_bytes else []
+        return self.merge_pages(cached_pages, pending_page_numbers, ocr_pages)
+
+    def split_text_and_image_pages(self, pdf_bytes):
+        """
+        Reads every page's PyMuPDF text layer, looks the pages without one up in the OCR page cache and
+        packs the remaining ones into a sub-PDF.
+
+        Returns:
+            (page_texts, ocr_page_numbers, sub_pdf_bytes, page_hashes): page_texts maps page number to "**PAGE n**"
+            text for pages with a text layer or a cached OCR result; sub_pdf_bytes is None when no page needs OCR.
+        """
+        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        try:
+            page_texts = {}
+            image_pages = []
+            for page_index, page in enumerate(doc):
+                text = page.get_text()
+                if len(text.strip()) >= HYBRID_MIN_TEXT_CHARS:
+                    page_texts[page_index + 1] = f"**PAGE {page_index + 1}**\n\n{text}"
+                else:
+                    image_pages.append(page_index)
+
+            logger.info(f"Hybrid OCR: {len(page_texts)} pages from the text layer, {len(image_pages)} image-only pages")
+            cached_pages, ocr_page_numbers, sub_pdf_bytes, page_hashes = self.lookup_cached_pages(doc, image_pages)
+        finally:
+            doc.close()
+
+        page_texts.update(cached_pages)
+        return page_texts, ocr_page_numbers, sub_pdf_bytes, page_hashes
+
+    @staticmethod
+    def merge_pages(page_texts, image_page_numbers, ocr_pages):
+        """
+        Merges text-layer pages and OCR pages back into one list ordered by original page number.
+        Raises ValueError if the number of OCR pages does not match image_page_numbers.
+        """
+        page_texts = dict(page_texts)
+        for page_num, page_markdown in zip(image_page_numbers, ocr_pages, strict=True):
+            page_texts[page_num] = page_markdown
+        return [page_texts[page_num] for page_num in sorted(page_texts)]
+
+    def extract_text_hybrid(self, pdf_bytes):
+        """
+        Hybrid extraction: pages with a PyMuPDF text layer are read locally, and only the image-only pages
+        that are not in the OCR page cache are packed into a sub-PDF and sent to Mistral OCR. All results are
+        merged by original page number.
+
+        Args:
+            pdf_bytes: Raw PDF file bytes to be processed
+
+        Returns:
+            List of page markdown/text strings in page order, each prefixed with "**PAGE n**" like extract_text_from_pdf
+        """
+        page_texts, ocr_page_numbers, sub_pdf_bytes, page_hashes = self.split_text_and_image_pages(pdf_bytes)
+        ocr_pages = self.extract_text_from_pdf_batched(
+            sub_pdf_bytes, page_numbers=ocr_page_numbers, page_hashes=page_hashes
+        ) if sub_pdf_bytes else []
+        return self.merge_pages(page_texts, ocr_page_numbers, ocr_pages)
+
+
+class AsyncPdfProcessor(PdfProcessor):
+    """
+    asyncio-native PdfProcessor built on Mistral's ocr.process_async, so one event loop can keep
+    many OCR requests in flight. tenacity's @retry backs off with asyncio.sleep for coroutines.
+
+    Everything that blocks (PyMuPDF page reads and sub-PDF building, base64 encoding, the SQLite page
+    cache) runs on worker threads through asyncio.to_thread, so the event loop only waits on the network.
+    """
+
+    def __init__(self):
+        self.api_key = MISTRAL_API_KEY
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_CONNECTIONS)
+        )
+        self.client = Mistral(api_key=self.api_key, async_client=self.http_client)
+        self.page_cache = OcrPageCache() if OCR_PAGE_CACHE else None
+
+    @retry(stop=stop_after_attempt(5), wait=wait_exponential_jitter(initial=1, max=10), before_sleep=count_retries(STAGE_OCR))
+    async def extract_text_from_pdf(self, pdf_bytes, page_numbers=None):
+        """
+        Async version of PdfProcessor.extract_text_from_pdf.
+
+        Args:
+            pdf_bytes: Raw PDF file bytes to be processed
+            page_numbers: Optional original page numbers of the pages in pdf_bytes (see validate_ocr_response)
+
+        Returns:
+            List of page markdown strings, each prefixed with its page number
+        """
+        try:
+            with METRICS.timer(STAGE_OCR, bytes=len(pdf_bytes)) as measured:
+                request = await asyncio.to_thread(self.build_ocr_request, pdf_bytes)
+                ocr_response = await self.client.ocr.process_async(**request)
+                validated_ocr_response = self.validate_ocr_response(ocr_response, page_numbers)
+                measured["pages"] = len(validated_ocr_response)
             return validated_ocr_response
         except Exception as e:
             logger.error(f"Error during OCR extraction: {str(e)}")
             logger.error(traceback.format_exc())
             raise e
 
+    async def extract_text_from_pdf_batched(self, pdf_bytes, batch_size=None, max_workers=None, page_numbers=None, page_hashes=None):
+        """
+        Async version of PdfProcessor.extract_text_from_pdf_batched; max_workers bounds the requests in flight.
+        """
+        batches = await asyncio.to_thread(self.split_into_batches, pdf_bytes, batch_size, page_numbers)
+        semaphore = asyncio.Semaphore(max_workers or OCR_MAX_WORKERS)
+
+        async def run_batch(batch_bytes, batch_page_numbers):
+            async with semaphore:
+                ocr_pages = await self.extract_text_from_pdf(batch_bytes, page_numbers=batch_page_numbers)
+            await asyncio.to_thread(self.cache_ocr_pages, page_hashes, batch_page_numbers, ocr_pages)
+            return ocr_pages
+
+        results = await asyncio.gather(*(run_batch(*batch) for batch in batches), return_exceptions=True)
+        failed_ranges = []
+        for (_, batch_page_numbers), result in zip(batches, results):
+            if isinstance(result, Exception):
+                failed_ranges.append(f"{batch_page_numbers[0]}-{batch_page_numbers[-1]}")
+                logger.error(f"OCR batch for pages {failed_ranges[-1]} failed: {str(result)}")
+
+        if failed_ranges:
+            raise RuntimeError(f"OCR failed for pages {', '.join(failed_ranges)}")
+        return [page_markdown for batch_pages in results for page_markdown in batch_pages]
+
+    async def extract_text_hybrid(self, pdf_bytes):
+        """
+        Async version of PdfProcessor.extract_text_hybrid.
+        """
+        page_texts, ocr_page_numbers, sub_pdf_bytes, page_hashes = await asyncio.to_thread(
+            self.split_text_and_image_pages, pdf_bytes
+        )
+        ocr_pages = await self.extract_text_from_pdf_batched(
+            sub_pdf_bytes, page_numbers=ocr_page_numbers, page_hashes=page_hashes
+        ) if sub_pdf_bytes else []
+        return self.merge_pages(page_texts, ocr_page_numbers, ocr_pages)
+
+    async def extract_text_cached(self, pdf_bytes):
+        """
+        Async version of PdfProcessor.extract_text_cached.
+        """
+        cached_pages, pending_page_numbers, sub_pdf_bytes, page_hashes = await asyncio.to_thread(
+            self.split_cached_pages, pdf_bytes
+        )
+        ocr_pages = await self.extract_text_from_pdf_batched(
+            sub_pdf_bytes, page_numbers=pending_page_numbers, page_hashes=page_hashes
+        ) if sub_pdf_bytes else []
+        return self.merge_pages(cached_pages, pending_page_numbers, ocr_pages)
+
+    async def aclose(self):
+        await self.http_client.aclose()
+
 
 if __name__ == "__main__":
     pdf_processor = PdfProcessor()